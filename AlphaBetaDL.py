@@ -1,6 +1,7 @@
 ##########################################################################################
 # This module implements
-#     Minimax search with Alpha-Beta Pruning
+#     Minimax search with Alpha-Beta Pruning (AlphaBeta)
+#     Principal Variation Search, a.k.a. NegaScout (PVSearch)
 #
 # The two methods that can be called directly are:
 #    minimax_decision_max(state)  # find the best move for Max in the give state
@@ -20,6 +21,89 @@
 #       - list actions legal in the given state
 #    result(self, state, action)
 #       - give the rstate resulting from the action in the given state
+#    and, if the game has it,
+#    staged_actions(self, state, first)
+#       - generate first (the move from the transposition table, if it is legal), then
+#         the captures, then the other actions, so the search can stop before making them all
+#    or else
+#    iter_actions(self, state)
+#       - generate the actions of actions(), for the same reason
+#
+# With AlphaBeta(game, inplace=True) the search also needs:
+#    make_move(self, state, action)
+#       - apply the action to the state in place, returning an undo record
+#    unmake_move(self, state, undo)
+#       - restore the state from the undo record
+#    and the whole search then works on the one state object it was given.
+#
+# With AlphaBeta(game, tt_megabytes=N) the search keeps a TranspositionTable,
+# keyed on game.hash_key(state) if the game has it, and on
+# game.transposition_string(state) otherwise.  AlphaBeta(game, tt=table) uses the
+# given table instead, e.g. a PackedTranspositionTable shared with other processes;
+# tables like that store moves as integers, using the game's
+#    encode_move(self, action)
+#    decode_move(self, state, code)
+#
+# With AlphaBeta(game, tt_megabytes=N, cache=PositionCache(path, size)) the table is
+# backed by a cache in a memory-mapped file (see PositionCache.py), which keeps the
+# results of the deeper searches between runs and shares them between processes;
+# the moves are stored with encode_move() and decode_move() as above.
+#
+# With AlphaBeta(game, tt_megabytes=N, symmetry=True) a state and its left-right mirror
+# image share one table entry, using the game's
+#    canonical_key(self, state)
+#    canonical_move(self, state, action)
+#    from_canonical_move(self, state, code)
+# to key the entry and to store the best move the right way round for either state.
+#
+# With AlphaBeta(game, tablebase=table) a state with few enough pieces on the board
+# takes its exact value from an endgame table (see Tablebase.py), using
+#    table.probe(game, state, depth)
+#       - the value of the state, on the same scale as utility(), or None if the
+#         table does not have the state
+# instead of being searched.
+#
+# With AlphaBeta(game, time_limit=T, node_limit=N) the search uses iterative deepening:
+# it sets game.depthLimit to 1, 2, 3, ... in turn (using cutoff_test() and eval() as
+# usual), stops when the time or node budget runs out, and returns the result of the
+# deepest search that finished.
+#
+# With AlphaBeta(game, ordering=MoveOrdering(game)) the actions at each node are sorted
+# before they are searched, which needs the game to have:
+#    move_info(self, state, action)
+#       - (piece type moving, piece type captured or None, True if a promotion)
+#       - and a pieceWeights dictionary giving the value of each piece type
+#
+# With AlphaBeta(game, quiescence=True) the search does not stop at the cut-off while
+# there are captures to make: it keeps following the moves given by
+#    capture_actions(self, state)
+#       - generate the legal actions that capture a piece (or otherwise change the material)
+# where the player to move may also "stand pat" and take eval() instead of capturing.
+#
+# With AlphaBeta(game, batch_eval=True) a node whose children are all cut off asks the
+# game for all of their values at once, with
+#    eval_children(self, state, actions)
+#       - the value of the state after each action: utility() if that ends the game,
+#         eval() if not
+# which the game can compute for the whole batch together (see JediChessBitboard).
+# This assumes cutoff_test() only looks at the depth, not the state.
+#
+# With AlphaBeta(game, stats=True) every search also fills in a SearchStats, kept in
+# record.stats: the nodes expanded at each depth, the leaves and terminal positions
+# reached, the cut-offs, the effective branching factor, and the time spent in the
+# game's actions(), result(), unmake_move() and eval() (timing one call in stats_sample).
+# AlphaBeta(game, stats_hook=f) gives each search's SearchStats to f, e.g. to log
+# stats.to_json().
+#
+# PVSearch takes all the same options as AlphaBeta.  It searches the first move at
+# each node with the full alpha-beta window, and the rest with a null window that
+# only checks they are no better, searching them again if they are.  Its values are
+# from the point of view of the player to move, but it keeps them in the table from
+# Max's, like AlphaBeta, so the two can share a table.  With iterative
+# deepening it starts each iteration with an aspiration window around the value of
+# the previous one.  It returns the principal variation in the record.
+#
+# make_searcher(name, game, **options) makes a searcher by name, see searchers.
 
 # To use the AlphaBeta class, you need the following steps
 #    game = <create a game object from a Game Class>
@@ -32,6 +116,9 @@
 #    # result is a SearchTerminationRecord
 #    result.display()
 
+import importlib
+import json
+import struct
 import time
 
 ##########################################################################################
@@ -41,22 +128,637 @@ class SearchTerminationRecord(object):
        at different parts of the code.
     """
 
-    def __init__(self, value, move, time=0, nodes=0):
+    def __init__(self, value, move, time=0, nodes=0, tt_hits=0, tt_misses=0, tt_collisions=0, depth=0,
+                 cutoffs=0, first_move_cutoffs=0, pv=None, qnodes=0, worker_nodes=None, utilization=None,
+                 tablebase_hits=0, book=False, stats=None):
         self.value = value      # numeric: the minimax value
         self.move = move        # a move with the stated minimax value
         self.time = time        # float: how much time was spent searching?  Not really accurate, but good enough for fun
         self.nodes = nodes      # integer: How many nodes were expaded during the search?
+        self.depth = depth      # integer: the depth limit of the search that found the move
+        self.cutoffs = cutoffs  # integer: nodes where the search stopped early (beta cut-offs)
+        self.first_move_cutoffs = first_move_cutoffs  # integer: of those, how many stopped on the first move
+        self.pv = pv            # list: the expected line of play, starting with move, or None
+        self.qnodes = qnodes    # integer: How many nodes were visited by quiescence search?
+        self.worker_nodes = worker_nodes  # list: nodes expanded by each worker of a parallel search, or None
+        self.utilization = utilization  # float: for a parallel search, how many workers were busy on average
+        self.tt_hits = tt_hits              # integer: transposition table probes that found the position
+        self.tt_misses = tt_misses          # integer: transposition table probes that did not
+        self.tt_collisions = tt_collisions  # integer: misses where the slots held other positions
+        self.tablebase_hits = tablebase_hits  # integer: states valued by the endgame tablebase
+        self.book = book        # boolean: True if the move came from an opening book, without searching
+        self.stats = stats      # SearchStats: the details of the search effort, or None
 
     def __str__(self):
         """Create a string representation of the Result data
         """
+        if self.book:
+            return 'Chose move <{}> from the opening book'.format(self.move)
         text = 'Chose move <{}> with Minimax value {} after {:.4f} seconds, expanding {} nodes'
-        return text.format(self.move, self.value, self.time, self.nodes)
+        text = text.format(self.move, self.value, self.time, self.nodes)
+        if self.qnodes:
+            text += ' and {} quiescence nodes'.format(self.qnodes)
+        if self.depth:
+            text += ' at depth {}'.format(self.depth)
+        if self.cutoffs:
+            text += ' ({} of {} cut-offs on the first move)'.format(self.first_move_cutoffs, self.cutoffs)
+        if self.pv:
+            text += ', expecting ' + ' '.join('<{}>'.format(act) for act in self.pv)
+        if self.worker_nodes:
+            text += ' ({} workers: {} nodes, utilization {:.2f})'.format(
+                len(self.worker_nodes), '/'.join(str(n) for n in self.worker_nodes), self.utilization)
+        if self.tt_hits or self.tt_misses:
+            text += ' (table: {} hits, {} misses, {} collisions)'.format(
+                self.tt_hits, self.tt_misses, self.tt_collisions)
+        if self.tablebase_hits:
+            text += ' ({} tablebase hits)'.format(self.tablebase_hits)
+        return text
 
     def display(self):
         """Display the record to the console
         """
         print(str(self))
+        if self.stats is not None:
+            print(str(self.stats))
+
+##########################################################################################
+class SearchStats(object):
+    """ A detailed account of the effort a search made, for tuning.
+        AlphaBeta(game, stats=True) fills one in for every search, and puts it in
+        the record as record.stats.
+
+        The object has the following attributes:
+            self.nodes_by_depth - the nodes expanded at each depth below the root, over
+                          every iteration of iterative deepening
+            self.last_iteration - the same, for the last iteration that finished, or
+                          None before one has
+            self.calls - a dictionary with
+                          keys: "actions", "result", "unmake", "eval"
+                          values: how many times the game was asked for them
+            self.seconds - the same keys, with the (estimated) seconds spent in the game
+            self.evals - the positions valued by eval() or eval_children() (the leaves)
+            self.terminals - the terminal positions reached, valued by utility()
+            self.cutoffs - the nodes where the search stopped early (beta cut-offs)
+            self.first_move_cutoffs - of those, how many stopped on the first move
+            self.qnodes - the nodes visited by quiescence search
+            self.time - the seconds the whole search took
+            self.sample - the game calls are timed one in every sample calls, and the
+                          times multiplied by sample; 0 if they are not timed
+    """
+
+    categories = ("actions", "result", "unmake", "eval")
+
+    def __init__(self, sample=16):
+        self.nodes_by_depth = []
+        self.last_iteration = None
+        self.__iteration = []
+        self.calls = dict.fromkeys(self.categories, 0)
+        self.seconds = dict.fromkeys(self.categories, 0.0)
+        self.evals = 0
+        self.terminals = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.qnodes = 0
+        self.time = 0.0
+        self.sample = sample
+
+    def expanded(self, depth):
+        """ Count a node expanded at the given depth.
+        """
+        for nodes in (self.nodes_by_depth, self.__iteration):
+            while len(nodes) <= depth:
+                nodes.append(0)
+            nodes[depth] += 1
+
+    def new_iteration(self):
+        """ Start counting the nodes of an iteration of iterative deepening.
+        """
+        self.__iteration = []
+
+    def iteration_done(self):
+        """ Keep the nodes of the iteration just finished, for the branching factor.
+        """
+        self.last_iteration = list(self.__iteration)
+
+    def cutoff(self, index):
+        """ Count a cut-off by the action at the given index of a node's actions.
+        """
+        self.cutoffs += 1
+        if index == 0:
+            self.first_move_cutoffs += 1
+
+    @property
+    def nodes(self):
+        """ The nodes expanded at every depth.
+        """
+        return sum(self.nodes_by_depth)
+
+    def branching_factor(self):
+        """ Return the effective branching factor: the number of nodes expanded at the
+            deepest level, compared to the root, taken to the power 1 / depth.
+            Only the last iteration that finished counts, as the earlier, shallower
+            ones would make the tree look narrower than it is.
+        """
+        nodes = self.last_iteration if self.last_iteration is not None else self.nodes_by_depth
+        levels = [n for n in nodes if n]
+        if len(levels) < 2:
+            return 0.0
+        return (levels[-1] / levels[0]) ** (1.0 / (len(levels) - 1))
+
+    def first_move_cutoff_rate(self):
+        """ Return the fraction of the cut-offs that came from the first move.
+        """
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def nodes_per_second(self):
+        """ Return the nodes expanded, quiescence nodes and leaves valued per second.
+        """
+        if self.time <= 0:
+            return 0.0
+        return (self.nodes + self.qnodes + self.evals) / self.time
+
+    def as_dict(self):
+        """ Return the statistics as a dictionary of plain values, for JSON.
+        """
+        return {
+            "nodes_by_depth": list(self.nodes_by_depth),
+            "last_iteration": list(self.last_iteration) if self.last_iteration is not None else None,
+            "nodes": self.nodes,
+            "qnodes": self.qnodes,
+            "evals": self.evals,
+            "terminals": self.terminals,
+            "cutoffs": self.cutoffs,
+            "first_move_cutoffs": self.first_move_cutoffs,
+            "first_move_cutoff_rate": self.first_move_cutoff_rate(),
+            "branching_factor": self.branching_factor(),
+            "calls": dict(self.calls),
+            "seconds": dict(self.seconds) if self.sample else None,
+            "time": self.time,
+            "nodes_per_second": self.nodes_per_second(),
+        }
+
+    def to_json(self):
+        """ Return the statistics as a line of JSON.
+        """
+        return json.dumps(self.as_dict(), sort_keys=True)
+
+    def __str__(self):
+        text = ['nodes by depth: ' + ' '.join(str(n) for n in self.nodes_by_depth),
+                'leaves: {} evaluated, {} terminal; {} quiescence nodes'.format(
+                    self.evals, self.terminals, self.qnodes),
+                'branching factor {:.2f}, {:.0f} nodes/s, {:.1%} of {} cut-offs on the first move'.format(
+                    self.branching_factor(), self.nodes_per_second(), self.first_move_cutoff_rate(), self.cutoffs)]
+        if self.sample:
+            text.append('time in ' + ', '.join('{} {:.4f}s ({} calls)'.format(
+                name, self.seconds[name], self.calls[name]) for name in self.categories) +
+                ' of {:.4f}s'.format(self.time))
+        return '\n'.join(text)
+
+
+class _MeteredGame(object):
+    """ Stands in for the game in a search with statistics: it passes everything on to
+        the game, counting the calls to the methods in categories, and timing some of them.
+    """
+
+    categories = {"actions": "actions", "iter_actions": "actions", "staged_actions": "actions",
+                  "capture_actions": "actions", "quiet_actions": "actions",
+                  "result": "result", "make_move": "result", "unmake_move": "unmake",
+                  "eval": "eval", "eval_children": "eval", "utility": None}
+
+    def __init__(self, game, stats):
+        self.__dict__["_game"] = game
+        self.__dict__["_stats"] = stats
+        self.__dict__["_countdown"] = 0
+        for name, category in self.categories.items():
+            if hasattr(game, name):
+                self.__dict__[name] = self.__metered(name, getattr(game, name), category)
+
+    def __getattr__(self, name):
+        if name in ("_game", "_stats", "_countdown"):
+            # not set up yet, e.g. while unpickling
+            raise AttributeError(name)
+        return getattr(self._game, name)
+
+    def __setattr__(self, name, value):
+        # e.g. depthLimit, which the game keeps
+        setattr(self._game, name, value)
+
+    def use(self, stats):
+        """ Count and time the calls from now on in the given SearchStats.
+        """
+        self.__dict__["_stats"] = stats
+
+    def __metered(self, name, method, category):
+        generates = name in ("iter_actions", "staged_actions", "capture_actions", "quiet_actions")
+
+        def metered(*args):
+            stats = self._stats
+            if category is None:
+                stats.terminals += 1
+                return method(*args)
+            stats.calls[category] += 1
+            if name == "eval":
+                stats.evals += 1
+            elif name == "eval_children":
+                stats.evals += len(args[1])
+            sample = stats.sample
+            if not sample:
+                return method(*args)
+            self.__dict__["_countdown"] -= 1
+            if self._countdown > 0:
+                return method(*args)
+            self.__dict__["_countdown"] = sample
+            start = time.perf_counter()
+            value = method(*args)
+            if generates:
+                return self.__timed(value, category, sample, start)
+            stats.seconds[category] += (time.perf_counter() - start) * sample
+            return value
+        return metered
+
+    def __timed(self, items, category, sample, start):
+        """ Pass on the items of a generator, adding the time taken to make them.
+        """
+        seconds = self._stats.seconds
+        seconds[category] += (time.perf_counter() - start) * sample
+        items = iter(items)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(items)
+            except StopIteration:
+                seconds[category] += (time.perf_counter() - start) * sample
+                return
+            seconds[category] += (time.perf_counter() - start) * sample
+            yield item
+
+
+##########################################################################################
+class TranspositionTable(object):
+    """ A fixed size table of search results, keyed on a position's hash key.
+
+        The table is split into buckets of two entries.  The first entry in a bucket
+        keeps the result searched to the greatest depth, and is only replaced by a result
+        of the same or greater depth.  The second entry always takes the newest result
+        that the first entry turned away.  Results that are expensive to recompute stay
+        in the table, while the table still follows the positions of the current search.
+
+        Each entry is a tuple (value, bound, depth, move):
+            value - the value found by the search
+            bound - EXACT if value is the minimax value,
+                    LOWER if the minimax value is at least value (the search failed high),
+                    UPPER if the minimax value is at most value (the search failed low)
+            depth - how many more levels were searched below the position
+            move  - the best move found, or None
+    """
+
+    EXACT = 0
+    LOWER = 1
+    UPPER = 2
+
+    # roughly how many bytes an entry costs, counting its tuple and the key
+    entry_bytes = 160
+
+    def __init__(self, megabytes=16):
+        """ Make an empty table.
+            :param megabytes: an upper limit on the memory used by the table
+        """
+        self.buckets = max(1, int(megabytes * 2**20) // (2 * self.entry_bytes))
+        self.keys = [None] * (2 * self.buckets)
+        self.entries = [None] * (2 * self.buckets)
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+
+    def probe(self, key):
+        """ Look for a position in the table.
+            :param key: the hash key of the position
+            :return: the entry for the position, or None
+        """
+        i = key % self.buckets * 2
+        keys = self.keys
+        if keys[i] == key:
+            self.hits += 1
+            return self.entries[i]
+        if keys[i + 1] == key:
+            self.hits += 1
+            return self.entries[i + 1]
+        self.misses += 1
+        if keys[i] is not None or keys[i + 1] is not None:
+            self.collisions += 1
+        return None
+
+    def store(self, key, value, bound, depth, move):
+        """ Remember the result of searching a position.
+            :param key: the hash key of the position
+            :param value, bound, depth, move: as described for entries above
+        """
+        i = key % self.buckets * 2
+        old = self.entries[i]
+        if old is not None and self.keys[i] != key and depth < old[2]:
+            i += 1
+        self.keys[i] = key
+        self.entries[i] = (value, bound, depth, move)
+
+    def reset_counters(self):
+        """ Set the hit, miss and collision counters back to zero.
+        """
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+
+    def clear(self):
+        """ Forget every stored position.
+        """
+        self.keys = [None] * (2 * self.buckets)
+        self.entries = [None] * (2 * self.buckets)
+        self.reset_counters()
+
+
+##########################################################################################
+class PackedTranspositionTable(object):
+    """ A transposition table kept in a flat buffer of unsigned 64-bit words, so that
+        it can live in memory shared between processes (multiprocessing.RawArray) or
+        in a memory-mapped file.  It has the same methods and replacement policy as
+        TranspositionTable.
+
+        Each entry is two words:
+            check - the position's key XOR data
+            data  - the value (as a 32-bit float), depth, bound and move, packed
+        A reader only accepts an entry if check XOR data gives back its key, so an
+        entry that another process was halfway through writing is seen as a miss,
+        without any locking.
+
+        Moves are stored as integers from game.encode_move(), so encodes_moves is True.
+    """
+
+    EXACT = TranspositionTable.EXACT
+    LOWER = TranspositionTable.LOWER
+    UPPER = TranspositionTable.UPPER
+
+    encodes_moves = True
+    words_per_bucket = 4
+
+    _float = struct.Struct("<f")
+    _bits = struct.Struct("<I")
+
+    def __init__(self, words):
+        """ Use the given buffer as the table.
+            :param words: a writable sequence of unsigned 64-bit integers, all 0 for an
+                          empty table, whose length is a multiple of words_per_bucket
+        """
+        self.words = words
+        self.buckets = len(words) // self.words_per_bucket
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+
+    @classmethod
+    def words_for(cls, megabytes):
+        """ Return how many words a table of the given size needs.
+        """
+        return max(1, int(megabytes * 2**20) // (8 * cls.words_per_bucket)) * cls.words_per_bucket
+
+    def _pack(self, value, bound, depth, move):
+        value_bits = self._bits.unpack(self._float.pack(value))[0]
+        move_bits = 0 if move is None else move + 1
+        return value_bits | min(depth, 255) << 32 | bound << 40 | move_bits << 42
+
+    def _unpack(self, data):
+        value = self._float.unpack(self._bits.pack(data & 0xFFFFFFFF))[0]
+        if value == int(value):
+            value = int(value)
+        move_bits = data >> 42 & 0xFFFF
+        return (value, data >> 40 & 3, data >> 32 & 255, move_bits - 1 if move_bits else None)
+
+    def probe(self, key):
+        """ Look for a position in the table.
+            :param key: the hash key of the position
+            :return: the entry for the position (value, bound, depth, move), or None
+        """
+        words = self.words
+        i = key % self.buckets * self.words_per_bucket
+        for j in (i, i + 2):
+            data = words[j + 1]
+            if data and words[j] ^ data == key:
+                self.hits += 1
+                return self._unpack(data)
+        self.misses += 1
+        if words[i + 1] or words[i + 3]:
+            self.collisions += 1
+        return None
+
+    def store(self, key, value, bound, depth, move):
+        """ Remember the result of searching a position.
+            :param key: the hash key of the position
+            :param value, bound, depth: as for TranspositionTable
+            :param move: the best move, encoded by game.encode_move(), or None
+        """
+        words = self.words
+        i = key % self.buckets * self.words_per_bucket
+        data = words[i + 1]
+        if data and words[i] ^ data != key and min(depth, 255) < (data >> 32 & 255):
+            i += 2
+        data = self._pack(value, bound, depth, move)
+        words[i + 1] = data
+        words[i] = key ^ data
+
+    def reset_counters(self):
+        """ Set the hit, miss and collision counters back to zero.
+        """
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+
+    def clear(self):
+        """ Forget every stored position.
+        """
+        for i in range(len(self.words)):
+            self.words[i] = 0
+
+
+##########################################################################################
+class CachedTable(object):
+    """ A transposition table backed by a second, larger (or longer-lived) one,
+        e.g. a PositionCache.PositionCache on disk.
+
+        A position missing from the first table is looked for in the second, and copied
+        into the first if it is found there.  Every result goes into the first table,
+        and the results of searches at least min_depth deep also go into the second.
+
+        Moves are stored as integers from game.encode_move(), in both tables.
+    """
+
+    encodes_moves = True
+
+    def __init__(self, table, cache, min_depth=2):
+        """ Put the two tables together.
+            :param table: the first table, e.g. a TranspositionTable
+            :param cache: the second table, with the probe() and store() methods of TranspositionTable
+            :param min_depth: the shallowest search result that is stored in the cache
+        """
+        self.table = table
+        self.cache = cache
+        self.min_depth = min_depth
+        self.hits = 0
+        self.misses = 0
+        self.cache_hits = 0
+
+    def probe(self, key):
+        """ Look for a position in the first table, then in the cache.
+            :param key: the hash key of the position
+            :return: the entry for the position (value, bound, depth, move), or None
+        """
+        entry = self.table.probe(key)
+        if entry is None:
+            entry = self.cache.probe(key)
+            if entry is not None:
+                self.cache_hits += 1
+                self.table.store(key, *entry)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def store(self, key, value, bound, depth, move):
+        """ Remember the result of searching a position.
+        """
+        self.table.store(key, value, bound, depth, move)
+        if depth >= self.min_depth:
+            self.cache.store(key, value, bound, depth, move)
+
+    def reset_counters(self):
+        """ Set the hit, miss and collision counters of both tables back to zero.
+        """
+        self.table.reset_counters()
+        self.cache.reset_counters()
+        self.hits = 0
+        self.misses = 0
+        self.cache_hits = 0
+
+    @property
+    def collisions(self):
+        """ The collisions in the first table.
+        """
+        return self.table.collisions
+
+    def clear(self):
+        """ Forget every position in the first table; the cache is kept.
+        """
+        self.table.clear()
+        self.reset_counters()
+
+
+##########################################################################################
+class MoveOrdering(object):
+    """ Sorts the actions at a node so that alpha-beta finds its cut-offs early.
+        The order is:
+            1. the move from the transposition table (or the previous iteration)
+            2. captures, the most valuable piece taken by the least valuable piece first,
+               and promotions of rebels to jedi
+            3. the killer moves for the depth: quiet moves that caused a cut-off
+               at the same depth elsewhere in the tree
+            4. the other quiet moves, by their history score: how much searching
+               their cut-offs have saved so far
+        A search calls order() for every node it expands, and cutoff() whenever a
+        move causes a cut-off.  Any object with those methods (and new_search())
+        can be given to AlphaBeta instead.
+    """
+
+    # the order of the groups above; scores within a group are always smaller than the gaps
+    table_score = 1 << 30
+    capture_score = 1 << 24
+    killer_score = 1 << 20
+
+    def __init__(self, game, killers=2):
+        """ Set up the tables.
+            :param game: the game, for move_info() and pieceWeights
+            :param killers: how many killer moves to keep for each depth
+        """
+        self.game = game
+        self.weights = game.pieceWeights
+        self.promotion_gain = game.pieceWeights["J"] - game.pieceWeights["R"]
+        self.killer_slots = killers
+        self.killers = []   # killers[depth]: a list of quiet moves, the most recent first
+        self.history = {}   # action -> history score
+        self.nodes_ordered = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def new_search(self):
+        """ Get ready for a new search from a new root.
+            The killers are forgotten, and the history scores are halved, so the
+            history stays useful between moves without being dominated by old positions.
+        """
+        self.killers = []
+        for act in self.history:
+            self.history[act] //= 2
+        self.nodes_ordered = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def order(self, state, actions, depth, first):
+        """ Return the actions, sorted best first.
+            :param state: a legal game state
+            :param actions: the legal actions in the state
+            :param depth: the depth of the state below the root
+            :param first: the move from the transposition table, or None
+            :return: a list of actions
+        """
+        self.nodes_ordered += 1
+        weights = self.weights
+        killers = self.killers[depth] if depth < len(self.killers) else ()
+        history = self.history
+        scored = []
+        for act in actions:
+            if act == first:
+                score = self.table_score
+            else:
+                mover, captured, promotes = self.game.move_info(state, act)
+                if captured is not None or promotes:
+                    score = self.capture_score - weights[mover]
+                    if captured is not None:
+                        score += 16 * weights[captured]
+                    if promotes:
+                        score += 16 * self.promotion_gain
+                elif act in killers:
+                    score = self.killer_score - killers.index(act)
+                else:
+                    score = history.get(act, 0)
+            scored.append((score, act))
+        scored.sort(key=lambda pair: pair[0], reverse=True)
+        return [act for score, act in scored]
+
+    def cutoff(self, state, act, depth, draft, index):
+        """ Learn from a move that caused a cut-off.
+            :param state: the state where it happened
+            :param act: the move
+            :param depth: the depth of the state below the root
+            :param draft: how many more levels the search looks below the state
+            :param index: where the move was in the ordered actions, 0 for first
+        """
+        self.cutoffs += 1
+        if index == 0:
+            self.first_move_cutoffs += 1
+        mover, captured, promotes = self.game.move_info(state, act)
+        if captured is not None or promotes:
+            # captures are sorted well enough already
+            return
+        while len(self.killers) <= depth:
+            self.killers.append([])
+        killers = self.killers[depth]
+        if act not in killers:
+            killers.insert(0, act)
+            del killers[self.killer_slots:]
+        self.history[act] = self.history.get(act, 0) + draft * draft
+
+
+##########################################################################################
+class SearchAborted(Exception):
+    """ Raised inside a search when its time or node budget runs out, or it is stopped.
+    """
+    pass
 
 
 ##########################################################################################
@@ -64,19 +766,86 @@ class AlphaBeta(object):
     """ An implementation of MiniMax Search
         - no data tracked for runtime or search effort
         - no search cut-off
-        - no transposition table
+        - an optional transposition table
     """
 
     # a clumsy way to represent a large value
     ifny = 2**20
 
-    def __init__(self, game):
+    # how many nodes to expand between looks at the clock
+    check_interval = 256
+
+    def __init__(self, game, inplace=False, tt_megabytes=0, time_limit=None, node_limit=None, max_depth=64,
+                 ordering=None, quiescence=False, quiescence_depth=8, tt=None, batch_eval=False,
+                 symmetry=False, tablebase=None, cache=None, cache_depth=2, stats=False, stats_sample=16,
+                 stats_hook=None):
         """ Remember the game object.
             :param: game: an object from the Game Class, with methods as described
                     at the top of this document.
+            :param: inplace: if True, use game.make_move() and game.unmake_move()
+                    on a single state instead of game.result() for every child
+            :param: tt_megabytes: the memory limit of the transposition table;
+                    0 means no transposition table
+            :param: time_limit: seconds per move; if this or node_limit is given,
+                    the search uses iterative deepening instead of game.depthLimit
+            :param: node_limit: nodes expanded per move, for iterative deepening
+            :param: max_depth: the deepest depth limit iterative deepening tries
+            :param: ordering: a MoveOrdering (or similar) object to sort the actions
+                    at every node, or None to search them in the game's order
+            :param: quiescence: if True, search captures past the cut-off before using eval()
+            :param: quiescence_depth: the most levels quiescence search goes past the cut-off
+            :param: tt: a transposition table to use, instead of making one of tt_megabytes
+            :param: batch_eval: if True, value the children of nodes at the cut-off
+                    with one call to game.eval_children() (not with quiescence)
+            :param: symmetry: if True, a state and its mirror image share a table entry
+            :param: tablebase: an endgame Tablebase to take the values of small endgames from
+            :param: cache: a second level table behind the transposition table, e.g. a
+                    PositionCache; 16 megabytes of table are used if tt_megabytes is 0
+            :param: cache_depth: the shallowest search result that is stored in the cache
+            :param: stats: if True, keep a SearchStats for every search, in record.stats
+            :param: stats_sample: time one in this many calls to the game; 0 to only count them
+            :param: stats_hook: a function to give each search's SearchStats to, e.g. to
+                    write stats.to_json() to a log
         """
         self.game = game
+        self.inplace = inplace
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.max_depth = max_depth
+        self.ordering = ordering
+        self.quiescence = quiescence
+        self.quiescence_depth = quiescence_depth
+        self.batch_eval = batch_eval
+        self.tablebase = tablebase
         self.nodes_expanded = 0
+        self.qnodes = 0
+        self.tablebase_hits = 0
+        self.deadline = None        # perf_counter() time when the search must stop, or None
+        self.node_budget = None     # nodes_expanded count when the search must stop, or None
+        self.stop_event = None      # a threading.Event that stops the search when it is set, or None
+        self.cutoff_reached = False # did cutoff_test() stop the search anywhere?
+        if tt is None and (tt_megabytes > 0 or cache is not None):
+            tt = TranspositionTable(tt_megabytes or 16)
+        if cache is not None:
+            if hasattr(cache, "check_game"):
+                cache.check_game(game)
+            tt = CachedTable(tt, cache, cache_depth)
+        self.tt = tt
+        self.principal_variation = None
+        self.symmetry = symmetry
+        self.stats = None
+        self.stats_sample = stats_sample
+        self.stats_hook = stats_hook
+        self.keep_stats = stats or stats_hook is not None
+        if self.keep_stats:
+            self.stats = SearchStats(stats_sample)
+            self.game = _MeteredGame(game, self.stats)
+        if symmetry:
+            self.position_key = game.canonical_key
+        elif hasattr(game, "hash_key"):
+            self.position_key = game.hash_key
+        else:
+            self.position_key = lambda state: hash(game.transposition_string(state))
 
 
     def minimax_decision_max(self, state):
@@ -84,10 +853,141 @@ class AlphaBeta(object):
             :param state: a legal game state
             :return: a SearchTerminationRecord
         """
-        # alpha beta parameters initialized here
+        if self.time_limit is not None or self.node_limit is not None:
+            return self.iterative_deepening(state, True, self.time_limit, self.node_limit, self.max_depth)
+
         start = time.perf_counter()
+        self._reset_counters()
+        best, best_action = self._search_root(state, True, None, None)
+        end = time.perf_counter()
+
+        return self._record(best, best_action, end - start, getattr(self.game, "depthLimit", 0))
+
+    def minimax_decision_min(self, state):
+        """ Return the move that Min should take in the given state
+            :param state: a legal game state
+            :return: a SearchTerminationRecord
+        """
+        if self.time_limit is not None or self.node_limit is not None:
+            return self.iterative_deepening(state, False, self.time_limit, self.node_limit, self.max_depth)
+
+        start = time.perf_counter()
+        self._reset_counters()
+        best, best_action = self._search_root(state, False, None, None)
+        end = time.perf_counter()
+
+        return self._record(best, best_action, end - start, getattr(self.game, "depthLimit", 0))
+
+    def minimax_value(self, state, maximizing, alpha=None, beta=None, depth=0):
+        """ Return the minimax value of the given state, searched with the given window.
+            The value is exact if it is strictly inside the window; otherwise it is a
+            bound, like the values inside the search.
+            :param state: a legal game state
+            :param maximizing: True if it's Max's turn in the state
+            :param alpha: the best Max can do elsewhere, or None
+            :param beta: the best Min can do elsewhere, or None
+            :param depth: the depth of the state below the root, for cutoff_test()
+            :return: the value
+        """
+        self._reset_counters()
+        if alpha is None:
+            alpha = -self.ifny
+        if beta is None:
+            beta = self.ifny
+        return self._search_value(state, maximizing, alpha, beta, depth)
+
+    def iterative_deepening(self, state, maximizing, time_limit=None, node_limit=None, max_depth=64,
+                            start_depth=1):
+        """ Search with depth limits 1, 2, 3, ... until the budget runs out.
+            The first iteration always finishes, so there is always a move to return.
+            Each iteration tries the best move of the previous one first.
+            :param state: a legal game state
+            :param maximizing: True to find Max's move, False to find Min's
+            :param time_limit: seconds to search for, or None
+            :param node_limit: nodes to expand, or None
+            :param max_depth: the deepest depth limit to try
+            :param start_depth: the first depth limit to try
+            :return: a SearchTerminationRecord for the deepest search that finished
+        """
+        start = time.perf_counter()
+        self._reset_counters()
+
+        saved_limit = self.game.depthLimit
+        best, best_action, completed = None, None, 0
+        try:
+            for depth in range(start_depth, max_depth + 1):
+                self.game.depthLimit = depth
+                self.cutoff_reached = False
+                if self.stats is not None:
+                    self.stats.new_iteration()
+                try:
+                    best, best_action = self._search_root(state, maximizing, best_action, best)
+                except SearchAborted:
+                    break
+                completed = depth
+                if self.stats is not None:
+                    self.stats.iteration_done()
+                if not self.cutoff_reached:
+                    # the whole game tree fit inside the depth limit, deeper won't change anything
+                    break
+                # budgets only apply once there is a finished search to fall back on
+                if time_limit is not None:
+                    self.deadline = start + time_limit
+                    if time.perf_counter() >= self.deadline:
+                        break
+                if node_limit is not None:
+                    self.node_budget = node_limit
+                    if self.nodes_expanded >= node_limit:
+                        break
+        finally:
+            self.game.depthLimit = saved_limit
+            self.deadline = None
+            self.node_budget = None
+
+        end = time.perf_counter()
+        return self._record(best, best_action, end - start, completed)
+
+    def _search_root(self, state, maximizing, first, previous):
+        """ Search the given state to the current depth limit.
+            Sub-classes can replace this to use a different search.
+            :param state: a legal game state
+            :param maximizing: True to find Max's move, False to find Min's
+            :param first: a move to try before the others, or None
+            :param previous: the value found by the previous iteration, or None
+            :return: the best value, and the move that gets it
+        """
+        if maximizing:
+            return self.__root_max(state, first)
+        return self.__root_min(state, first)
+
+    def _search_value(self, state, maximizing, alpha, beta, depth):
+        """ Return the value of the given state, for minimax_value().
+            Sub-classes can replace this to use a different search.
+        """
+        if maximizing:
+            return self.__max_value(state, alpha, beta, depth)
+        return self.__min_value(state, alpha, beta, depth)
+
+    def _reset_counters(self):
+        """ Set the search effort counters back to zero, for a new search.
+        """
         self.nodes_expanded = 0
+        self.qnodes = 0
+        self.tablebase_hits = 0
+        if self.keep_stats:
+            self.stats = SearchStats(self.stats_sample)
+            self.game.use(self.stats)
+        if self.tt is not None:
+            self.tt.reset_counters()
+        if self.ordering is not None:
+            self.ordering.new_search()
 
+    def __root_max(self, state, first):
+        """ Search all of Max's options in the given state.
+            :param state: a legal game state
+            :param first: a move to try before the others, or None
+            :return: the best value, and the move that gets it
+        """
         alpha = -self.ifny
         beta = self.ifny
 
@@ -96,27 +996,25 @@ class AlphaBeta(object):
         best_action = None
 
         self.nodes_expanded += 1
-        for act in self.game.actions(state):
-            val = self.__min_value(self.game.result(state, act), alpha, beta, 1)
+        if self.stats is not None:
+            self.stats.expanded(0)
+        for act in self._ordered_actions(state, self._probe(state), 0, first):
+            val = self._child_value(self.__min_value, state, act, alpha, beta, 1)
             if val > best:
                 # remember something better
                 best = val
                 best_action = act
             alpha = max(alpha, best)
 
-        end = time.perf_counter()
-
-        return SearchTerminationRecord(best, best_action, end - start, self.nodes_expanded)
+        self._store(state, best, TranspositionTable.EXACT, 0, best_action)
+        return best, best_action
 
-    def minimax_decision_min(self, state):
-        """ Return the move that Min should take in the given state
+    def __root_min(self, state, first):
+        """ Search all of Min's options in the given state.
             :param state: a legal game state
-            :return: a SearchTerminationRecord
+            :param first: a move to try before the others, or None
+            :return: the best value, and the move that gets it
         """
-        # alpha beta parameters initialized here
-        start = time.perf_counter()
-        self.nodes_expanded = 0
-
         alpha = -self.ifny
         beta = self.ifny
 
@@ -125,17 +1023,178 @@ class AlphaBeta(object):
         best_action = None
 
         self.nodes_expanded += 1
-        for act in self.game.actions(state):
-            val = self.__max_value(self.game.result(state, act), alpha, beta, 1)
+        if self.stats is not None:
+            self.stats.expanded(0)
+        for act in self._ordered_actions(state, self._probe(state), 0, first):
+            val = self._child_value(self.__max_value, state, act, alpha, beta, 1)
             if val < best:
                 # remember something better
                 best = val
                 best_action = act
             beta = min(beta, best)
 
-        end = time.perf_counter()
+        self._store(state, best, TranspositionTable.EXACT, 0, best_action)
+        return best, best_action
+
+    def _record(self, best, best_action, elapsed, depth):
+        """ Make the SearchTerminationRecord for a finished search.
+        """
+        record = SearchTerminationRecord(best, best_action, elapsed, self.nodes_expanded, depth=depth,
+                                         pv=self.principal_variation, qnodes=self.qnodes,
+                                         tablebase_hits=self.tablebase_hits)
+        if self.tt is not None:
+            record.tt_hits = self.tt.hits
+            record.tt_misses = self.tt.misses
+            record.tt_collisions = self.tt.collisions
+        if self.ordering is not None:
+            record.cutoffs = self.ordering.cutoffs
+            record.first_move_cutoffs = self.ordering.first_move_cutoffs
+        if self.stats is not None:
+            self.stats.time = elapsed
+            self.stats.qnodes = self.qnodes
+            record.stats = self.stats
+            if self.stats_hook is not None:
+                self.stats_hook(self.stats)
+        return record
 
-        return SearchTerminationRecord(best, best_action, end - start, self.nodes_expanded)
+    def _check_budget(self):
+        """ Raise SearchAborted if the time or node budget has run out, or the search was stopped.
+        """
+        if self.stop_event is not None and self.stop_event.is_set():
+            raise SearchAborted()
+        if self.node_budget is not None and self.nodes_expanded >= self.node_budget:
+            raise SearchAborted()
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise SearchAborted()
+
+    def _draft(self, depth):
+        """ Return how many more levels the search will look below a state at the given depth.
+        """
+        limit = getattr(self.game, "depthLimit", 0)
+        if limit > 0:
+            return limit - depth + 1
+        return self.ifny
+
+    def _tablebase_value(self, state, depth):
+        """ Look for a state in the endgame tablebase.
+            :return: the value of the state for Max, or None if it is terminal or not in the table
+        """
+        if self.game.is_terminal(state):
+            return None
+        value = self.tablebase.probe(self.game, state, depth)
+        if value is not None:
+            self.tablebase_hits += 1
+        return value
+
+    def _probe(self, state):
+        """ Look up the state in the transposition table.
+            :return: the table entry, or None
+        """
+        if self.tt is None:
+            return None
+        return self.tt.probe(self.position_key(state))
+
+    def _store(self, state, best, bound, depth, best_action):
+        """ Put the result of searching the state into the transposition table.
+        """
+        if self.tt is not None:
+            if best_action is not None and self.symmetry:
+                best_action = self.game.canonical_move(state, best_action)
+            elif best_action is not None and getattr(self.tt, "encodes_moves", False):
+                best_action = self.game.encode_move(best_action)
+            self.tt.store(self.position_key(state), best, bound, self._draft(depth), best_action)
+
+    def _table_cutoff(self, entry, depth, alpha, beta):
+        """ Decide if a table entry settles the value of a state, for the given window.
+            :param entry: the table entry for the state, or None
+            :param depth: the depth of the state below the root
+            :return: True if the entry's value can be returned without searching
+        """
+        if entry is None or entry[2] < self._draft(depth):
+            return False
+        value, bound = entry[0], entry[1]
+        if bound == TranspositionTable.EXACT or \
+                (bound == TranspositionTable.LOWER and value >= beta) or \
+                (bound == TranspositionTable.UPPER and value <= alpha):
+            # the stored search may have been cut off, so a deeper one could still differ
+            self.cutoff_reached = True
+            return True
+        return False
+
+    def _entry_move(self, state, entry):
+        """ Return the best move stored in a table entry, or None.
+        """
+        if entry is None or entry[3] is None:
+            return None
+        if self.symmetry:
+            return self.game.from_canonical_move(state, entry[3])
+        if getattr(self.tt, "encodes_moves", False):
+            return self.game.decode_move(state, entry[3])
+        return entry[3]
+
+    def _capture_actions(self, state, depth):
+        """ Return the capturing actions for the state, sorted if there is a move ordering.
+        """
+        self.qnodes += 1
+        if self.qnodes % self.check_interval == 0:
+            self._check_budget()
+        actions = self.game.capture_actions(state)
+        if self.ordering is not None:
+            return self.ordering.order(state, actions, depth, None)
+        return list(actions)
+
+    def _ordered_actions(self, state, entry, depth, first=None):
+        """ Return the actions for the state, with the given first move, or else
+            the best move from the table entry, first.
+        """
+        if first is None:
+            first = self._entry_move(state, entry)
+        if self.ordering is None and hasattr(self.game, "staged_actions"):
+            # nothing to sort, so make each action only when the search gets to it
+            # (batch_eval needs them all at once, in a list)
+            actions = self.game.staged_actions(state, first)
+            return list(actions) if self.batch_eval else actions
+        if self.ordering is None and first is None and not self.batch_eval and hasattr(self.game, "iter_actions"):
+            return self.game.iter_actions(state)
+        actions = self.game.actions(state)
+        if self.ordering is not None:
+            return self.ordering.order(state, actions, depth, first)
+        if first is not None and first in actions:
+            actions = list(actions)
+            actions.remove(first)
+            actions.insert(0, first)
+        return actions
+
+    def _leaf_values(self, state, actions, depth):
+        """ Value all the children of a node at once, if they are all at the cut-off.
+            :param state: a legal game state, not at the cut-off itself
+            :param actions: the actions to value, in order
+            :param depth: the depth of the state below the root
+            :return: a list of values (for Max), one for each action, or None if the
+                     children have to be searched one at a time
+        """
+        if not self.batch_eval or self.quiescence or not self.game.cutoff_test(state, depth + 1):
+            return None
+        self.cutoff_reached = True
+        return self.game.eval_children(state, actions)
+
+    def _child_value(self, value_fn, state, act, *args):
+        """ Return the value of the state after the given action.
+            :param value_fn: the function that finds the value of the child state,
+                    e.g. __max_value or __min_value, for the player moving in the child
+            :param state: a legal game state
+            :param act: a legal action in the state
+            :param args: the rest of the arguments for value_fn
+            :return: the value of the child state
+        """
+        if self.inplace:
+            undo = self.game.make_move(state, act)
+            try:
+                return value_fn(state, *args)
+            finally:
+                # also when the search is aborted, so the state is left as it was given
+                self.game.unmake_move(state, undo)
+        return value_fn(self.game.result(state, act), *args)
 
     def __max_value(self, state, alpha, beta, depth):
         """ Return the minimax value of the given state, assuming Max's turn to move.
@@ -144,23 +1203,61 @@ class AlphaBeta(object):
             :param beta: the best Min can do elsewhere
             :return: the value that Max can obtain here
         """
+        if self.tablebase is not None:
+            known = self._tablebase_value(state, depth)
+            if known is not None:
+                # the endgame is solved
+                return known
 
         if self.game.is_terminal(state):
             # the game is over, return the utility
             best = self.game.utility(state)
         elif self.game.cutoff_test(state, depth):
-            best = self.game.eval(state)
+            self.cutoff_reached = True
+            if self.quiescence:
+                best = self.__quiesce_max(state, alpha, beta, depth, 0)
+            else:
+                best = self.game.eval(state)
         else:
+            entry = self._probe(state)
+            if self._table_cutoff(entry, depth, alpha, beta):
+                # the table already knows enough about this state
+                return entry[0]
             # look for the best among Max's options
+            original_alpha = alpha
             best = -self.ifny
+            best_action = None
             self.nodes_expanded += 1
-            for act in self.game.actions(state):
-                val = self.__min_value(self.game.result(state, act), alpha, beta, depth+1)
+            if self.stats is not None:
+                self.stats.expanded(depth)
+            if self.nodes_expanded % self.check_interval == 0:
+                self._check_budget()
+            actions = self._ordered_actions(state, entry, depth)
+            values = self._leaf_values(state, actions, depth)
+            for index, act in enumerate(actions):
+                if values is not None:
+                    val = values[index]
+                else:
+                    val = self._child_value(self.__min_value, state, act, alpha, beta, depth+1)
                 if val > best:
                     # remember something better
                     best = val
-                if best >= beta: return best
+                    best_action = act
+                if best >= beta:
+                    if self.stats is not None:
+                        self.stats.cutoff(index)
+                    if self.ordering is not None:
+                        self.ordering.cutoff(state, act, depth, self._draft(depth), index)
+                    break
                 alpha = max(alpha, best)
+            if self.tt is not None:
+                if best >= beta:
+                    bound = TranspositionTable.LOWER
+                elif best <= original_alpha:
+                    bound = TranspositionTable.UPPER
+                else:
+                    bound = TranspositionTable.EXACT
+                self._store(state, best, bound, depth, best_action)
         return best
 
     def __min_value(self, state, alpha, beta, depth):
@@ -170,22 +1267,353 @@ class AlphaBeta(object):
             :param beta: the best Min can do elsewhere
             :return: the value that Min can obtain here
         """
+        if self.tablebase is not None:
+            known = self._tablebase_value(state, depth)
+            if known is not None:
+                # the endgame is solved
+                return known
+
         if self.game.is_terminal(state):
             # the game is over, return the utility
             best = self.game.utility(state)
         elif self.game.cutoff_test(state, depth):
-            best = self.game.eval(state)
+            self.cutoff_reached = True
+            if self.quiescence:
+                best = self.__quiesce_min(state, alpha, beta, depth, 0)
+            else:
+                best = self.game.eval(state)
         else:
-            # look for the best among Max's options
+            entry = self._probe(state)
+            if self._table_cutoff(entry, depth, alpha, beta):
+                # the table already knows enough about this state
+                return entry[0]
+            # look for the best among Min's options
+            original_beta = beta
             best = self.ifny
+            best_action = None
             self.nodes_expanded += 1
-            for act in self.game.actions(state):
-                val = self.__max_value(self.game.result(state, act), alpha, beta, depth+1)
+            if self.stats is not None:
+                self.stats.expanded(depth)
+            if self.nodes_expanded % self.check_interval == 0:
+                self._check_budget()
+            actions = self._ordered_actions(state, entry, depth)
+            values = self._leaf_values(state, actions, depth)
+            for index, act in enumerate(actions):
+                if values is not None:
+                    val = values[index]
+                else:
+                    val = self._child_value(self.__max_value, state, act, alpha, beta, depth+1)
                 if val < best:
                     # remember something better
                     best = val
-                if best <= alpha: return best
+                    best_action = act
+                if best <= alpha:
+                    if self.stats is not None:
+                        self.stats.cutoff(index)
+                    if self.ordering is not None:
+                        self.ordering.cutoff(state, act, depth, self._draft(depth), index)
+                    break
                 beta = min(beta, best)
+            if self.tt is not None:
+                if best <= alpha:
+                    bound = TranspositionTable.UPPER
+                elif best >= original_beta:
+                    bound = TranspositionTable.LOWER
+                else:
+                    bound = TranspositionTable.EXACT
+                self._store(state, best, bound, depth, best_action)
+        return best
+
+    def __quiesce_max(self, state, alpha, beta, depth, qdepth):
+        """ Return the value of the given state past the cut-off, assuming Max's turn to move.
+            Max can take eval() (stand pat), or make a capture if that does better.
+            :param state: a legal game state
+            :param alpha: the best max can do elsewhere
+            :param beta: the best Min can do elsewhere
+            :param depth: the depth of the state below the root
+            :param qdepth: how many levels past the cut-off the state is
+            :return: the value that Max can obtain here
+        """
+        if self.game.is_terminal(state):
+            return self.game.utility(state)
+        best = self.game.eval(state)
+        if best >= beta or qdepth >= self.quiescence_depth:
+            return best
+        alpha = max(alpha, best)
+        for act in self._capture_actions(state, depth):
+            val = self._child_value(self.__quiesce_min, state, act, alpha, beta, depth+1, qdepth+1)
+            if val > best:
+                best = val
+            if best >= beta: return best
+            alpha = max(alpha, best)
         return best
 
+    def __quiesce_min(self, state, alpha, beta, depth, qdepth):
+        """ Return the value of the given state past the cut-off, assuming Min's turn to move.
+            Min can take eval() (stand pat), or make a capture if that does better.
+            :param state: a legal game state
+            :param alpha: the best max can do elsewhere
+            :param beta: the best Min can do elsewhere
+            :param depth: the depth of the state below the root
+            :param qdepth: how many levels past the cut-off the state is
+            :return: the value that Min can obtain here
+        """
+        if self.game.is_terminal(state):
+            return self.game.utility(state)
+        best = self.game.eval(state)
+        if best <= alpha or qdepth >= self.quiescence_depth:
+            return best
+        beta = min(beta, best)
+        for act in self._capture_actions(state, depth):
+            val = self._child_value(self.__quiesce_max, state, act, alpha, beta, depth+1, qdepth+1)
+            if val < best:
+                best = val
+            if best <= alpha: return best
+            beta = min(beta, best)
+        return best
+
+
+##########################################################################################
+class PVSearch(AlphaBeta):
+    """ An implementation of Principal Variation Search (NegaScout)
+        - negamax: every value is from the point of view of the player to move
+        - null window searches for all but the first move at each node
+        - aspiration windows between iterations of iterative deepening
+    """
+
+    def __init__(self, game, aspiration=5, **options):
+        """ Remember the game object.
+            :param: game: an object from the Game Class
+            :param: aspiration: the half-width of the aspiration window around the
+                    previous iteration's value; 0 means always use the full window
+            :param: options: the same options as AlphaBeta
+        """
+        AlphaBeta.__init__(self, game, **options)
+        self.aspiration = aspiration
+
+    def _search_root(self, state, maximizing, first, previous):
+        """ Search the given state to the current depth limit.
+            :param state: a legal game state
+            :param maximizing: True to find Max's move, False to find Min's
+            :param first: a move to try before the others, or None
+            :param previous: the value found by the previous iteration, or None
+            :return: the best value (for Max, like AlphaBeta), and the move that gets it
+        """
+        color = 1 if maximizing else -1
+        if previous is None or not self.aspiration or abs(previous) >= self.ifny:
+            best, best_action = self.__root(state, color, -self.ifny, self.ifny, first)
+            return color * best, best_action
+
+        # guess that the value is close to the previous one, and widen the window if not
+        guess = color * previous
+        delta = self.aspiration
+        while True:
+            alpha = guess - delta if delta < self.ifny else -self.ifny
+            beta = guess + delta if delta < self.ifny else self.ifny
+            best, best_action = self.__root(state, color, alpha, beta, first)
+            if alpha < best < beta or delta >= self.ifny:
+                return color * best, best_action
+            first = best_action
+            delta *= 4
+
+    def __root(self, state, color, alpha, beta, first):
+        """ Search all the options of the player to move in the given state.
+            :param state: a legal game state
+            :param color: 1 if it's Max's turn, -1 if it's Min's
+            :param alpha, beta: the window, from the point of view of the player to move
+            :param first: a move to try before the others, or None
+            :return: the best value for the player to move, and the move that gets it
+        """
+        original_alpha = alpha
+        best = -self.ifny
+        best_action = None
+        pv = []
+
+        self.nodes_expanded += 1
+        if self.stats is not None:
+            self.stats.expanded(0)
+        for index, act in enumerate(self._ordered_actions(state, self._probe(state), 0, first)):
+            child_pv = []
+            if index == 0:
+                val = -self._child_value(self.__pvs, state, act, -beta, -alpha, 1, -color, child_pv)
+            else:
+                val = -self._child_value(self.__pvs, state, act, -alpha - 1, -alpha, 1, -color, child_pv)
+                if alpha < val < beta:
+                    # better than the first move after all, find out by how much
+                    child_pv = []
+                    val = -self._child_value(self.__pvs, state, act, -beta, -alpha, 1, -color, child_pv)
+            if val > best:
+                best = val
+                best_action = act
+                pv = [act] + child_pv
+            alpha = max(alpha, best)
+            if alpha >= beta: break
+
+        self._store(state, best, self.__bound(best, original_alpha, beta), 0, best_action)
+        self.principal_variation = pv
+        return best, best_action
+
+    def __pvs(self, state, alpha, beta, depth, color, pv):
+        """ Return the negamax value of the given state.
+            :param state: a legal game state
+            :param alpha: the best the player to move can do elsewhere
+            :param beta: the best the opponent can do elsewhere, negated
+            :param depth: the depth of the state below the root
+            :param color: 1 if it's Max's turn, -1 if it's Min's
+            :param pv: an empty list, filled with the best line of play from here
+            :return: the value that the player to move can obtain here
+        """
+        if self.tablebase is not None:
+            known = self._tablebase_value(state, depth)
+            if known is not None:
+                # the endgame is solved
+                return color * known
 
+        if self.game.is_terminal(state):
+            # the game is over, return the utility
+            return color * self.game.utility(state)
+        if self.game.cutoff_test(state, depth):
+            self.cutoff_reached = True
+            if self.quiescence:
+                return self.__quiesce(state, alpha, beta, depth, 0, color)
+            return color * self.game.eval(state)
+
+        entry = self._probe(state)
+        if self._table_cutoff(entry, depth, alpha, beta):
+            # the table already knows enough about this state
+            move = self._entry_move(state, entry)
+            if move is not None:
+                pv.append(move)
+            return entry[0]
+
+        original_alpha = alpha
+        best = -self.ifny
+        best_action = None
+        self.nodes_expanded += 1
+        if self.stats is not None:
+            self.stats.expanded(depth)
+        if self.nodes_expanded % self.check_interval == 0:
+            self._check_budget()
+        actions = self._ordered_actions(state, entry, depth)
+        values = self._leaf_values(state, actions, depth)
+        for index, act in enumerate(actions):
+            child_pv = []
+            if values is not None:
+                # the children are leaves, so their values are exact
+                val = color * values[index]
+            elif index == 0:
+                val = -self._child_value(self.__pvs, state, act, -beta, -alpha, depth+1, -color, child_pv)
+            else:
+                val = -self._child_value(self.__pvs, state, act, -alpha - 1, -alpha, depth+1, -color, child_pv)
+                if alpha < val < beta:
+                    child_pv = []
+                    val = -self._child_value(self.__pvs, state, act, -beta, -alpha, depth+1, -color, child_pv)
+            if val > best:
+                best = val
+                best_action = act
+                if val > alpha:
+                    pv[:] = [act] + child_pv
+            alpha = max(alpha, best)
+            if alpha >= beta:
+                if self.stats is not None:
+                    self.stats.cutoff(index)
+                if self.ordering is not None:
+                    self.ordering.cutoff(state, act, depth, self._draft(depth), index)
+                break
+
+        if self.tt is not None:
+            self._store(state, best, self.__bound(best, original_alpha, beta), depth, best_action)
+        return best
+
+    def __quiesce(self, state, alpha, beta, depth, qdepth, color):
+        """ Return the negamax value of the given state past the cut-off.
+            The player to move can take eval() (stand pat), or make a capture if that does better.
+            :param state: a legal game state
+            :param alpha, beta: the window, from the point of view of the player to move
+            :param depth: the depth of the state below the root
+            :param qdepth: how many levels past the cut-off the state is
+            :param color: 1 if it's Max's turn, -1 if it's Min's
+            :return: the value that the player to move can obtain here
+        """
+        if self.game.is_terminal(state):
+            return color * self.game.utility(state)
+        best = color * self.game.eval(state)
+        if best >= beta or qdepth >= self.quiescence_depth:
+            return best
+        alpha = max(alpha, best)
+        for act in self._capture_actions(state, depth):
+            val = -self._child_value(self.__quiesce, state, act, -beta, -alpha, depth+1, qdepth+1, -color)
+            if val > best:
+                best = val
+            if best >= beta: return best
+            alpha = max(alpha, best)
+        return best
+
+    def _search_value(self, state, maximizing, alpha, beta, depth):
+        """ Return the value of the given state (for Max), for minimax_value().
+        """
+        color = 1 if maximizing else -1
+        if maximizing:
+            return self.__pvs(state, alpha, beta, depth, color, [])
+        return -self.__pvs(state, -beta, -alpha, depth, color, [])
+
+    # the kind of bound a value is, once the value is negated
+    flippedBounds = {TranspositionTable.EXACT: TranspositionTable.EXACT,
+                     TranspositionTable.LOWER: TranspositionTable.UPPER,
+                     TranspositionTable.UPPER: TranspositionTable.LOWER}
+
+    def _probe(self, state):
+        """ Look up the state in the transposition table.  The table keeps every value
+            from Max's point of view, like AlphaBeta's, so that the two searchers can
+            share a table (or a PositionCache); the entry is turned to the point of view
+            of the player to move.
+            :return: the table entry, or None
+        """
+        entry = AlphaBeta._probe(self, state)
+        if entry is None or state.maxsTurn:
+            return entry
+        value, bound, depth, move = entry
+        return -value, self.flippedBounds[bound], depth, move
+
+    def _store(self, state, best, bound, depth, best_action):
+        """ Put the result of searching the state into the transposition table,
+            from Max's point of view.
+        """
+        if not state.maxsTurn:
+            best, bound = -best, self.flippedBounds[bound]
+        AlphaBeta._store(self, state, best, bound, depth, best_action)
+
+    def __bound(self, best, alpha, beta):
+        """ Return the kind of bound a value is, for the window it was searched with.
+        """
+        if best >= beta:
+            return TranspositionTable.LOWER
+        if best <= alpha:
+            return TranspositionTable.UPPER
+        return TranspositionTable.EXACT
+
+
+# the searchers that make_searcher() knows about;
+# a string names a class in another module, which is imported when it is first used
+searchers = {
+    "alphabeta": AlphaBeta,
+    "pvs": PVSearch,
+    "parallel": "ParallelSearch.ParallelSearch",
+    "mcts": "MCTS.MCTS",
+}
+
+
+def make_searcher(name, game, **options):
+    """ Make a searcher by name.
+        :param name: a key of searchers, e.g. "alphabeta" or "pvs"
+        :param game: an object from the Game Class
+        :param options: the keyword arguments for the searcher's class
+        :return: the searcher
+    """
+    if name not in searchers:
+        raise ValueError("Unknown searcher {!r}, expected one of {}".format(name, sorted(searchers)))
+    searcher_class = searchers[name]
+    if isinstance(searcher_class, str):
+        module_name, class_name = searcher_class.rsplit(".", 1)
+        searcher_class = getattr(importlib.import_module(module_name), class_name)
+    return searcher_class(game, **options)
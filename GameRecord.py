@@ -0,0 +1,268 @@
+##########################################################################################
+# A compact binary format for saving played games, e.g. for training data, replaying
+# games after a change, and looking back at how a match was lost.
+#
+# A file is a short file header (magic, version), followed by any number of games,
+# each written as one block when the game ends, so a file can be appended to by
+# one game loop after another:
+#    game header - board size, flags, result, number of moves, length of the metadata
+#    metadata    - a JSON object, e.g. the players, their configurations and the seed;
+#                  "rows" and "maxsTurn" give the start position if it isn't the usual one
+#    moves       - one 16-bit move code (see JediChessGame.Game.move_code()) per move
+#    and, if the flags say so, for every move:
+#    values      - the minimax value the player found, as a 32-bit float (NaN if none)
+#    nodes       - the nodes the player's search expanded, as a 32-bit integer
+#    seconds     - the time the player took, as a 32-bit float
+#
+# GameRecord(size, meta)
+#    - one game: add() each move as it is made, then finish() with the final state
+# GameRecordWriter(path)
+#    - appends games to a file: write(record); flush(); close()
+# read_games(path)
+#    - generates the GameRecords of a file one at a time, so a file of any size
+#      can be read without holding more than one game in memory
+# record.replay(game)
+#    - generates (state, action) for each move, from the start position
+#
+#    with GameRecordWriter("games.bin") as writer:
+#        RunGame.play_game(game, player1, player2, writer=writer)
+#    for record in read_games("games.bin"):
+#        for state, action in record.replay(JediChessBitboard.PackedMoveGame(record.size)):
+#            ...
+#
+# To sum up a file, and check that every game in it replays:
+#    python GameRecord.py games.bin
+
+import argparse
+import array
+import collections
+import json
+import math
+import struct
+import sys
+
+from JediChessBitboard import BitboardGame
+
+
+class GameRecord(object):
+    """ The moves of one game, and how it ended.
+
+        The object has the following attributes:
+            self.size - the size of the game board
+            self.meta - a dictionary of anything else to keep with the game
+            self.moves - an array('H') of move codes
+            self.values, self.nodes, self.seconds - arrays with the search results of
+                        each move, or None if they are not kept
+            self.result - 1 if the rebels won, -1 if the sith won, 0 for a draw
+    """
+
+    header = struct.Struct("<BBbIH")
+
+    # the bits of the flags in the header
+    hasSearch = 1
+
+    def __init__(self, size, meta=None, search=True):
+        """ Start an empty game record.
+            :param size: the size of the game board
+            :param meta: a dictionary that can be written as JSON, or None
+            :param search: True to keep the value, nodes and time of every move
+        """
+        self.size = size
+        self.meta = meta if meta is not None else dict()
+        self.moves = array.array("H")
+        if search:
+            self.values = array.array("f")
+            self.nodes = array.array("I")
+            self.seconds = array.array("f")
+        else:
+            self.values = self.nodes = self.seconds = None
+        self.result = 0
+
+    def __len__(self):
+        return len(self.moves)
+
+    def add(self, game, state, action, result=None):
+        """ Add a move, before it is made.
+            :param game: an object from the Game Class, with move_code()
+            :param state: the state the move is made in
+            :param action: the action chosen
+            :param result: the SearchTerminationRecord that chose it, or None
+        """
+        self.moves.append(game.move_code(state, action))
+        if self.values is not None:
+            value = result.value if result is not None and result.value is not None else math.nan
+            self.values.append(value)
+            self.nodes.append(min(result.nodes, 0xFFFFFFFF) if result is not None else 0)
+            self.seconds.append(result.time if result is not None else 0.0)
+
+    def finish(self, state):
+        """ Record how the game ended.
+            :param state: the final state of the game
+        """
+        if not state.cachedWin:
+            self.result = 0
+        elif state.cachedWinner:
+            self.result = 1
+        else:
+            self.result = -1
+
+    def start_state(self, game):
+        """ Return the state the game started from.
+            :param game: an object from the Game Class, for the board size of the record
+        """
+        if "rows" in self.meta:
+            return game.state_from_rows(self.meta["rows"], self.meta.get("maxsTurn", True))
+        return game.initial_state()
+
+    def replay(self, game):
+        """ Play the game through again.
+            :param game: an object from the Game Class, for the board size of the record
+            :return: a generator of (state, action) for each move, the action as the
+                     game's actions() gives it; the state is only good until the next one
+        """
+        if game.gameSize != self.size:
+            raise ValueError("The game is for size {}, not {}".format(self.size, game.gameSize))
+        state = self.start_state(game)
+        for code in self.moves:
+            game.is_maxs_turn(state)  # counts the move, like a player asking would
+            action = game.decode_move(state, code)
+            if action is None:
+                raise ValueError("Move {} of the record does not fit the game".format(code))
+            yield state, action
+            state = game.result(state, action)
+
+    def pack(self):
+        """ Return the game in the binary format, as bytes.
+        """
+        meta = json.dumps(self.meta, sort_keys=True).encode("utf-8")
+        flags = self.hasSearch if self.values is not None else 0
+        parts = [self.header.pack(self.size, flags, self.result, len(self.moves), len(meta)), meta]
+        arrays = [self.moves]
+        if self.values is not None:
+            arrays += [self.values, self.nodes, self.seconds]
+        for data in arrays:
+            if sys.byteorder != "little":
+                data = array.array(data.typecode, data)
+                data.byteswap()
+            parts.append(data.tobytes())
+        return b"".join(parts)
+
+    @classmethod
+    def read(cls, f):
+        """ Read the next game from a file.
+            :param f: a file opened for reading in binary
+            :return: a GameRecord, or None at the end of the file
+        """
+        head = f.read(cls.header.size)
+        if not head:
+            return None
+        if len(head) < cls.header.size:
+            raise ValueError("The last game in the file is cut short")
+        size, flags, result, count, metaLength = cls.header.unpack(head)
+        record = cls(size, json.loads(f.read(metaLength).decode("utf-8")), bool(flags & cls.hasSearch))
+        record.result = result
+        arrays = [record.moves]
+        if record.values is not None:
+            arrays += [record.values, record.nodes, record.seconds]
+        for data in arrays:
+            try:
+                data.fromfile(f, count)
+            except EOFError:
+                raise ValueError("The last game in the file is cut short")
+            if sys.byteorder != "little":
+                data.byteswap()
+        return record
+
+
+class GameRecordWriter(object):
+    """ Appends games to a file of game records.
+    """
+
+    magic = b"JCGR"
+    version = 1
+    header = struct.Struct("<4sH")
+
+    def __init__(self, path):
+        """ Open the file, writing the file header if it is new (or empty).
+            :param path: the file name
+        """
+        self.path = path
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(self.header.pack(self.magic, self.version))
+        self.games = 0
+
+    def write(self, record):
+        """ Append a finished game.
+            :param record: a GameRecord, or the bytes of GameRecord.pack()
+        """
+        self.file.write(record if isinstance(record, bytes) else record.pack())
+        self.games += 1
+
+    def flush(self):
+        """ Make sure the games written so far are in the file.
+        """
+        self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_games(path):
+    """ Read the games in a file, one at a time.
+        :param path: the file name
+        :return: a generator of GameRecords, in the order they were written
+    """
+    with open(path, "rb") as f:
+        head = f.read(GameRecordWriter.header.size)
+        magic, version = GameRecordWriter.header.unpack(head) if len(head) == GameRecordWriter.header.size \
+            else (None, None)
+        if magic != GameRecordWriter.magic or version != GameRecordWriter.version:
+            raise ValueError("{!r} is not a game record file".format(path))
+        while True:
+            record = GameRecord.read(f)
+            if record is None:
+                return
+            yield record
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sum up a file of game records")
+    parser.add_argument("path", help="the file to read")
+    parser.add_argument("--no-replay", action="store_true", help="don't check that the games replay")
+    args = parser.parse_args(argv)
+
+    games = collections.Counter()
+    results = collections.Counter()
+    moves = 0
+    referees = dict()
+    for record in read_games(args.path):
+        games[record.size] += 1
+        results[{1: "Rebels", -1: "Sith"}.get(record.result, "draw")] += 1
+        moves += len(record)
+        if not args.no_replay:
+            if record.size not in referees:
+                referees[record.size] = BitboardGame(record.size)
+            for _ in record.replay(referees[record.size]):
+                pass
+    total = sum(games.values())
+    print("{} games, {} moves".format(total, moves))
+    for size in sorted(games):
+        print("  {}x{}: {} games".format(size, size, games[size]))
+    for name in ("Rebels", "Sith", "draw"):
+        print("  {}: {}".format(name, results[name]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# eof
@@ -0,0 +1,769 @@
+"""
+Jeremy Storring, JNS855, 11218129
+CMPT 317: A4Q4
+Michael Horsch
+"""
+
+# A compact implementation of the Jedi Chess rules.
+#
+# BitboardGame implements the same Game Class Interface as JediChessGame.Game
+# (see the top of JediChessGame.py), so AlphaBetaDL.AlphaBeta and the Players
+# classes can use it unchanged.  The rules are identical; only the state
+# representation differs:
+#    - the board is stored as one integer mask per piece type
+#      (bit r * size + c is set if that piece type is on square (r, c))
+#    - there are no piece names, so actions carry the piece type ("R", "J", "S")
+#      where JediChessGame carries the piece name ("R3", "J0", "S1")
+#
+# A board of up to 8x8 fits one 64-bit word per mask.
+#
+# PackedMoveGame is the same again, with every action a 16-bit move code
+# (see Game.move_code()) instead of a tuple.
+#
+# If NumPy is installed, eval_batch() values a batch of states together: the masks
+# are unpacked into one 0/1 plane per piece type and multiplied by the eval tables.
+#
+# To use the BitboardGame class:
+#    game = BitboardGame(7, depth=3)
+#    state = game.initial_state()
+#    searcher = AlphaBetaDL.AlphaBeta(game)
+
+import array
+
+from JediChessGame import Game, zobrist_keys
+
+try:
+    import numpy
+except ImportError:  # eval_batch() values one state at a time instead
+    numpy = None
+
+
+class BitboardState(object):
+    """ The BitboardState class stores the information about the state of the game.
+
+        The object has the following attributes:
+            self.gameSize - the size of the game board
+            self.rebelBits - an integer mask with one bit set for each rebel on the board
+            self.jediBits - an integer mask with one bit set for each jedi on the board
+            self.sithBits - an integer mask with one bit set for each sith on the board
+            self.maxsTurn - a boolean value, True if it's Max's turn
+            self.moveCount - a variable that keeps track of how many moves have been made, 40 is the limit
+            self.cachedWin - a boolean value, True if one of the players has won
+            self.cachedWinner - if cachedWin is True, this is a Boolean (True: Win for Max)
+                                None if cachedWin is False
+            self.key - the 64-bit Zobrist key of the state, the same key that
+                       JediChessGame.GameState has for the same position
+            self.mirrorKey - the key of the state's left-right mirror image
+            self.score - the eval score of the pieces on the board, kept up to date by BitboardGame
+            self.scoreTables - the Game.evalTables that score was added up with, or None
+    """
+
+    __slots__ = ("gameSize", "rebelBits", "jediBits", "sithBits",
+                 "maxsTurn", "moveCount", "cachedWin", "cachedWinner", "key", "mirrorKey",
+                 "score", "scoreTables")
+
+    def __init__(self, size):
+        """ Create a new game state object, with the sith in the top middle
+            and the rebels across the bottom row.
+        """
+        self.gameSize = size
+        self.sithBits = 1 << (size // 2)
+        self.rebelBits = ((1 << size) - 1) << (size * (size - 1))
+        self.jediBits = 0
+        self.maxsTurn = True
+        self.moveCount = 0
+        self.cachedWinner = None
+        self.cachedWin = False
+        self.key = zobrist_keys(size).state_key(self.pieces(), self.maxsTurn, self.moveCount)
+        self.mirrorKey = zobrist_keys(size).state_key(self.pieces(), self.maxsTurn, self.moveCount, mirror=True)
+        # the game adds up the score with its own tables
+        self.score = 0
+        self.scoreTables = None
+
+    def myclone(self, size):
+        """ Make and return an exact copy of the state.
+        """
+        newState = BitboardState.__new__(BitboardState)
+        newState.gameSize = self.gameSize
+        newState.rebelBits = self.rebelBits
+        newState.jediBits = self.jediBits
+        newState.sithBits = self.sithBits
+        newState.maxsTurn = self.maxsTurn
+        newState.moveCount = self.moveCount
+        newState.cachedWin = self.cachedWin
+        newState.cachedWinner = self.cachedWinner
+        newState.key = self.key
+        newState.mirrorKey = self.mirrorKey
+        newState.score = self.score
+        newState.scoreTables = self.scoreTables
+        return newState
+
+    def pieces(self):
+        """ Generate a (piece type, square) pair for every piece on the board.
+        """
+        for piece, bits in (("S", self.sithBits), ("R", self.rebelBits), ("J", self.jediBits)):
+            while bits:
+                low = bits & -bits
+                yield piece, low.bit_length() - 1
+                bits ^= low
+
+    def piece_at(self, r, c):
+        """ Return the piece type on the given square.
+            :param r: the row
+            :param c: the column
+            :return: "S", "R", "J", or None for an empty square
+        """
+        bit = 1 << (r * self.gameSize + c)
+        if self.sithBits & bit:
+            return "S"
+        if self.rebelBits & bit:
+            return "R"
+        if self.jediBits & bit:
+            return "J"
+        return None
+
+    def display(self):
+        """
+        Present the game state to the console.
+        """
+        for r in range(0, self.gameSize):
+            print("+--" * self.gameSize + "+")
+            print("|", end="")
+            for c in range(0, self.gameSize):
+                piece = self.piece_at(r, c)
+                print((piece + " ") if piece else "  ", end="")
+                print("|", end="")
+            print()
+        print("+--" * self.gameSize + "+")
+
+    def __str__(self):
+        s = []
+        for r in range(0, self.gameSize):
+            for c in range(0, self.gameSize):
+                s.append(self.piece_at(r, c) or "-")
+        return "".join(s)
+
+
+class BitboardGame(Game):
+    """ The Jedi Chess rules on a BitboardState.
+        The move tables for the board size are built once per board size, and shared.
+    """
+
+    # smaller batches are quicker to value one state at a time than to hand to NumPy
+    batchMinimum = 16
+
+    def __init__(self, size, depth=0, weights=None, pst=None, eval_file=None):
+        """ Initialization.
+            :param weights, pst, eval_file: changes to the eval, as for JediChessGame.Game
+        """
+        Game.__init__(self, size, depth, weights, pst, eval_file)
+        self.squares = size * size
+        self._batchTables = None  # (evalTables, the same as a NumPy array), made when first needed
+        # the move tables are shared with JediChessGame.Game, see JediChessGame.MoveTables
+        self.points = self.moveTables.points
+        self.sithSteps = self.moveTables.sithSteps
+        self.sithMasks = self.moveTables.sithMasks
+        self.jediRays = self.moveTables.jediRays
+        self.rebelSteps = self.moveTables.rebelSteps
+
+    def initial_state(self):
+        """ Return an initial state for the game.
+        """
+        newState = BitboardState(self.gameSize)
+        self.score_state(newState)
+        return newState
+
+    def score_state(self, state):
+        """ Add up the score of the pieces on the board from scratch, using this game's tables.
+            :param state: a game state, whose score is set
+        """
+        tables = self.evalTables
+        state.score = sum(tables[piece][sq] for piece, sq in state.pieces())
+        state.scoreTables = tables
+
+    def state_from_rows(self, rows, maxsTurn=True, moveCount=0):
+        """ Return a state with the given pieces on the board.
+            :param rows: one string per row, top row first, with one character per square:
+                         "S", "R" or "J" for a piece, anything else for an empty square
+            :param maxsTurn: True if it's Max's turn
+            :param moveCount: the number of moves made
+            :return: a game state
+        """
+        size = self.gameSize
+        if len(rows) != size or any(len(row) != size for row in rows):
+            raise ValueError("Expected {0} rows of {0} squares".format(size))
+        bits = {"S": 0, "R": 0, "J": 0}
+        for r in range(size):
+            for c in range(size):
+                if rows[r][c] in bits:
+                    bits[rows[r][c]] |= 1 << (r * size + c)
+        state = BitboardState.__new__(BitboardState)
+        state.gameSize = size
+        state.sithBits = bits["S"]
+        state.rebelBits = bits["R"]
+        state.jediBits = bits["J"]
+        state.maxsTurn = maxsTurn
+        state.moveCount = moveCount
+        state.cachedWin = state.sithBits == 0 or (state.rebelBits | state.jediBits) == 0
+        state.cachedWinner = state.sithBits == 0 if state.cachedWin else None
+        state.key = self.zobrist.state_key(state.pieces(), maxsTurn, moveCount)
+        state.mirrorKey = self.zobrist.state_key(state.pieces(), maxsTurn, moveCount, mirror=True)
+        self.score_state(state)
+        return state
+
+    def is_terminal(self, state):
+        """ Indicate if the game is over.
+            :param state: a game state
+            :return: a boolean indicating if state is terminal
+        """
+        return state.cachedWin or state.moveCount == self.moveLimit or state.sithBits == 0 or \
+            (state.rebelBits | state.jediBits) == 0
+
+    def piece_count(self, state):
+        """ Returns the number of pieces on the board.
+        """
+        return (state.sithBits | state.rebelBits | state.jediBits).bit_count()
+
+    def _squares_of(self, bits):
+        """ Generate the square index of every set bit in the mask, lowest first.
+            :param bits: an integer mask
+        """
+        while bits:
+            low = bits & -bits
+            yield low.bit_length() - 1
+            bits ^= low
+
+    def iterRebelActions(self, state):
+        """
+        Generates the legal actions for each rebel on the game board
+        :param state: a state object
+        :return: a generator of rebel actions legal in the given state
+        """
+        sith = state.sithBits
+        for sq in self._squares_of(state.rebelBits):
+            oldX, oldY = self.points[sq]
+            right, left, forward = self.rebelSteps[sq]
+            if right is not None and sith >> right & 1:
+                yield (state.maxsTurn, "R", oldX - 1, oldY + 1, oldX, oldY)
+            if left is not None and sith >> left & 1:
+                yield (state.maxsTurn, "R", oldX - 1, oldY - 1, oldX, oldY)
+            if forward is not None:
+                yield (state.maxsTurn, "R", oldX - 1, oldY, oldX, oldY)
+
+    def iterJediActions(self, state):
+        """
+        Generates the legal actions for each jedi on the game board
+        :param state: a state object
+        :return: a generator of jedi actions legal in the given state
+        """
+        points = self.points
+        sith = state.sithBits
+        occupied = sith | state.rebelBits | state.jediBits
+        for sq in self._squares_of(state.jediBits):
+            oldX, oldY = points[sq]
+            for ray in self.jediRays[sq]:
+                for to in ray:
+                    if occupied >> to & 1:
+                        if sith >> to & 1:
+                            x, y = points[to]
+                            yield (state.maxsTurn, "J", x, y, oldX, oldY)
+                        break
+                    x, y = points[to]
+                    yield (state.maxsTurn, "J", x, y, oldX, oldY)
+
+    def iterSithActions(self, state):
+        """
+        Generates the legal actions for each sith on the game board
+        :param state: a state object
+        :return: a generator of sith actions legal in the given state
+        """
+        points = self.points
+        sith = state.sithBits
+        for sq in self._squares_of(sith):
+            oldX, oldY = points[sq]
+            # the squares around the sith without another sith, lowest first like sithSteps
+            for to in self._squares_of(self.sithMasks[sq] & ~sith):
+                x, y = points[to]
+                yield (state.maxsTurn, "S", x, y, oldX, oldY)
+
+    def capture_actions(self, state):
+        """ Generate the legal actions that capture (or turn) a piece, or promote
+            a rebel to a jedi.
+            :param state: a state object
+            :return: a generator of actions legal in the given state
+        """
+        sith = state.sithBits
+        if state.maxsTurn:
+            occupied = sith | state.rebelBits | state.jediBits
+            for sq in self._squares_of(state.rebelBits):
+                oldX, oldY = self.points[sq]
+                right, left, forward = self.rebelSteps[sq]
+                if right is not None and sith >> right & 1:
+                    yield (state.maxsTurn, "R", oldX - 1, oldY + 1, oldX, oldY)
+                if left is not None and sith >> left & 1:
+                    yield (state.maxsTurn, "R", oldX - 1, oldY - 1, oldX, oldY)
+                if forward is not None and (sith >> forward & 1 or (oldX == 1 and not occupied >> forward & 1)):
+                    yield (state.maxsTurn, "R", oldX - 1, oldY, oldX, oldY)
+            for sq in self._squares_of(state.jediBits):
+                oldX, oldY = self.points[sq]
+                for ray in self.jediRays[sq]:
+                    for to in ray:
+                        if occupied >> to & 1:
+                            if sith >> to & 1:
+                                x, y = self.points[to]
+                                yield (state.maxsTurn, "J", x, y, oldX, oldY)
+                            break
+        else:
+            targets = state.rebelBits | state.jediBits
+            for sq in self._squares_of(sith):
+                oldX, oldY = self.points[sq]
+                for to in self.sithSteps[sq]:
+                    if targets >> to & 1:
+                        x, y = self.points[to]
+                        yield (state.maxsTurn, "S", x, y, oldX, oldY)
+
+    def quiet_actions(self, state):
+        """ Generate the legal actions that capture_actions() does not.
+            :param state: a state object
+            :return: a generator of actions legal in the given state
+        """
+        points = self.points
+        sith = state.sithBits
+        occupied = sith | state.rebelBits | state.jediBits
+        if state.maxsTurn:
+            for sq in self._squares_of(state.rebelBits):
+                forward = self.rebelSteps[sq][2]
+                if forward is not None and not sith >> forward & 1:
+                    oldX, oldY = points[sq]
+                    if oldX != 1 or occupied >> forward & 1:
+                        yield (state.maxsTurn, "R", oldX - 1, oldY, oldX, oldY)
+            for sq in self._squares_of(state.jediBits):
+                oldX, oldY = points[sq]
+                for ray in self.jediRays[sq]:
+                    for to in ray:
+                        if occupied >> to & 1:
+                            break
+                        x, y = points[to]
+                        yield (state.maxsTurn, "J", x, y, oldX, oldY)
+        else:
+            for sq in self._squares_of(sith):
+                oldX, oldY = points[sq]
+                for to in self._squares_of(self.sithMasks[sq] & ~occupied):
+                    x, y = points[to]
+                    yield (state.maxsTurn, "S", x, y, oldX, oldY)
+
+    def _occupant(self, state, x, y):
+        """ Return the piece type on a square, or None for an empty square.
+        """
+        return state.piece_at(x, y)
+
+    def decode_move(self, state, code):
+        """ Turn an integer from encode_move() back into an action.
+            :param state: the game state the action is for
+            :param code: an integer from encode_move()
+            :return: the action, or None if the player to move has no piece
+                     on the square it moves from
+        """
+        oldX, oldY = divmod(code & 63, self.gameSize)
+        x, y = divmod(code >> 6 & 63, self.gameSize)
+        if oldX >= self.gameSize or x >= self.gameSize:
+            return None
+        piece = state.piece_at(oldX, oldY)
+        if piece is None or (piece == "S") == state.maxsTurn:
+            return None
+        return (state.maxsTurn, piece, x, y, oldX, oldY)
+
+    def result(self, state, action):
+        """ Return the state that results from the application of the
+            given action in the given state.
+            :param state: a legal game state
+            :param action: a legal action in the game state
+            :return: a new game state
+        """
+        newState = state.myclone(state.gameSize)
+        self._apply(newState, action)
+        return newState
+
+    def make_move(self, state, action):
+        """ Apply the given action to the given state in place.
+            :param state: a legal game state, which is changed
+            :param action: a legal action in the game state
+            :return: an undo record, to give to unmake_move()
+        """
+        undo = (state.rebelBits, state.jediBits, state.sithBits,
+                state.maxsTurn, state.cachedWin, state.cachedWinner, state.key, state.mirrorKey,
+                state.score, state.scoreTables)
+        self._apply(state, action)
+        return undo
+
+    def unmake_move(self, state, undo):
+        """ Undo an action applied by make_move().
+            :param state: the state given to make_move()
+            :param undo: the undo record returned by make_move()
+        """
+        state.rebelBits, state.jediBits, state.sithBits, \
+            state.maxsTurn, state.cachedWin, state.cachedWinner, state.key, state.mirrorKey, \
+            state.score, state.scoreTables = undo
+
+    def _apply(self, state, action):
+        """ Apply the action to the state, in place.
+            :param state: a legal game state
+            :param action: a legal action in the game state, as a tuple or a move code
+        """
+        size = self.gameSize
+        if isinstance(action, int):
+            # a move code: the piece is whatever stands on the square it moves from
+            frmSq = action & 63
+            toSq = action >> 6 & 63
+            who = state.maxsTurn
+            if not who:
+                piece = "S"
+            elif state.rebelBits >> frmSq & 1:
+                piece = "R"
+            else:
+                piece = "J"
+        else:
+            who, piece, x, y, oldX, oldY = action
+            frmSq = oldX * size + oldY
+            toSq = x * size + y
+        before = (state.sithBits, state.rebelBits, state.jediBits)
+        to = 1 << toSq
+        frm = 1 << frmSq
+        if piece[0] == "R":
+            if not (state.rebelBits | state.jediBits) & to:
+                # an empty spot or a sith: the sith is captured, and a rebel reaching the top row becomes a jedi
+                state.sithBits &= ~to
+                state.rebelBits ^= frm
+                if toSq < size:
+                    state.jediBits |= to
+                else:
+                    state.rebelBits |= to
+        elif piece[0] == "J":
+            state.sithBits &= ~to
+            state.jediBits ^= frm | to
+        else:
+            if state.jediBits & to:
+                # the jedi is turned, and the sith stays where it was
+                state.jediBits ^= to
+                state.sithBits |= to
+            else:
+                state.rebelBits &= ~to
+                state.sithBits ^= frm | to
+
+        state.maxsTurn = not state.maxsTurn  # change turns
+        # XOR in the pieces on the (at most two) squares that changed in each mask,
+        # and take their scores out of (or add them to) the score
+        pieces = self.zobrist.pieces
+        mirrored = self.zobrist.mirrored
+        tables = self.evalTables
+        key = state.key ^ self.zobrist.minsTurn
+        mirrorKey = state.mirrorKey ^ self.zobrist.minsTurn
+        score = state.score
+        for piece, old, new in zip("SRJ", before, (state.sithBits, state.rebelBits, state.jediBits)):
+            for sq in self._squares_of(old ^ new):
+                key ^= pieces[piece][sq]
+                mirrorKey ^= mirrored[piece][sq]
+                if old >> sq & 1:
+                    score -= tables[piece][sq]
+                else:
+                    score += tables[piece][sq]
+        state.key = key
+        state.mirrorKey = mirrorKey
+        if state.scoreTables is tables:
+            state.score = score
+        else:
+            self.score_state(state)
+        if (state.rebelBits | state.jediBits) == 0 or state.sithBits == 0:
+            state.cachedWin = True
+            state.cachedWinner = who
+
+    def eval(self, state):
+        """
+            When a depth limit is applied, we need to evaluate the
+            given state to estimate who might win.
+            state: a legal game state
+            :return: a numeric value in the range of the utility function
+        """
+        # the pieces' part is kept in state.score; see Game.eval_tables()
+        if state.scoreTables is not self.evalTables:
+            self.score_state(state)
+        if state.maxsTurn:
+            turnBonus = self.turnBonus
+        else:
+            turnBonus = -self.turnBonus
+        if self.mobilityWeight:
+            return turnBonus + state.score + self.mobilityWeight * self.mobility(state)
+        return turnBonus + state.score
+
+    def eval_batch(self, states):
+        """ Value a list of states in one call, with NumPy if it is installed.
+            :param states: a list of legal game states
+            :return: a list with utility() of each terminal state, and eval() of the others
+        """
+        if numpy is None or len(states) < self.batchMinimum or self.mobilityWeight:
+            return Game.eval_batch(self, states)
+        tables = self.__batch_tables()
+        squares = self.squares
+
+        # planes[i, p, sq] is 1 if piece type p (S, R, J) is on square sq in states[i]
+        masks = numpy.array([(state.sithBits, state.rebelBits, state.jediBits) for state in states], dtype="<u8")
+        planes = numpy.unpackbits(masks.view(numpy.uint8).reshape(len(states), 3, 8), axis=2, bitorder="little")
+        planes = planes[:, :, :squares]
+        score = numpy.einsum("nps,ps->n", planes, tables)
+
+        maxsTurn = numpy.array([state.maxsTurn for state in states])
+        value = score + numpy.where(maxsTurn, self.turnBonus, -self.turnBonus)
+
+        # the terminal states, as is_terminal() and utility() decide
+        counts = planes.sum(axis=2, dtype=numpy.int64)
+        cachedWin = numpy.array([state.cachedWin for state in states])
+        cachedWinner = numpy.array([bool(state.cachedWinner) for state in states])
+        moveCount = numpy.array([state.moveCount for state in states])
+        terminal = cachedWin | (moveCount == self.moveLimit) | (counts[:, 0] == 0) | (counts[:, 1] + counts[:, 2] == 0)
+        utility = numpy.where(cachedWin, numpy.where(cachedWinner, 61, -61), 0)
+        return numpy.where(terminal, utility, value).tolist()
+
+    def __batch_tables(self):
+        """ Return the eval tables as a NumPy array, one row per piece type (S, R, J),
+            made again whenever evalTables changes.
+        """
+        cached = self._batchTables
+        if cached is None or cached[0] is not self.evalTables:
+            rows = [self.evalTables[piece] for piece in "SRJ"]
+            integral = all(isinstance(value, int) for row in rows for value in row)
+            cached = (self.evalTables, numpy.array(rows, dtype=numpy.int64 if integral else numpy.float64))
+            self._batchTables = cached
+        return cached[1]
+
+    def move_info(self, state, action):
+        """ Describe what an action does.
+            :param state: a legal game state
+            :param action: a legal action in the game state
+            :return: a tuple (mover, captured, promotes), as for Game.move_info()
+        """
+        who, piece, x, y, oldX, oldY = action
+        target = state.piece_at(x, y)
+        mover = piece[0]
+        if mover == "S":
+            captured = target
+        else:
+            captured = "S" if target == "S" else None
+        promotes = mover == "R" and x == 0 and (target is None or target == "S")
+        return mover, captured, promotes
+
+
+class PackedMoveGame(BitboardGame):
+    """ BitboardGame with every action a 16-bit move code (see Game.move_code()) instead of
+        a tuple: the square moved from, the square moved to, and the flags moveCaptures,
+        movePromotes and moveBlocked.  The codes are made straight from the masks, actions()
+        returns them in an array('H'), and a table can keep them in two bytes each.
+        move_tuple() and describe_move() turn them back into something to show a person.
+    """
+
+    def iterRebelActions(self, state):
+        """
+        Generates the legal actions for each rebel on the game board
+        :param state: a state object
+        :return: a generator of move codes legal in the given state
+        """
+        size = self.gameSize
+        sith = state.sithBits
+        occupied = sith | state.rebelBits | state.jediBits
+        captures = self.moveCaptures
+        for sq in self._squares_of(state.rebelBits):
+            right, left, forward = self.rebelSteps[sq]
+            if right is not None and sith >> right & 1:
+                yield sq | right << 6 | captures | (self.movePromotes if right < size else 0)
+            if left is not None and sith >> left & 1:
+                yield sq | left << 6 | captures | (self.movePromotes if left < size else 0)
+            if forward is not None:
+                yield sq | forward << 6 | self._forward_flags(sith, occupied, forward)
+
+    def _forward_flags(self, sith, occupied, forward):
+        """ Return the flags of a rebel's forward move onto the given square.
+        """
+        if sith >> forward & 1:
+            return self.moveCaptures | (self.movePromotes if forward < self.gameSize else 0)
+        if occupied >> forward & 1:
+            return self.moveBlocked
+        return self.movePromotes if forward < self.gameSize else 0
+
+    def iterJediActions(self, state):
+        """
+        Generates the legal actions for each jedi on the game board
+        :param state: a state object
+        :return: a generator of move codes legal in the given state
+        """
+        sith = state.sithBits
+        occupied = sith | state.rebelBits | state.jediBits
+        captures = self.moveCaptures
+        for sq in self._squares_of(state.jediBits):
+            for ray in self.jediRays[sq]:
+                for to in ray:
+                    if occupied >> to & 1:
+                        if sith >> to & 1:
+                            yield sq | to << 6 | captures
+                        break
+                    yield sq | to << 6
+
+    def iterSithActions(self, state):
+        """
+        Generates the legal actions for each sith on the game board
+        :param state: a state object
+        :return: a generator of move codes legal in the given state
+        """
+        sith = state.sithBits
+        targets = state.rebelBits | state.jediBits
+        captures = self.moveCaptures
+        for sq in self._squares_of(sith):
+            for to in self._squares_of(self.sithMasks[sq] & ~sith):
+                yield sq | to << 6 | (captures if targets >> to & 1 else 0)
+
+    def actions(self, state):
+        """ Returns all the legal actions in the given state.
+            :param state: a state object
+            :return: an array('H') of move codes legal in the given state
+        """
+        return array.array("H", list(self.iter_actions(state)))
+
+    def code_actions(self, state):
+        """ Returns the legal actions of the given state, which are move codes already.
+        """
+        return self.actions(state)
+
+    def capture_actions(self, state):
+        """ Generate the legal actions that capture (or turn) a piece, or promote
+            a rebel to a jedi.
+            :param state: a state object
+            :return: a generator of move codes legal in the given state
+        """
+        size = self.gameSize
+        sith = state.sithBits
+        captures = self.moveCaptures
+        if state.maxsTurn:
+            occupied = sith | state.rebelBits | state.jediBits
+            for sq in self._squares_of(state.rebelBits):
+                right, left, forward = self.rebelSteps[sq]
+                if right is not None and sith >> right & 1:
+                    yield sq | right << 6 | captures | (self.movePromotes if right < size else 0)
+                if left is not None and sith >> left & 1:
+                    yield sq | left << 6 | captures | (self.movePromotes if left < size else 0)
+                if forward is not None and (sith >> forward & 1 or (forward < size and not occupied >> forward & 1)):
+                    yield sq | forward << 6 | self._forward_flags(sith, occupied, forward)
+            for sq in self._squares_of(state.jediBits):
+                for ray in self.jediRays[sq]:
+                    for to in ray:
+                        if occupied >> to & 1:
+                            if sith >> to & 1:
+                                yield sq | to << 6 | captures
+                            break
+        else:
+            targets = state.rebelBits | state.jediBits
+            for sq in self._squares_of(sith):
+                for to in self._squares_of(self.sithMasks[sq] & targets):
+                    yield sq | to << 6 | captures
+
+    def quiet_actions(self, state):
+        """ Generate the legal actions that capture_actions() does not.
+            :param state: a state object
+            :return: a generator of move codes legal in the given state
+        """
+        size = self.gameSize
+        sith = state.sithBits
+        occupied = sith | state.rebelBits | state.jediBits
+        if state.maxsTurn:
+            for sq in self._squares_of(state.rebelBits):
+                forward = self.rebelSteps[sq][2]
+                if forward is not None and not sith >> forward & 1:
+                    if forward >= size or occupied >> forward & 1:
+                        yield sq | forward << 6 | (self.moveBlocked if occupied >> forward & 1 else 0)
+            for sq in self._squares_of(state.jediBits):
+                for ray in self.jediRays[sq]:
+                    for to in ray:
+                        if occupied >> to & 1:
+                            break
+                        yield sq | to << 6
+        else:
+            for sq in self._squares_of(sith):
+                for to in self._squares_of(self.sithMasks[sq] & ~occupied):
+                    yield sq | to << 6
+
+    def encode_move(self, action):
+        """ Return the squares of a move code, without its flags.
+        """
+        return action & self.moveSquares
+
+    def decode_move(self, state, code):
+        """ Turn an integer from encode_move() back into a move code of the given state.
+            :param state: the game state the move is for
+            :param code: an integer from encode_move(), or a move code
+            :return: the move code, with the flags it has in this state, or None if the
+                     player to move has no piece on the square it moves from
+        """
+        if BitboardGame.decode_move(self, state, code & self.moveSquares) is None:
+            return None
+        return self._with_flags(state, code & self.moveSquares)
+
+    def _with_flags(self, state, code):
+        """ Add the flags to the squares of a move by the player to move.
+        """
+        frm = code & 63
+        to = code >> 6 & 63
+        if not state.maxsTurn:
+            return code | (self.moveCaptures if (state.rebelBits | state.jediBits) >> to & 1 else 0)
+        if not state.rebelBits >> frm & 1:
+            return code | (self.moveCaptures if state.sithBits >> to & 1 else 0)
+        if to == frm - self.gameSize:
+            flags = self._forward_flags(state.sithBits, state.sithBits | state.rebelBits | state.jediBits, to)
+        else:
+            flags = self.moveCaptures | (self.movePromotes if to < self.gameSize else 0)
+        return code | flags
+
+    def move_code(self, state, action):
+        """ Return a move code for an action tuple; a move code is returned as it is.
+        """
+        if isinstance(action, int):
+            return action
+        return self._with_flags(state, BitboardGame.encode_move(self, action))
+
+    def move_tuple(self, state, action):
+        """ Return a move code as an action tuple, as BitboardGame would give it.
+        """
+        if isinstance(action, int):
+            return BitboardGame.decode_move(self, state, action & self.moveSquares)
+        return action
+
+    def is_legal(self, state, action):
+        """ Check a move code without generating all the actions.
+            :param state: a state object
+            :param action: any move code, e.g. one made for another state
+            :return: True if the move is legal in the given state, with the same flags
+        """
+        move = self.move_tuple(state, action)
+        return move is not None and BitboardGame.is_legal(self, state, move) and \
+            self._with_flags(state, action & self.moveSquares) == action
+
+    def move_info(self, state, action):
+        """ Describe what a move code does.
+            :param state: a legal game state
+            :param action: a legal move code in the game state
+            :return: a tuple (mover, captured, promotes), as for Game.move_info()
+        """
+        frm = action & 63
+        if not state.maxsTurn:
+            mover = "S"
+        elif state.rebelBits >> frm & 1:
+            mover = "R"
+        else:
+            mover = "J"
+        captured = None
+        if action & self.moveCaptures:
+            if mover != "S":
+                captured = "S"
+            elif state.rebelBits >> (action >> 6 & 63) & 1:
+                captured = "R"
+            else:
+                captured = "J"
+        return mover, captured, bool(action & self.movePromotes)
+
+# eof
@@ -12,6 +12,11 @@ Michael Horsch
 #         needed to keep track of the game, including any information
 #         convenient to store
 #           
+#    state_from_rows(self, rows, maxsTurn=True, moveCount=0)
+#       - returns a state with the given pieces on the board, one string per row,
+#         e.g. ["..S..", ".....", ".....", ".....", "RRRRR"] is the initial state
+#       - for test positions and benchmarks
+#           
 #    is_mins_turn(self, state)
 #    is_maxs_turn(self, state)
 #       - return a boolean that indicates if it's Min/Max's turn
@@ -37,9 +42,36 @@ Michael Horsch
 #    actions(self, state)
 #       - returns a list of actions legal in the given state
 #           
+#    iter_actions(self, state)
+#       - generates the same actions as actions(), in the same order, as they are needed
+#       - a search that stops at a cut-off never generates the rest
+#           
+#    capture_actions(self, state)
+#       - generates the legal actions that capture a piece or promote a rebel
+#       - used by quiescence search, which only follows these moves past the cut-off
+#           
+#    quiet_actions(self, state)
+#       - generates the other legal actions, the ones capture_actions() leaves out
+#           
+#    staged_actions(self, state, first=None)
+#       - generates all the legal actions in stages: first (if it is legal), then the
+#         captures, then the quiet actions; a stage is only generated when it is reached
+#       - used by AlphaBetaDL, where first is the move from the transposition table
+#           
+#    is_legal(self, state, action)
+#       - returns True if the action is legal in the state, without generating the actions
+#           
 #    result(self, state, action)
 #       - returns the state resulting from the action in the given state
 #           
+#    make_move(self, state, action)
+#       - applies the action to the given state in place
+#       - returns an undo record for unmake_move()
+#           
+#    unmake_move(self, state, undo)
+#       - restores the state to what it was before make_move() returned undo
+#       - moves must be unmade in the reverse order they were made
+#           
 #    cutoff_test(self, state, depth)
 #       - returns a bolean that indicates if this state and depth is suitable 
 #         to limit depth of search.  A simple implementation might just look 
@@ -58,6 +90,35 @@ Michael Horsch
 #         (k_min, k_max).  k_min means "Min wins"; a value smaller than k_min
 #         makes no sense.  An estimate from eval() cannot be more extreme than a 
 #         fact known from utility().
+#       - the material (and piece-square) part of the value is kept up to date
+#         by every move in state.score, so eval() only has to add the turn bonus
+#         (and the mobility term, if mobilityWeight is not 0)
+#       - the weights can come from a file made by TuneEval.py: Game(size, eval_file=...)
+#           
+#    eval_batch(self, states)
+#    eval_children(self, state, actions)
+#       - return the value of many states in one call: utility() for the terminal ones,
+#         eval() for the others; eval_children() values the state after each action
+#       - for a search that values all the children of a node at the cut-off at once
+#           
+#    hash_key(self, state)
+#       - return a 64-bit Zobrist key for the state
+#       - for use in a transposition table, or any other cache of positions
+#       - the key covers the pieces, whose turn it is, and the move count
+#           
+#    canonical_key(self, state)
+#       - return the same 64-bit key for a state and its left-right mirror image,
+#         which have the same minimax value, since the rules are symmetric
+#    canonical_move(self, state, action)
+#    from_canonical_move(self, state, code)
+#       - convert a best move to and from the orientation of canonical_key(), as an
+#         integer like encode_move(), so a cache can share it between mirror images
+#           
+#    placement_key(self, state)
+#       - return canonical_key() without the move count, so it only depends on the pieces
+#         and whose turn it is; used by the endgame tablebase (see Tablebase.py)
+#    piece_count(self, state)
+#       - return the number of pieces on the board
 #           
 #    transposition_string(self)
 #       - return a string representation of the state
@@ -68,6 +129,189 @@ Michael Horsch
 #    congratulate(self)
 #       - could be called at the end of the game to indicate who wins
 #       - this is not absolutely necessary, but could be informative
+#           
+#    move_info(self, state, action)
+#       - return (piece type moving, piece type captured or None, True if a promotion)
+#       - used by AlphaBetaDL.MoveOrdering to try the most promising moves first
+#           
+#    encode_move(self, action)
+#    decode_move(self, state, code)
+#       - convert an action to a small integer and back again
+#       - used to store moves in tables shared between processes or kept on disk
+#           
+#    move_code(self, state, action)
+#       - the action as a 16-bit integer: encode_move() plus flags for a capture,
+#         a promotion, and a blocked rebel (see moveCaptures)
+#    code_actions(self, state)
+#       - the legal actions of the state as move codes, in an array('H')
+#    move_tuple(self, state, action)
+#    describe_move(self, state, action)
+#       - turn an action or move code into an action tuple, or into words for a person
+#       - result() and make_move() take move codes as well as action tuples; see also
+#         JediChessBitboard.PackedMoveGame, whose actions are all move codes
+
+import array
+import hashlib
+import json
+import random
+
+
+class ZobristKeys(object):
+    """ The random numbers used to make Zobrist keys for one board size.
+        The key of a state is the XOR of one number for each (piece type, square)
+        on the board, one for Min's turn, and one for the move count, so a move
+        only has to XOR in the few numbers that it changes.
+
+        The numbers come from a fixed seed, so the same position has the same key
+        in every process and every run.
+
+        The object has the following attributes:
+            self.pieces - a dictionary with
+                           keys: "S", "R", "J"
+                           values: a list of numbers, indexed by square (row * size + col)
+            self.mirrored - like pieces, but with the numbers of each row in reverse order,
+                            so the pieces of a state give the key of its mirror image
+            self.minsTurn - the number included when it's Min's turn
+            self.moveCounts - a list of numbers, indexed by move count bucket
+    """
+
+    countBuckets = 41  # the game ends at 40 moves, so each count gets its own bucket
+
+    def __init__(self, size, seed=317):
+        rng = random.Random(seed * 1000 + size)
+        squares = size * size
+        self.pieces = dict()
+        for piece in ("S", "R", "J"):
+            self.pieces[piece] = [rng.getrandbits(64) for _ in range(squares)]
+        self.minsTurn = rng.getrandbits(64)
+        self.moveCounts = [rng.getrandbits(64) for _ in range(self.countBuckets)]
+        self.mirrored = dict()
+        for piece in ("S", "R", "J"):
+            self.mirrored[piece] = [self.pieces[piece][r * size + size - 1 - c]
+                                    for r in range(size) for c in range(size)]
+
+    def count_key(self, moveCount):
+        """ Return the number for the bucket of the given move count.
+        """
+        return self.moveCounts[min(moveCount, self.countBuckets - 1)]
+
+    def state_key(self, pieces, maxsTurn, moveCount, mirror=False):
+        """ Compute a key from scratch.
+            :param pieces: an iterable of (piece type, square) pairs
+            :param maxsTurn: True if it's Max's turn
+            :param moveCount: the number of moves made
+            :param mirror: True for the key of the mirror image
+            :return: the 64-bit key
+        """
+        numbers = self.mirrored if mirror else self.pieces
+        key = self.count_key(moveCount)
+        if not maxsTurn:
+            key ^= self.minsTurn
+        for piece, sq in pieces:
+            key ^= numbers[piece][sq]
+        return key
+
+
+_zobristKeys = dict()
+
+
+def zobrist_keys(size):
+    """ Return the ZobristKeys for the given board size, made once and shared.
+    """
+    keys = _zobristKeys.get(size)
+    if keys is None:
+        keys = _zobristKeys[size] = ZobristKeys(size)
+    return keys
+
+
+class MoveTables(object):
+    """ Where each piece type can move from each square, for one board size.
+        Squares are numbered row * size + col, and built once per board size,
+        so move generation never has to check the edges of the board.
+
+        The object has the following attributes:
+            self.points - the (row, col) of each square
+            self.sithSteps - for each square, the squares a sith there can step to
+            self.sithMasks - for each square, sithSteps as a bit mask (bit sq set for each square)
+            self.jediRays - for each square, the rays a jedi there slides along,
+                            each a tuple of squares, nearest first, in the order of directions
+            self.rebelSteps - for each square, the (up and right, up and left, straight up)
+                              squares a rebel there moves to, None if off the board
+    """
+
+    # All 8 directions for a jedi to move
+    directions = [(1, 0), (0, 1), (-1, 0), (0, -1), (1, 1), (-1, 1), (1, -1), (-1, -1)]
+
+    def __init__(self, size):
+        self.points = [divmod(sq, size) for sq in range(size * size)]
+        self.sithSteps = []
+        self.sithMasks = []
+        self.jediRays = []
+        self.rebelSteps = []
+        for r, c in self.points:
+            steps = []
+            for x in range(-1, 2):
+                for y in range(-1, 2):
+                    if (x or y) and 0 <= r + x < size and 0 <= c + y < size:
+                        steps.append((r + x) * size + c + y)
+            self.sithSteps.append(tuple(steps))
+            self.sithMasks.append(sum(1 << sq for sq in steps))
+
+            rays = []
+            for dr, dc in self.directions:
+                ray = []
+                x, y = r + dr, c + dc
+                while 0 <= x < size and 0 <= y < size:
+                    ray.append(x * size + y)
+                    x, y = x + dr, y + dc
+                if ray:
+                    rays.append(tuple(ray))
+            self.jediRays.append(tuple(rays))
+
+            right = (r - 1) * size + c + 1 if r > 0 and c + 1 < size else None
+            left = (r - 1) * size + c - 1 if r > 0 and c > 0 else None
+            forward = (r - 1) * size + c if r > 0 else None
+            self.rebelSteps.append((right, left, forward))
+
+
+_moveTables = dict()
+
+
+def move_tables(size):
+    """ Return the MoveTables for the given board size, made once and shared.
+    """
+    tables = _moveTables.get(size)
+    if tables is None:
+        tables = _moveTables[size] = MoveTables(size)
+    return tables
+
+
+def advancement_table(size, per_row=0.5):
+    """ Make a piece-square table that rewards rebels for moving toward the top row.
+        :param size: the board size
+        :param per_row: the bonus for each row a rebel has moved up
+        :return: a dictionary of piece-square tables, for Game(pst=...)
+    """
+    return {"R": [per_row * (size - 1 - sq // size) for sq in range(size * size)]}
+
+
+def load_eval_file(path):
+    """ Read a file of eval weights, as TuneEval.py writes them: a JSON object with
+          weights - the piece weights, e.g. {"S": 10, "J": 8, "R": 1}
+          turnBonus - the bonus for the player to move
+          mobility - the weight of the number of moves the player to move has
+          pst - piece-square tables for each board size, e.g. {"7": {"R": [...]}}
+        Every key is optional.
+        :param path: the file name
+        :return: the dictionary
+    """
+    with open(path) as f:
+        tuned = json.load(f)
+    unknown = set(tuned) - {"weights", "turnBonus", "mobility", "pst"}
+    if unknown:
+        raise ValueError("Unknown keys in the eval file {!r}: {}".format(path, sorted(unknown)))
+    return tuned
+
 
 class GameState(object):
     """ The GameState class stores the information about the state of the game.
@@ -93,7 +337,11 @@ class GameState(object):
             self.cachedWinner - if cachedWin is True, this is a Boolean (True: Win for Max)
                                 None if cachedWin is False
                               - stored to make some calculations faster
-            self.string - a unique string representation of the gameState
+            self.key - the 64-bit Zobrist key of the state, kept up to date by Game
+            self.mirrorKey - the key of the state's left-right mirror image, kept up to date by Game
+            self.score - the eval score of the pieces on the board, kept up to date by Game
+            self.scoreTables - the Game.evalTables that score was added up with, or None
+            self.string - a unique string representation of the gameState, built when asked for
         """
 
     # make some class-wide constants available for quicker calculations
@@ -129,28 +377,38 @@ class GameState(object):
         self.moveCount = 0
         self.cachedWinner = None
         self.cachedWin = False
-        self.string = str(self)
+        # Game adds up the score with its own tables
+        self.score = 0
+        self.scoreTables = None
+        pieces = [(name[0], r * size + c) for name, r, c in self.sith + self.rebels]
+        self.key = zobrist_keys(size).state_key(pieces, self.maxsTurn, self.moveCount)
+        self.mirrorKey = zobrist_keys(size).state_key(pieces, self.maxsTurn, self.moveCount, mirror=True)
 
     def myclone(self, size):
         """ Make and return an exact copy of the state.
         """
-        newState = GameState(size)
+        # skip __init__, everything it would build gets overwritten here
+        newState = GameState.__new__(GameState)
         newState.gameSize = self.gameSize
         newState.rebels = self.rebels.copy()
         newState.sith = self.sith.copy()
         newState.jedi = self.jedi.copy()
-
-        for rc in self.gameState:
-            newState.gameState[rc] = self.gameState[rc]
-
+        newState.gameState = self.gameState.copy()
         newState.cachedWinner = self.cachedWinner
         newState.moveCount = self.moveCount
         newState.maxsTurn = self.maxsTurn
         newState.cachedWin = self.cachedWin
-        newState.string = str(newState)
+        newState.key = self.key
+        newState.mirrorKey = self.mirrorKey
+        newState.score = self.score
+        newState.scoreTables = self.scoreTables
 
         return newState
 
+    @property
+    def string(self):
+        return str(self)
+
     def display(self):
         """
         Present the game state to the console.
@@ -178,38 +436,163 @@ class Game(object):
         implementation.
     """
 
-    def __init__(self, size, depth=0):
+    # the value of each piece type, used by eval()
+    pieceWeights = {"S": 10, "J": 8, "R": 1}
+
+    # the value of having the move, and of each move the player to move has, used by eval()
+    turnBonus = 10
+    mobilityWeight = 0
+
+    # the game is a draw after this many moves
+    moveLimit = 40
+
+    # the flags of move_code(), above the squares of encode_move()
+    moveCaptures = 1 << 12  # takes a sith, or (by a sith) takes a rebel or turns a jedi
+    movePromotes = 1 << 13  # a rebel reaches the top row and becomes a jedi
+    moveBlocked = 1 << 14   # a rebel moves forward onto a rebel or jedi, and only passes the turn
+    moveSquares = (1 << 12) - 1
+
+    def __init__(self, size, depth=0, weights=None, pst=None, eval_file=None):
         """ Initialization.
+            :param weights: piece weights to use instead of some of pieceWeights, e.g. {"J": 6}
+            :param pst: piece-square tables added to the eval, or None; a dictionary with
+                         keys: "S", "R", "J" (any of them)
+                         values: a list of size * size values, indexed by square (row * size + col),
+                                 from Max's point of view (positive is good for the rebels)
+            :param eval_file: a file of eval weights from TuneEval.py, or None; weights and
+                              pst given here take the place of the file's
         """
         self.gameSize = size
         self.depthLimit = depth
+        self.zobrist = zobrist_keys(size)
+        self.moveTables = move_tables(size)
+        if eval_file:
+            tuned = load_eval_file(eval_file)
+            weights = dict(tuned.get("weights") or {}, **(weights or {}))
+            if pst is None:
+                pst = (tuned.get("pst") or {}).get(str(size))
+            self.turnBonus = tuned.get("turnBonus", self.turnBonus)
+            self.mobilityWeight = tuned.get("mobility", self.mobilityWeight)
+        if weights:
+            self.pieceWeights = dict(self.pieceWeights, **weights)
+        self.pst = pst
+        self.evalTables = self.eval_tables()
+
+    def eval_tables(self):
+        """ Combine the piece weights and the piece-square tables into one table per piece type.
+            :return: a dictionary with
+                      keys: "S", "R", "J"
+                      values: a list of the score of that piece on each square
+        """
+        squares = self.gameSize * self.gameSize
+        tables = dict()
+        for piece, sign in (("S", -1), ("R", 1), ("J", 1)):
+            pst = (self.pst or {}).get(piece)
+            weight = sign * self.pieceWeights[piece]
+            if pst is None:
+                tables[piece] = [weight] * squares
+            else:
+                if len(pst) != squares:
+                    raise ValueError("Expected {} values in the {} piece-square table".format(squares, piece))
+                tables[piece] = [weight + value for value in pst]
+        return tables
+
+    def eval_fingerprint(self):
+        """ Return a number that changes with anything that changes eval(): the piece weights,
+            the piece-square tables, the turn bonus and the mobility weight.  For values kept
+            between runs, e.g. in a PositionCache, that are only good for the eval that found them.
+            :return: a 64-bit integer, never 0
+        """
+        config = json.dumps([self.evalTables, self.turnBonus, self.mobilityWeight], sort_keys=True)
+        digest = hashlib.blake2b(config.encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "little") or 1
+
+    def score_state(self, state):
+        """ Add up the score of the pieces on the board from scratch, using this game's tables.
+            :param state: a game state, whose score is set
+        """
+        tables = self.evalTables
+        size = self.gameSize
+        score = 0
+        for name, r, c in state.sith + state.rebels + state.jedi:
+            score += tables[name[0]][r * size + c]
+        state.score = score
+        state.scoreTables = tables
 
     def initial_state(self):
         """ Return an initial state for the game.
         """
         newState = GameState(self.gameSize)
+        self.score_state(newState)
         return newState
 
+    def state_from_rows(self, rows, maxsTurn=True, moveCount=0):
+        """ Return a state with the given pieces on the board.
+            :param rows: one string per row, top row first, with one character per square:
+                         "S", "R" or "J" for a piece, anything else for an empty square
+            :param maxsTurn: True if it's Max's turn
+            :param moveCount: the number of moves made
+            :return: a game state
+        """
+        size = self.gameSize
+        if len(rows) != size or any(len(row) != size for row in rows):
+            raise ValueError("Expected {0} rows of {0} squares".format(size))
+        state = GameState.__new__(GameState)
+        state.gameSize = size
+        state.gameState = dict()
+        state.rebels = []
+        state.sith = []
+        state.jedi = []
+        lists = {"S": state.sith, "R": state.rebels, "J": state.jedi}
+        for r in range(size):
+            for c in range(size):
+                piece = rows[r][c]
+                if piece in lists:
+                    name = piece + str(len(lists[piece]))
+                    lists[piece].append((name, r, c))
+                    state.gameState[r, c] = name
+                else:
+                    state.gameState[r, c] = GameState._ablank
+        state.maxsTurn = maxsTurn
+        state.moveCount = moveCount
+        state.cachedWin = len(state.sith) == 0 or len(state.jedi) + len(state.rebels) == 0
+        state.cachedWinner = len(state.sith) == 0 if state.cachedWin else None
+        pieces = [(name[0], r * size + c) for name, r, c in state.sith + state.rebels + state.jedi]
+        state.key = self.zobrist.state_key(pieces, maxsTurn, moveCount)
+        state.mirrorKey = self.zobrist.state_key(pieces, maxsTurn, moveCount, mirror=True)
+        self.score_state(state)
+        return state
+
     def is_mins_turn(self, state):
         """ Indicate if it's Min's turn
             :return: True if it's Min's turn to play
         """
-        state.moveCount += 1
+        self._count_move(state)
         return not state.maxsTurn
 
     def is_maxs_turn(self, state):
         """ Indicate if it's Min's turn
             :return: True if it's Max's turn to play
         """
-        state.moveCount += 1
+        self._count_move(state)
         return state.maxsTurn
 
+    def _count_move(self, state):
+        """ Add one to the move count, keeping the keys up to date.
+            :param state: a game state
+        """
+        change = self.zobrist.count_key(state.moveCount)
+        state.moveCount += 1
+        change ^= self.zobrist.count_key(state.moveCount)
+        state.key ^= change
+        state.mirrorKey ^= change
+
     def is_terminal(self, state):
         """ Indicate if the game is over.
             :param node: a game state with stored game state
             :return: a boolean indicating if node is terminal
         """
-        return state.cachedWin or state.moveCount == 40 or len(state.sith) == 0 or len(state.jedi) + len(
+        return state.cachedWin or state.moveCount == self.moveLimit or len(state.sith) == 0 or len(state.jedi) + len(
             state.rebels) == 0
 
     def actions(self, state):
@@ -228,27 +611,147 @@ class Game(object):
             allActions = sith
         return allActions
 
+    def iter_actions(self, state):
+        """ Generate the legal actions in the given state, in the same order as actions().
+            :param state: a state object
+            :return: a generator of actions legal in the given state
+        """
+        if state.maxsTurn:
+            yield from self.iterRebelActions(state)
+            yield from self.iterJediActions(state)
+        else:
+            yield from self.iterSithActions(state)
+
+    def capture_actions(self, state):
+        """ Generate the legal actions that capture (or turn) a piece, or promote
+            a rebel to a jedi.  These are the actions that change the material.
+            :param state: a state object
+            :return: a generator of actions legal in the given state
+        """
+        board = state.gameState
+        size = self.gameSize
+        points = self.moveTables.points
+        if state.maxsTurn:
+            steps = self.moveTables.rebelSteps
+            for name, r, c in state.rebels:
+                # captures up and to the right, up and to the left, and straight up
+                for to in steps[r * size + c]:
+                    if to is not None:
+                        x, y = points[to]
+                        target = board[x, y][0]
+                        if target == "S" or (y == c and x == 0 and target == " "):
+                            yield (state.maxsTurn, name, x, y, r, c)
+            rays = self.moveTables.jediRays
+            for name, r, c in state.jedi:
+                for ray in rays[r * size + c]:
+                    for to in ray:
+                        x, y = points[to]
+                        if board[x, y] != "  ":
+                            if board[x, y][0] == "S":
+                                yield (state.maxsTurn, name, x, y, r, c)
+                            break
+        else:
+            steps = self.moveTables.sithSteps
+            for name, r, c in state.sith:
+                for to in steps[r * size + c]:
+                    x, y = points[to]
+                    if board[x, y][0] in "RJ":
+                        yield (state.maxsTurn, name, x, y, r, c)
+
+    def quiet_actions(self, state):
+        """ Generate the legal actions that capture_actions() does not.
+            :param state: a state object
+            :return: a generator of actions legal in the given state
+        """
+        board = state.gameState
+        size = self.gameSize
+        points = self.moveTables.points
+        if state.maxsTurn:
+            steps = self.moveTables.rebelSteps
+            for name, r, c in state.rebels:
+                forward = steps[r * size + c][2]
+                if forward is not None:
+                    target = board[points[forward]][0]
+                    if target != "S" and not (r == 1 and target == " "):
+                        yield (state.maxsTurn, name, r - 1, c, r, c)
+            rays = self.moveTables.jediRays
+            for name, r, c in state.jedi:
+                for ray in rays[r * size + c]:
+                    for to in ray:
+                        x, y = points[to]
+                        if board[x, y] != "  ":
+                            break
+                        yield (state.maxsTurn, name, x, y, r, c)
+        else:
+            steps = self.moveTables.sithSteps
+            for name, r, c in state.sith:
+                for to in steps[r * size + c]:
+                    x, y = points[to]
+                    if board[x, y] == "  ":
+                        yield (state.maxsTurn, name, x, y, r, c)
+
+    def staged_actions(self, state, first=None):
+        """ Generate the legal actions in stages, so a search that stops early
+            never generates the later stages.
+            :param state: a state object
+            :param first: an action to try before the others (e.g. from a transposition
+                          table), or None; it is left out if it is not legal
+            :return: a generator of all the actions legal in the given state
+        """
+        if first is not None and self.is_legal(state, first):
+            yield first
+        else:
+            first = None
+        for act in self.capture_actions(state):
+            if act != first:
+                yield act
+        for act in self.quiet_actions(state):
+            if act != first:
+                yield act
+
+    def _occupant(self, state, x, y):
+        """ Return the piece on a square as actions name it, or None for an empty square.
+        """
+        piece = state.gameState[x, y]
+        return None if piece == "  " else piece
+
+    def is_legal(self, state, action):
+        """ Check an action without generating all the actions.
+            :param state: a state object
+            :param action: any action, e.g. one made for another state
+            :return: True if the action is legal in the given state
+        """
+        who, piece, x, y, oldX, oldY = action
+        size = self.gameSize
+        if who != state.maxsTurn or not (0 <= x < size and 0 <= y < size and 0 <= oldX < size and 0 <= oldY < size):
+            return False
+        if self._occupant(state, oldX, oldY) != piece or (piece[0] == "S") == state.maxsTurn:
+            return False
+        target = self._occupant(state, x, y)
+        target = target[0] if target is not None else None
+        dx, dy = x - oldX, y - oldY
+        if piece[0] == "R":
+            # forward is always allowed, diagonally only onto a sith
+            return dx == -1 and (dy == 0 or (abs(dy) == 1 and target == "S"))
+        if piece[0] == "S":
+            return max(abs(dx), abs(dy)) == 1 and target != "S"
+        # a jedi slides along a line through empty squares, onto an empty square or a sith
+        if (dx == 0 and dy == 0) or (dx != 0 and dy != 0 and abs(dx) != abs(dy)):
+            return False
+        stepX = (dx > 0) - (dx < 0)
+        stepY = (dy > 0) - (dy < 0)
+        for i in range(1, max(abs(dx), abs(dy))):
+            if self._occupant(state, oldX + i * stepX, oldY + i * stepY) is not None:
+                return False
+        return target is None or target == "S"
+
     def jediActions(self, state):
         """
         Returns all the legal actions for each jedi on the game board
         :param state: a state object
         :return: a list of jedi actions legal in the given state
         """
-        actions = []
-        # All 8 directions for a jedi to move
-        moves = [(1, 0), (0, 1), (-1, 0), (0, -1), (1, 1), (-1, 1), (1, -1), (-1, -1)]
-        for i in state.jedi:
-            for move in moves:
-                xtemp, ytemp = i[1] + move[0], i[2] + move[1]
-                # check if the movement is valid
-                while self.isValid(state, xtemp, ytemp):
-                    if state.gameState[xtemp, ytemp] != "  ":
-                        if state.gameState[xtemp, ytemp][0] == "S":
-                            actions.append((state.maxsTurn, i[0], xtemp, ytemp, i[1], i[2]))
-                        break
-                    actions.append((state.maxsTurn, i[0], xtemp, ytemp, i[1], i[2]))
-                    xtemp, ytemp = xtemp + move[0], ytemp + move[1]
-        return actions
+        return list(self.iterJediActions(state))
 
     def sithActions(self, state):
         """
@@ -256,51 +759,76 @@ class Game(object):
         :param state: a state object
         :return: a list of sith actions legal in the given state
         """
-        actions = []
-        for i in state.sith:
-            for x in range(-1, 2):
-                for y in range(-1, 2):
-                    xpos = i[1] + x
-                    ypos = i[2] + y
-                    if self.isValid(state, xpos, ypos):
-                        if state.gameState[xpos, ypos][0] != "S":
-                            # add all positions around S if it is valid, and is not another sith
-                            actions.append((state.maxsTurn, i[0], xpos, ypos, i[1], i[2]))
-        # Currently removes positions that would allow a sith to stay in the same spot. This could be simplified.
-        toRemove = []
-        if len(actions) > 0:
-            for i in range(len(actions)):
-                if actions[i][2] == actions[i][4] and actions[i][3] == actions[i][5]:
-                    toRemove.append(i)
-        if len(toRemove) > 0:
-            for i in toRemove:
-                del actions[i]
-        return actions
+        return list(self.iterSithActions(state))
 
     def rebelActions(self, state):
         """
-        Returns all the legal actions for each jedi on the game board
+        Returns all the legal actions for each rebel on the game board
         :param state: a state object
-        :return: a list of jedi actions legal in the given state
+        :return: a list of rebel actions legal in the given state
         """
-        actions = []
-        for i in state.rebels:
-            if self.isValid(state, i[1] - 1, i[2] + 1):
-                # if a sith is up and to the right
-                if state.gameState[i[1] - 1, i[2] + 1][0] == "S":
-                    actions.append((state.maxsTurn, i[0], i[1] - 1, i[2] + 1, i[1], i[2]))
+        return list(self.iterRebelActions(state))
 
-            if self.isValid(state, i[1] - 1, i[2] - 1):
-                # if a sith is up and to the left
-                if state.gameState[i[1] - 1, i[2] - 1][0] == "S":
-                    actions.append((state.maxsTurn, i[0], i[1] - 1, i[2] - 1, i[1], i[2]))
+    def iterJediActions(self, state):
+        """
+        Generates the legal actions for each jedi on the game board
+        :param state: a state object
+        :return: a generator of jedi actions legal in the given state
+        """
+        board = state.gameState
+        size = self.gameSize
+        points = self.moveTables.points
+        rays = self.moveTables.jediRays
+        for name, r, c in state.jedi:
+            for ray in rays[r * size + c]:
+                # slide until something is in the way; a sith there can be taken
+                for to in ray:
+                    x, y = points[to]
+                    target = board[x, y]
+                    if target != "  ":
+                        if target[0] == "S":
+                            yield (state.maxsTurn, name, x, y, r, c)
+                        break
+                    yield (state.maxsTurn, name, x, y, r, c)
 
-            if self.isValid(state, i[1] - 1, i[2]):
-                # if a forward move that is not blocked
-                if state.gameState[i[1] - 1, i[2]][0] != "S" or state.gameState[i[1] - 1, i[2]][0] != "J":
-                    actions.append((state.maxsTurn, i[0], i[1] - 1, i[2], i[1], i[2]))
+    def iterSithActions(self, state):
+        """
+        Generates the legal actions for each sith on the game board
+        :param state: a state object
+        :return: a generator of sith actions legal in the given state
+        """
+        board = state.gameState
+        size = self.gameSize
+        points = self.moveTables.points
+        steps = self.moveTables.sithSteps
+        for name, r, c in state.sith:
+            for to in steps[r * size + c]:
+                x, y = points[to]
+                if board[x, y][0] != "S":
+                    # all positions around S, except another sith
+                    yield (state.maxsTurn, name, x, y, r, c)
 
-        return actions
+    def iterRebelActions(self, state):
+        """
+        Generates the legal actions for each rebel on the game board
+        :param state: a state object
+        :return: a generator of rebel actions legal in the given state
+        """
+        board = state.gameState
+        size = self.gameSize
+        points = self.moveTables.points
+        steps = self.moveTables.rebelSteps
+        for name, r, c in state.rebels:
+            right, left, forward = steps[r * size + c]
+            if right is not None and board[points[right]][0] == "S":
+                # if a sith is up and to the right
+                yield (state.maxsTurn, name, r - 1, c + 1, r, c)
+            if left is not None and board[points[left]][0] == "S":
+                # if a sith is up and to the left
+                yield (state.maxsTurn, name, r - 1, c - 1, r, c)
+            if forward is not None:
+                # the forward move is always offered; onto a rebel or a jedi it only passes the turn
+                yield (state.maxsTurn, name, r - 1, c, r, c)
 
     def isValid(self, state, x, y):
         """
@@ -321,7 +849,11 @@ class Game(object):
             :param action: a legal action in the game state
             :return: a new game state
         """
+        if isinstance(action, int):
+            action = self.decode_move(state, action)
         newState = state.myclone(state.gameSize)
+        x, y, oldX, oldY = action[2:]
+        toPiece, fromPiece = state.gameState[x, y], state.gameState[oldX, oldY]
 
         if action[0]:
             # if the action is updating a rebel piece
@@ -336,10 +868,98 @@ class Game(object):
 
         newState.maxsTurn = not state.maxsTurn # change turns
         self._cache_winner(action[0], action[2], action[3], newState)
-        newState.string = str(newState) # update the state string
+        self._update_incremental(newState, x, y, oldX, oldY, toPiece, fromPiece)
 
         return newState
 
+    def make_move(self, state, action):
+        """ Apply the given action to the given state in place, instead of
+            making a new state like result() does.
+            :param state: a legal game state, which is changed
+            :param action: a legal action in the game state
+            :return: an undo record, to give to unmake_move()
+        """
+        if isinstance(action, int):
+            action = self.decode_move(state, action)
+        who, piece, x, y, oldX, oldY = action
+        toPiece, fromPiece = state.gameState[x, y], state.gameState[oldX, oldY]
+        undo = (x, y, oldX, oldY, toPiece, fromPiece,
+                state.rebels, state.sith, state.jedi,
+                state.maxsTurn, state.cachedWin, state.cachedWinner, state.key, state.mirrorKey,
+                state.score, state.scoreTables)
+        # the update methods change the piece lists, so give the state new
+        # lists and keep the old ones in the undo record
+        state.rebels = state.rebels.copy()
+        state.sith = state.sith.copy()
+        state.jedi = state.jedi.copy()
+
+        if who:
+            if piece[0] == "R":
+                self.updateRebels(state, action)
+            else:
+                self.updateJedi(state, action)
+        else:
+            self.updateSith(state, action)
+
+        state.maxsTurn = not state.maxsTurn # change turns
+        self._cache_winner(who, x, y, state)
+        self._update_incremental(state, x, y, oldX, oldY, toPiece, fromPiece)
+        return undo
+
+    def unmake_move(self, state, undo):
+        """ Undo an action applied by make_move().
+            :param state: the state given to make_move()
+            :param undo: the undo record returned by make_move()
+        """
+        x, y, oldX, oldY, toPiece, fromPiece, rebels, sith, jedi, \
+            maxsTurn, cachedWin, cachedWinner, key, mirrorKey, score, scoreTables = undo
+        state.gameState[x, y] = toPiece
+        state.gameState[oldX, oldY] = fromPiece
+        state.rebels = rebels
+        state.sith = sith
+        state.jedi = jedi
+        state.maxsTurn = maxsTurn
+        state.cachedWin = cachedWin
+        state.cachedWinner = cachedWinner
+        state.key = key
+        state.mirrorKey = mirrorKey
+        state.score = score
+        state.scoreTables = scoreTables
+
+    def _update_incremental(self, state, x, y, oldX, oldY, toPiece, fromPiece):
+        """ Update the keys and the score of a state after a move.  A move only ever
+            changes the two squares it moves between, and whose turn it is.
+            A score added up with another game's tables is added up again from scratch.
+            :param state: the state after the move
+            :param x, y: the square moved to
+            :param oldX, oldY: the square moved from
+            :param toPiece, fromPiece: what was on those squares before the move
+        """
+        pieces = self.zobrist.pieces
+        mirrored = self.zobrist.mirrored
+        tables = self.evalTables
+        key = state.key ^ self.zobrist.minsTurn
+        mirrorKey = state.mirrorKey ^ self.zobrist.minsTurn
+        score = state.score
+        for r, c, before in ((x, y, toPiece), (oldX, oldY, fromPiece)):
+            after = state.gameState[r, c]
+            if before[0] != after[0]:
+                sq = r * self.gameSize + c
+                if before != "  ":
+                    key ^= pieces[before[0]][sq]
+                    mirrorKey ^= mirrored[before[0]][sq]
+                    score -= tables[before[0]][sq]
+                if after != "  ":
+                    key ^= pieces[after[0]][sq]
+                    mirrorKey ^= mirrored[after[0]][sq]
+                    score += tables[after[0]][sq]
+        state.key = key
+        state.mirrorKey = mirrorKey
+        if state.scoreTables is tables:
+            state.score = score
+        else:
+            self.score_state(state)
+
     def updateJedi(self, state, action):
         """ Return the state that results from the application of the
             given action in the given state.
@@ -473,16 +1093,39 @@ class Game(object):
             :return: a numeric value in the range of the utility function
         """
         # eval is described in A4Q4.txt
-        weights = {"S": 10, "J": 8, "R": 1}
-        turnBonus = 0
-        rebelCount = len(state.rebels)
-        sithCount = len(state.sith)
-        jediCount = len(state.jedi)
+        # the pieces' part is kept in state.score; see eval_tables()
+        if state.scoreTables is not self.evalTables:
+            self.score_state(state)
         if state.maxsTurn:
-            turnBonus = 10
+            turnBonus = self.turnBonus
         else:
-            turnBonus = -10
-        return turnBonus + (rebelCount * weights["R"]) + (jediCount * weights["J"]) - (sithCount * weights["S"])
+            turnBonus = -self.turnBonus
+        if self.mobilityWeight:
+            return turnBonus + state.score + self.mobilityWeight * self.mobility(state)
+        return turnBonus + state.score
+
+    def mobility(self, state):
+        """ Count the moves of the player to move.
+            :param state: a legal game state
+            :return: the number of legal actions, negative if it is Min's turn
+        """
+        count = len(self.actions(state))
+        return count if state.maxsTurn else -count
+
+    def eval_batch(self, states):
+        """ Value a list of states in one call.
+            :param states: a list of legal game states
+            :return: a list with utility() of each terminal state, and eval() of the others
+        """
+        return [self.utility(state) if self.is_terminal(state) else self.eval(state) for state in states]
+
+    def eval_children(self, state, actions):
+        """ Value the state after each of the given actions, in one call.
+            :param state: a legal game state
+            :param actions: legal actions in the game state
+            :return: a list of values, as eval_batch() gives them
+        """
+        return self.eval_batch([self.result(state, act) for act in actions])
 
     def congratulate(self, state):
         """ Called at the end of a game, display some appropriate 
@@ -500,13 +1143,172 @@ class Game(object):
         else:
             print('No winner')
 
+    def move_info(self, state, action):
+        """ Describe what an action does.
+            :param state: a legal game state
+            :param action: a legal action in the game state
+            :return: a tuple (mover, captured, promotes)
+                     mover - the type of the piece moving, "S", "R" or "J"
+                     captured - the type of the piece taken (or turned, for a sith
+                                taking a jedi), or None
+                     promotes - True if a rebel becomes a jedi
+        """
+        who, piece, x, y, oldX, oldY = action
+        target = state.gameState[x, y][0]
+        mover = piece[0]
+        if mover == "S":
+            captured = target if target != " " else None
+        else:
+            captured = "S" if target == "S" else None
+        promotes = mover == "R" and x == 0 and (target == " " or target == "S")
+        return mover, captured, promotes
+
+    def encode_move(self, action):
+        """ Encode an action as a small integer: the square moved from in the
+            low 6 bits, and the square moved to in the next 6 bits.
+            Boards up to 8x8 fit.
+            :param action: a legal action
+            :return: an integer
+        """
+        who, piece, x, y, oldX, oldY = action
+        return (oldX * self.gameSize + oldY) | (x * self.gameSize + y) << 6
+
+    def decode_move(self, state, code):
+        """ Turn an integer from encode_move() back into an action.
+            :param state: the game state the action is for
+            :param code: an integer from encode_move()
+            :return: the action, or None if the player to move has no piece
+                     on the square it moves from
+        """
+        oldX, oldY = divmod(code & 63, self.gameSize)
+        x, y = divmod(code >> 6 & 63, self.gameSize)
+        if oldX >= self.gameSize or x >= self.gameSize:
+            return None
+        piece = state.gameState[oldX, oldY]
+        if piece == "  " or (piece[0] == "S") == state.maxsTurn:
+            return None
+        return (state.maxsTurn, piece, x, y, oldX, oldY)
+
+    def move_code(self, state, action):
+        """ Encode an action as a 16-bit integer: encode_move() with the flags
+            moveCaptures, movePromotes and moveBlocked.
+            :param state: the game state the action is for
+            :param action: a legal action in the state
+            :return: an integer
+        """
+        if isinstance(action, int):
+            return action
+        mover, captured, promotes = self.move_info(state, action)
+        code = self.encode_move(action)
+        if captured is not None:
+            code |= self.moveCaptures
+        if promotes:
+            code |= self.movePromotes
+        if mover == "R" and captured is None and self._occupant(state, action[2], action[3]) is not None:
+            code |= self.moveBlocked
+        return code
+
+    def code_actions(self, state):
+        """ Returns the legal actions of the given state as move codes.
+            :param state: a state object
+            :return: an array('H') of move_code() integers, in the order of iter_actions()
+        """
+        return array.array("H", [self.move_code(state, act) for act in self.iter_actions(state)])
+
+    def move_tuple(self, state, action):
+        """ Returns an action as a tuple (who, piece, x, y, oldX, oldY), if it isn't one already.
+            :param state: the game state the action is for
+            :param action: an action tuple, or a move code
+            :return: the action tuple, or None if the code does not fit the state
+        """
+        if isinstance(action, int):
+            return self.decode_move(state, action)
+        return action
+
+    def describe_move(self, state, action):
+        """ Describe an action in words, e.g. for HumanMenu.
+            :param state: the game state the action is for
+            :param action: a legal action tuple or move code in the state
+            :return: a string
+        """
+        code = self.move_code(state, action)
+        who, piece, x, y, oldX, oldY = self.move_tuple(state, action)
+        text = "{} from ({}, {}) to ({}, {})".format(piece, oldX, oldY, x, y)
+        target = self._occupant(state, x, y)
+        if code & self.moveBlocked:
+            text += ", blocked by {}".format(target)
+        elif code & self.moveCaptures:
+            text += ", {} {}".format("turning" if target[0] == "J" else "taking", target)
+        if code & self.movePromotes:
+            text += ", becoming a jedi"
+        return text
+
+    def hash_key(self, state):
+        """ Returns the Zobrist key for the given state.  For use in
+            any Game Tree Search that employs a transposition table.
+            :param state: a legal game state
+            :return: a 64-bit integer
+        """
+        return state.key
+
+    def canonical_key(self, state):
+        """ Returns the same key for a state and its left-right mirror image: the smaller
+            of the two keys.  The rules (and eval(), unless it is given piece-square tables
+            that are not symmetric) treat both the same, so they have the same value.
+            :param state: a legal game state
+            :return: a 64-bit integer
+        """
+        return min(state.key, state.mirrorKey)
+
+    def placement_key(self, state):
+        """ Returns canonical_key() without the move count in it.
+            :param state: a legal game state
+            :return: a 64-bit integer
+        """
+        count = self.zobrist.count_key(state.moveCount)
+        return min(state.key ^ count, state.mirrorKey ^ count)
+
+    def piece_count(self, state):
+        """ Returns the number of pieces on the board.
+        """
+        return len(state.sith) + len(state.rebels) + len(state.jedi)
+
+    def mirror_move(self, code):
+        """ Return the move of encode_move() mirrored left to right.
+        """
+        size = self.gameSize
+        oldX, oldY = divmod(code & 63, size)
+        x, y = divmod(code >> 6 & 63, size)
+        return (oldX * size + size - 1 - oldY) | (x * size + size - 1 - y) << 6
+
+    def canonical_move(self, state, action):
+        """ Encode an action of the given state in the orientation of canonical_key().
+            :param state: a legal game state
+            :param action: a legal action in the state
+            :return: an integer, for from_canonical_move()
+        """
+        code = self.encode_move(action)
+        if state.mirrorKey < state.key:
+            code = self.mirror_move(code)
+        return code
+
+    def from_canonical_move(self, state, code):
+        """ Turn an integer from canonical_move() back into an action of the given state,
+            which may be the mirror image of the state the move was stored for.
+            :return: the action, or None, as for decode_move()
+        """
+        if state.mirrorKey < state.key:
+            code = self.mirror_move(code)
+        return self.decode_move(state, code)
+
     def transposition_string(self, state):
         """ Returns a unique string for the given state.  For use in 
             any Game Tree Search that employs a transposition table.
+            This is the Zobrist key written out in hexadecimal; see hash_key().
             :param state: a legal game state
             :return: a unique string representing the state
         """
-        return state.string
+        return "%016x" % state.key
 
     def _cache_winner(self, who, x, y, state):
         """ Look at the board and check if the new move was a winner.
@@ -0,0 +1,498 @@
+##########################################################################################
+# This module implements Monte Carlo tree search (UCT), a searcher that does not look
+# at every move to a fixed depth, but grows the tree towards the moves that have won
+# the most playouts so far.
+#
+# MCTS(game, time_limit=T) or MCTS(game, node_limit=N)
+#    - has the minimax_decision_max/min methods of AlphaBetaDL.AlphaBeta, so it can be
+#      given to Players.ComputerInterface (or named "mcts" there)
+#    - each playout goes down the tree choosing the move with the best UCT score, adds a
+#      node, plays on from there with a rollout, and adds the result to every node on
+#      the way down; a win for Max counts 1, a draw 0.5 and a loss 0
+#    - the move chosen is the one with the most playouts; record.nodes is the number of
+#      playouts, record.depth the deepest node reached, and record.value the share of
+#      playouts Max won, put on the scale of utility() (61 for all of them, -61 for none)
+#
+# The tree is kept in arrays, one entry per node (parent, first child, number of
+# children, visits, total result, and the move into the node), with the children of a
+# node next to each other.  Between moves, the part of the tree below the new position
+# is kept (reuse=True): the position is looked for among the children and grandchildren
+# of the last root, and that subtree is moved to the start of the arrays.
+#
+# Rollouts:
+#    rollout="random" - random moves, up to rollout_depth of them
+#    rollout="eval"   - at each step the move with the best game.eval_children() value,
+#                       or a random one once in 1 / rollout_epsilon steps
+#    a rollout that reaches rollout_depth without ending the game is scored by game.eval(),
+#    put through a logistic curve; rollout_depth=0 scores the new node by eval() at once
+#
+# In parallel:
+#    MCTS(game, threads=N) - N threads share one tree; a thread going down the tree adds
+#        virtual_loss lost visits to each node on its way, so the other threads try other
+#        moves until it has its result.  Python runs one thread at a time, so this is
+#        mostly for games whose moves release the lock (or to ponder with).
+#    MCTS(game, workers=N) - N processes each grow their own tree from the position, and
+#        the playouts of each root move are added up (root parallelization).  Call close()
+#        when finished, to stop the worker processes.
+#
+# The searcher needs a game with:
+#    actions(), result(), make_move(), is_terminal(), eval(), hash_key(), moveLimit,
+#    and for rollout="eval", eval_children()
+#
+#    game = JediChessBitboard.PackedMoveGame(7)
+#    searcher = MCTS(game, time_limit=1.0)
+#    result = searcher.minimax_decision_max(state)
+
+import array
+import collections
+import concurrent.futures
+import math
+import os
+import random
+import threading
+import time
+
+import AlphaBetaDL
+
+
+# per worker process: a searcher for each MCTS with workers
+_worker = {"searchers": {}}
+
+
+def _root_task(token, config, state, maximizing, index, time_limit, node_limit):
+    """ Grow a tree from the root, in a worker process.  Keeping the searcher between
+        tasks lets it reuse its tree on the next move.
+        :return: (the root's moves, their visits, their results for Max, playouts,
+                  depth, process id, seconds taken)
+    """
+    start = time.perf_counter()
+    searcher = _worker["searchers"].get(token)
+    if searcher is None:
+        game, options = config
+        searcher = MCTS(game, **options)
+        _worker["searchers"][token] = searcher
+    searcher.rng.seed("{}/{}/{}".format(config[1].get("seed"), index, os.getpid()))
+    record = searcher.search(state, maximizing, time_limit, node_limit)
+    moves, visits, results = searcher.root_statistics()
+    return moves, visits, results, record.nodes, record.depth, os.getpid(), time.perf_counter() - start
+
+
+##########################################################################################
+class MCTS(object):
+    """ Monte Carlo tree search with UCT.
+    """
+
+    # the value of a won game, as utility() gives it
+    winValue = 61
+
+    # playouts per move, when there is neither a time nor a node limit
+    defaultPlayouts = 5000
+
+    rollouts = ("random", "eval")
+
+    def __init__(self, game, time_limit=None, node_limit=None, exploration=1.4, rollout="random",
+                 rollout_depth=20, rollout_epsilon=0.1, eval_scale=0.05, reuse=True, max_nodes=1 << 20,
+                 threads=1, virtual_loss=3, workers=0, seed=None):
+        """ Remember the game object, and how to search.
+            :param game: an object from the Game Class
+            :param time_limit: seconds per move
+            :param node_limit: playouts per move; defaultPlayouts if there is no time limit either
+            :param exploration: the UCT constant; bigger tries more moves, smaller looks deeper
+            :param rollout: "random" or "eval", see the top of this module
+            :param rollout_depth: the most moves in a rollout, None for no limit
+            :param rollout_epsilon: how often an "eval" rollout makes a random move
+            :param eval_scale: turns eval() into a chance to win: 0.5 + 0.5 * tanh(scale * eval / 2)
+            :param reuse: True to keep the tree from one move to the next
+            :param max_nodes: the most nodes in the tree; playouts after that add none
+            :param threads: the number of threads sharing the tree
+            :param virtual_loss: the lost visits a thread adds to the nodes it is going through
+            :param workers: the number of worker processes, each with its own tree; 0 for none
+            :param seed: the seed for the random moves, or None
+        """
+        if rollout not in self.rollouts:
+            raise ValueError("Unknown rollout {!r}, expected one of {}".format(rollout, self.rollouts))
+        if time_limit is None and node_limit is None:
+            node_limit = self.defaultPlayouts
+        self.game = game
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.max_depth = None  # for Players.ComputerInterface, which ponders with iterative_deepening()
+        self.exploration = exploration
+        self.rollout = rollout
+        self.rollout_depth = rollout_depth
+        self.rollout_epsilon = rollout_epsilon
+        self.eval_scale = eval_scale
+        self.reuse = reuse
+        self.max_nodes = max_nodes
+        self.threads = threads
+        self.virtual_loss = virtual_loss if threads > 1 else 0
+        self.workers = workers
+        self.rng = random.Random(seed)
+        self.stop_event = None
+        self.nodes_expanded = 0
+        self.lock = threading.Lock()
+
+        # the tree: parallel arrays, indexed by node
+        self.parent = array.array("l")
+        self.first = array.array("l")    # the first child, -1 until the node is expanded
+        self.count = array.array("l")    # the number of children
+        self.visits = array.array("l")
+        self.results = array.array("d")  # the total result, for the player who made the move into the node
+        self.moves = []                  # the move into the node
+        self.root = -1
+        self.rootState = None
+        self.rootKey = None
+
+        self._playouts = 0
+        self._deepest = 0
+        self._horizon = 0
+        self._options = dict(time_limit=time_limit, node_limit=node_limit, exploration=exploration,
+                             rollout=rollout, rollout_depth=rollout_depth, rollout_epsilon=rollout_epsilon,
+                             eval_scale=eval_scale, reuse=reuse, max_nodes=max_nodes, seed=seed)
+        self.token = "{}-{}".format(os.getpid(), id(self))
+        self.executor = None
+
+    def __getstate__(self):
+        # only the settings go to other processes, not the tree, the lock or the pool
+        return {"game": self.game, "options": dict(self._options, threads=self.threads,
+                                                   virtual_loss=self.virtual_loss, workers=self.workers)}
+
+    def __setstate__(self, config):
+        self.__init__(config["game"], **config["options"])
+
+    def close(self):
+        """ Stop the worker processes.
+        """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def minimax_decision_max(self, state):
+        """ Return the move that Max should take in the given state
+            :param state: a legal game state
+            :return: a SearchTerminationRecord
+        """
+        return self.search(state, True, self.time_limit, self.node_limit)
+
+    def minimax_decision_min(self, state):
+        """ Return the move that Min should take in the given state
+            :param state: a legal game state
+            :return: a SearchTerminationRecord
+        """
+        return self.search(state, False, self.time_limit, self.node_limit)
+
+    def iterative_deepening(self, state, maximizing, time_limit=None, node_limit=None, max_depth=None,
+                            start_depth=1):
+        """ Search with the given budget, as AlphaBeta.iterative_deepening() does; the
+            depths are ignored.  Without a budget, it searches until stop_event is set,
+            which is how Players.ComputerInterface ponders.
+            :param state: a legal game state
+            :param maximizing: True to find Max's move, False to find Min's
+            :return: a SearchTerminationRecord
+        """
+        if time_limit is None and node_limit is None and (self.stop_event is None or self.workers > 1):
+            time_limit, node_limit = self.time_limit, self.node_limit
+        return self.search(state, maximizing, time_limit, node_limit)
+
+    def search(self, state, maximizing, time_limit=None, node_limit=None):
+        """ Grow the tree from a state until the budget runs out, or stop_event is set.
+            :param state: a legal game state, whose player is to move
+            :param maximizing: True to find Max's move, False to find Min's
+            :param time_limit: seconds, or None
+            :param node_limit: playouts, or None
+            :return: a SearchTerminationRecord
+        """
+        start = time.perf_counter()
+        if self.workers > 1:
+            return self.__root_parallel(state, maximizing, time_limit, node_limit, start)
+        self._set_root(state)
+        self._playouts = 0
+        self._deepest = 0
+        # a node this many moves below the root is after the last move of the game;
+        # the search does not count moves, see RunGame.play_game()
+        self._horizon = self.game.moveLimit + 1 - state.moveCount
+        self.__expand(self.root, state, self.rng)
+        if self.count[self.root] == 0:
+            return AlphaBetaDL.SearchTerminationRecord(None, None, time.perf_counter() - start)
+
+        deadline = start + time_limit if time_limit is not None else None
+        if self.threads > 1:
+            workers = [threading.Thread(target=self.__run, args=(state, deadline, node_limit,
+                                                                 random.Random(self.rng.random())))
+                       for _ in range(self.threads)]
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+        else:
+            self.__run(state, deadline, node_limit, self.rng)
+
+        self.nodes_expanded = self._playouts
+        best = self.best_child(self.root)
+        share = self.results[best] / max(self.visits[best], 1)
+        if not maximizing:
+            share = 1 - share
+        return AlphaBetaDL.SearchTerminationRecord(
+            round((2 * share - 1) * self.winValue, 2), self.moves[best], time.perf_counter() - start,
+            self._playouts, depth=self._deepest, pv=self.principal_variation())
+
+    def __run(self, state, deadline, node_limit, rng):
+        """ Do playouts until the budget runs out, or stop_event is set.
+        """
+        stop = self.stop_event
+        while True:
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            if stop is not None and stop.is_set():
+                return
+            with self.lock:
+                if node_limit is not None and self._playouts >= node_limit:
+                    return
+                self._playouts += 1
+            self.__playout(state, rng)
+
+    def __playout(self, root_state, rng):
+        """ Go down the tree from the root, add a node, do a rollout from it, and add
+            its result to every node on the way.
+        """
+        game = self.game
+        first, count, visits, results, moves = self.first, self.count, self.visits, self.results, self.moves
+        loss = self.virtual_loss
+        state = root_state.myclone(root_state.gameSize)
+        with self.lock:
+            node = self.root
+            path = [(node, not state.maxsTurn)]  # (node, True if Max made the move into it)
+            visits[node] += loss
+            depth = 0
+            while count[node] > 0 and depth < self._horizon and not state.cachedWin:
+                node = self.__select(node)
+                path.append((node, state.maxsTurn))
+                visits[node] += loss
+                game.make_move(state, moves[node])
+                depth += 1
+            if first[node] == -1 and depth < self._horizon and not game.is_terminal(state) \
+                    and len(moves) < self.max_nodes:
+                self.__expand(node, state, rng)
+                if count[node] > 0:
+                    # the children are in random order, so the first one is a random move
+                    node = first[node]
+                    path.append((node, state.maxsTurn))
+                    visits[node] += loss
+                    game.make_move(state, moves[node])
+                    depth += 1
+            if depth > self._deepest:
+                self._deepest = depth
+
+        result = self.__rollout(state, depth, rng)
+
+        with self.lock:
+            for node, byMax in path:
+                visits[node] += 1 - loss
+                results[node] += result if byMax else 1 - result
+
+    def __select(self, node):
+        """ Return the child with the best UCT score, or the first one not tried yet.
+        """
+        visits, results = self.visits, self.results
+        explore = self.exploration * math.sqrt(math.log(max(visits[node], 1)))
+        best = -1
+        bestScore = -1.0
+        for child in range(self.first[node], self.first[node] + self.count[node]):
+            n = visits[child]
+            if n == 0:
+                return child
+            score = results[child] / n + explore / math.sqrt(n)
+            if score > bestScore:
+                best, bestScore = child, score
+        return best
+
+    def __expand(self, node, state, rng=None):
+        """ Add the children of a node, one per legal action, unless it has them already.
+            :param rng: a random.Random to shuffle the actions with, or None to keep their order
+        """
+        if self.first[node] != -1:
+            return
+        actions = list(self.game.actions(state))
+        if rng is not None:
+            rng.shuffle(actions)
+        self.first[node] = len(self.moves)
+        self.count[node] = len(actions)
+        for act in actions:
+            self.__add_node(node, act)
+
+    def __add_node(self, parent, move, visits=0, results=0.0):
+        """ Add a node at the end of the arrays, and return its index.
+        """
+        self.parent.append(parent)
+        self.first.append(-1)
+        self.count.append(0)
+        self.visits.append(visits)
+        self.results.append(results)
+        self.moves.append(move)
+        return len(self.moves) - 1
+
+    def __rollout(self, state, depth, rng):
+        """ Play on from a state, which is changed.
+            :param depth: the number of moves from the root to the state
+            :return: 1 if Max wins, 0 if Min wins, 0.5 for a draw, or in between
+                     for a rollout scored by eval()
+        """
+        game = self.game
+        steps = 0
+        while True:
+            if state.cachedWin:
+                return 1.0 if state.cachedWinner else 0.0
+            if depth >= self._horizon or (depth > 0 and game.is_terminal(state)):
+                return 0.5
+            if self.rollout_depth is not None and steps >= self.rollout_depth:
+                return 0.5 + 0.5 * math.tanh(self.eval_scale * game.eval(state) / 2)
+            actions = game.actions(state)
+            if not actions:
+                # no legal moves: the game can't go on
+                return 0.5
+            if self.rollout == "random" or rng.random() < self.rollout_epsilon:
+                act = actions[rng.randrange(len(actions))]
+            else:
+                values = game.eval_children(state, actions)
+                pick = max if state.maxsTurn else min
+                act = actions[pick(range(len(actions)), key=values.__getitem__)]
+            game.make_move(state, act)
+            depth += 1
+            steps += 1
+
+    def best_child(self, node):
+        """ Return the child of a node with the most playouts (the best result if there is a tie).
+        """
+        visits, results = self.visits, self.results
+        children = range(self.first[node], self.first[node] + self.count[node])
+        return max(children, key=lambda child: (visits[child], results[child]))
+
+    def principal_variation(self, length=8):
+        """ Return the moves expected from the root: the child with the most playouts of each node,
+            while it has been tried more than once.
+        """
+        pv = []
+        node = self.root
+        while self.count[node] > 0 and len(pv) < length:
+            node = self.best_child(node)
+            if pv and self.visits[node] < 2:
+                break
+            pv.append(self.moves[node])
+        return pv
+
+    def root_statistics(self):
+        """ Return the root's moves, their playouts, and the total result of each for Max.
+        """
+        children = range(self.first[self.root], self.first[self.root] + self.count[self.root])
+        byMax = self.rootState.maxsTurn
+        moves = [self.moves[child] for child in children]
+        visits = [self.visits[child] for child in children]
+        results = [self.results[child] if byMax else self.visits[child] - self.results[child]
+                   for child in children]
+        return moves, visits, results
+
+    def _position_key(self, state):
+        """ Return the state's key without its move count: the counts of the states in the
+            tree are not kept up to date, see RunGame.play_game().
+        """
+        return self.game.hash_key(state) ^ self.game.zobrist.count_key(state.moveCount)
+
+    def _set_root(self, state):
+        """ Make the root of the tree the node for a state: the old root, one of its children
+            or grandchildren if the state is one of theirs, or a new node.
+        """
+        key = self._position_key(state)
+        keep = None
+        if self.reuse and self.root >= 0:
+            if key == self.rootKey:
+                keep = self.root
+            else:
+                keep = self.__find(key)
+        if keep is None:
+            self.__clear()
+            self.root = self.__add_node(-1, None)
+        elif keep != self.root:
+            self.__compact(keep)
+        self.rootState = state.myclone(state.gameSize)
+        self.rootKey = key
+
+    def __find(self, key):
+        """ Look for a position among the children and grandchildren of the root,
+            the ones with the most playouts first.
+            :return: the node, or None
+        """
+        game = self.game
+        first, count, visits = self.first, self.count, self.visits
+        children = sorted(range(first[self.root], first[self.root] + count[self.root]),
+                          key=lambda child: -visits[child])
+        for child in children:
+            after = game.result(self.rootState, self.moves[child])
+            if self._position_key(after) == key:
+                return child
+            for grandchild in range(first[child], first[child] + count[child]):
+                if self._position_key(game.result(after, self.moves[grandchild])) == key:
+                    return grandchild
+        return None
+
+    def __compact(self, keep):
+        """ Move the subtree of a node to the start of the arrays, and forget the rest.
+        """
+        old = (self.parent, self.first, self.count, self.visits, self.results, self.moves)
+        oldFirst, oldCount, oldVisits, oldResults, oldMoves = old[1:]
+        self.parent, self.first, self.count = array.array("l"), array.array("l"), array.array("l")
+        self.visits, self.results, self.moves = array.array("l"), array.array("d"), []
+        self.root = self.__add_node(-1, None, oldVisits[keep], oldResults[keep])
+        queue = collections.deque([(keep, self.root)])
+        while queue:
+            node, copy = queue.popleft()
+            if oldFirst[node] == -1:
+                continue
+            self.first[copy] = len(self.moves)
+            self.count[copy] = oldCount[node]
+            # the children are copied together, so they stay next to each other
+            for child in range(oldFirst[node], oldFirst[node] + oldCount[node]):
+                queue.append((child, self.__add_node(copy, oldMoves[child], oldVisits[child], oldResults[child])))
+
+    def __clear(self):
+        """ Forget the whole tree.
+        """
+        for nodes in (self.parent, self.first, self.count, self.visits, self.results, self.moves):
+            del nodes[:]
+        self.root = -1
+
+    def __root_parallel(self, state, maximizing, time_limit, node_limit, start):
+        """ Grow a tree in every worker process, and add up the playouts of each root move.
+            :return: a SearchTerminationRecord
+        """
+        if self.executor is None:
+            self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers)
+        config = (self.game, dict(self._options, threads=1, workers=0))
+        futures = [self.executor.submit(_root_task, self.token, config, state, maximizing, index,
+                                        time_limit, node_limit)
+                   for index in range(self.workers)]
+        visits = collections.OrderedDict()
+        results = dict()
+        worker_nodes = dict()
+        depth = 0
+        busy = 0.0
+        for future in futures:
+            moves, counts, totals, playouts, deepest, pid, seconds = future.result()
+            for move, n, total in zip(moves, counts, totals):
+                visits[move] = visits.get(move, 0) + n
+                results[move] = results.get(move, 0.0) + total
+            worker_nodes[pid] = worker_nodes.get(pid, 0) + playouts
+            depth = max(depth, deepest)
+            busy += seconds
+        elapsed = time.perf_counter() - start
+        self.nodes_expanded = sum(worker_nodes.values())
+        if not visits:
+            return AlphaBetaDL.SearchTerminationRecord(None, None, elapsed, self.nodes_expanded)
+        best = max(visits, key=lambda move: (visits[move], results[move] if maximizing else -results[move]))
+        share = results[best] / max(visits[best], 1)
+        record = AlphaBetaDL.SearchTerminationRecord(round((2 * share - 1) * self.winValue, 2), best, elapsed,
+                                                     self.nodes_expanded, depth=depth)
+        record.worker_nodes = sorted(worker_nodes.values(), reverse=True)
+        record.utilization = busy / elapsed if elapsed > 0 else 0.0
+        return record
+
+# eof
@@ -0,0 +1,277 @@
+##########################################################################################
+# An opening book: the moves to play in the first positions of a game, found ahead of
+# time by deep searches, so a player does not have to search them during the game.
+#
+# OpeningBook(size)
+#    - for each position, a list of (move, weight); a move with a bigger weight is better,
+#      or was played more often
+#    - positions are keyed on game.placement_key(), so a position and its mirror image
+#      share their moves, whatever the move count
+#
+# book.choose(game, state, rng=None)
+#    - the move with the biggest weight, or a move picked at random in proportion to
+#      the weights if rng (a random.Random) is given; None if the position is not in the book
+#
+# search_book(game, plies, depth, margin)
+#    - searches every action of the initial position to the given depth, keeps the ones
+#      within margin of the best, and does the same after each kept action, down to
+#      the given number of plies
+#
+# self_play_book(game, games, plies, depth)
+#    - plays games between two searchers, each from a different random first move, and
+#      adds the moves they chose in the first plies; the weight is how often each was chosen
+#
+# The book is stored in a binary file: a header (magic, version, board size, number of
+# entries), then one (key, move, weight) entry per move, sorted by key.
+#
+# To use a book:
+#    book = OpeningBook.load("book7.bin")
+#    player = Players.SilentComputer(game, "pvs", book=book, time_limit=1.0)
+#
+# To make one:
+#    python OpeningBook.py --size 7 --plies 6 --depth 5 --out book7.bin
+#    python OpeningBook.py --size 7 --plies 8 --depth 4 --self-play 200 --out book7.bin
+
+import argparse
+import random
+import struct
+import sys
+import time
+
+import AlphaBetaDL
+from JediChessBitboard import BitboardGame
+
+
+class OpeningBook(object):
+    """ The book moves for one board size.
+
+        The object has the following attributes:
+            self.size - the size of the game board
+            self.moves - a dictionary with
+                          keys: placement keys
+                          values: a dictionary of move -> weight, where a move is an
+                                  integer from encode_move(), turned to the orientation
+                                  of the placement key
+    """
+
+    magic = b"JCOB"
+    version = 1
+    header = struct.Struct("<4sHHI")
+    entry = struct.Struct("<QHH")
+
+    # the biggest weight an entry can hold
+    maxWeight = 0xFFFF
+
+    def __init__(self, size):
+        self.size = size
+        self.moves = dict()
+
+    def __len__(self):
+        return len(self.moves)
+
+    def _orient(self, game, state):
+        """ Return the state's placement key, and True if its moves have to be mirrored
+            to match the key's orientation.
+        """
+        count = game.zobrist.count_key(state.moveCount)
+        key = state.key ^ count
+        mirrorKey = state.mirrorKey ^ count
+        return min(key, mirrorKey), mirrorKey < key
+
+    def add(self, game, state, action, weight=1):
+        """ Add to the weight of a move.
+            :param game: an object from the Game Class
+            :param state: a legal game state
+            :param action: a legal action in the state
+            :param weight: how much to add
+        """
+        key, mirrored = self._orient(game, state)
+        code = game.encode_move(action)
+        if mirrored:
+            code = game.mirror_move(code)
+        weights = self.moves.setdefault(key, dict())
+        weights[code] = min(weights.get(code, 0) + weight, self.maxWeight)
+
+    def lookup(self, game, state):
+        """ Find the book moves of a state.
+            :param game: an object from the Game Class
+            :param state: a legal game state
+            :return: a list of (action, weight), biggest weight first; empty if the state
+                     is not in the book
+        """
+        if game.gameSize != self.size:
+            return []
+        key, mirrored = self._orient(game, state)
+        weights = self.moves.get(key)
+        if not weights:
+            return []
+        found = []
+        for code, weight in weights.items():
+            if mirrored:
+                code = game.mirror_move(code)
+            action = game.decode_move(state, code)
+            # a key collision could give a move that is not legal here
+            if action is not None and game.is_legal(state, action):
+                found.append((action, weight))
+        found.sort(key=lambda pair: -pair[1])
+        return found
+
+    def choose(self, game, state, rng=None):
+        """ Pick a book move.
+            :param game: an object from the Game Class
+            :param state: a legal game state
+            :param rng: a random.Random to pick in proportion to the weights, or None
+                        to pick the move with the biggest weight
+            :return: an action, or None if the state is not in the book
+        """
+        found = self.lookup(game, state)
+        if not found:
+            return None
+        if rng is None:
+            return found[0][0]
+        actions, weights = zip(*found)
+        return rng.choices(actions, weights)[0]
+
+    @classmethod
+    def load(cls, path):
+        """ Read a book written by save().
+            :param path: the file name
+            :return: an OpeningBook
+        """
+        with open(path, "rb") as f:
+            magic, version, size, count = cls.header.unpack(f.read(cls.header.size))
+            if magic != cls.magic or version != cls.version:
+                raise ValueError("{!r} is not an opening book file".format(path))
+            book = cls(size)
+            for key, code, weight in cls.entry.iter_unpack(f.read(count * cls.entry.size)):
+                book.moves.setdefault(key, dict())[code] = weight
+        return book
+
+    def save(self, path):
+        """ Write the book to a file.
+            :param path: the file name
+        """
+        entries = [(key, code, weight) for key in sorted(self.moves)
+                   for code, weight in sorted(self.moves[key].items())]
+        with open(path, "wb") as f:
+            f.write(self.header.pack(self.magic, self.version, self.size, len(entries)))
+            for entry in entries:
+                f.write(self.entry.pack(*entry))
+
+
+def _searcher(game, depth, tt_megabytes):
+    """ Make the searcher used to build a book: PVS with move ordering.
+    """
+    game.depthLimit = depth
+    return AlphaBetaDL.PVSearch(game, tt_megabytes=tt_megabytes, ordering=AlphaBetaDL.MoveOrdering(game))
+
+
+def search_book(game, plies=4, depth=5, margin=2, tt_megabytes=64, book=None):
+    """ Build a book by searching every action of the positions near the initial position.
+        :param game: an object from the Game Class, with a depth limit that is changed
+        :param plies: how many moves deep the book goes
+        :param depth: the depth limit of the search below each action
+        :param margin: the actions within this much of the best are kept, and searched
+                       after; each gets the weight margin + 1 - (how much worse than the best)
+        :param book: an OpeningBook to add to, or None to make a new one
+        :return: the OpeningBook
+    """
+    if book is None:
+        book = OpeningBook(game.gameSize)
+    searcher = _searcher(game, depth, tt_megabytes)
+    frontier = [game.initial_state()]
+    for _ in range(plies):
+        following = []
+        seen = set()
+        for state in frontier:
+            if game.is_terminal(state) or game.placement_key(state) in seen:
+                continue
+            seen.add(game.placement_key(state))
+            state = state.myclone(state.gameSize)
+            maximizing = game.is_maxs_turn(state)  # counts the move, like a player asking would
+            values = []
+            for act in game.actions(state):
+                value = searcher.minimax_value(game.result(state, act), not maximizing, depth=1)
+                values.append((value if maximizing else -value, act))
+            if not values:
+                continue
+            best = max(value for value, act in values)
+            for value, act in values:
+                if best - value <= margin:
+                    book.add(game, state, act, int(margin + 1 - (best - value)))
+                    following.append(game.result(state, act))
+        frontier = following
+    return book
+
+
+def self_play_book(game, games=100, plies=6, depth=4, seed=0, tt_megabytes=16, book=None):
+    """ Build a book from the moves two searchers choose against each other.
+        :param game: an object from the Game Class, with a depth limit that is changed
+        :param games: the number of games to play
+        :param plies: how many moves of each game go into the book
+        :param depth: the depth limit of the searchers
+        :param seed: the seed for the random first move of each game
+        :param book: an OpeningBook to add to, or None to make a new one
+        :return: the OpeningBook
+    """
+    if book is None:
+        book = OpeningBook(game.gameSize)
+    rng = random.Random(seed)
+    searcher = _searcher(game, depth, tt_megabytes)
+    for _ in range(games):
+        state = game.initial_state()
+        for ply in range(plies):
+            if game.is_terminal(state):
+                break
+            maximizing = game.is_maxs_turn(state)
+            if ply == 0:
+                # the first move is random, so the games are not all the same
+                actions = game.actions(state)
+                if not actions:
+                    break
+                choice = rng.choice(actions)
+            else:
+                record = searcher.minimax_decision_max(state) if maximizing else searcher.minimax_decision_min(state)
+                choice = record.move
+                if choice is None:
+                    break
+                book.add(game, state, choice)
+            state = game.result(state, choice)
+    return book
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Make an opening book")
+    parser.add_argument("--size", type=int, default=7, help="the size of the game board")
+    parser.add_argument("--plies", type=int, default=4, help="how many moves deep the book goes")
+    parser.add_argument("--depth", type=int, default=5, help="the depth limit of the searches")
+    parser.add_argument("--margin", type=int, default=2, help="keep moves within this much of the best")
+    parser.add_argument("--self-play", type=int, default=0, metavar="GAMES",
+                        help="build the book from this many self-play games instead")
+    parser.add_argument("--seed", type=int, default=0, help="the seed for the self-play games")
+    parser.add_argument("--add", action="store_true", help="add to the book in --out, if there is one")
+    parser.add_argument("--out", help="the file to write, book<size>.bin by default")
+    args = parser.parse_args(argv)
+
+    path = args.out or "book{}.bin".format(args.size)
+    book = None
+    if args.add:
+        try:
+            book = OpeningBook.load(path)
+        except FileNotFoundError:
+            pass
+    game = BitboardGame(args.size)
+    start = time.perf_counter()
+    if args.self_play:
+        book = self_play_book(game, args.self_play, args.plies, args.depth, args.seed, book=book)
+    else:
+        book = search_book(game, args.plies, args.depth, args.margin, book=book)
+    print("{} positions in {:.1f}s".format(len(book), time.perf_counter() - start))
+    book.save(path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# eof
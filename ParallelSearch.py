@@ -0,0 +1,248 @@
+##########################################################################################
+# This module implements parallel versions of the searchers in AlphaBetaDL,
+# using a pool of worker processes.
+#
+# ParallelSearch(game, mode="root")
+#    - splits the actions at the root between the workers
+#    - the first action is searched on its own, and the others get the best value
+#      found so far as their alpha-beta bound when they are handed out
+#    - searches to game.depthLimit, like AlphaBeta without a time limit
+#
+# ParallelSearch(game, mode="lazy", time_limit=T)
+#    - Lazy SMP: every worker runs iterative deepening on the whole root position,
+#      half of them starting one depth deeper so they don't all do the same work
+#    - the workers share one PackedTranspositionTable in shared memory, so each
+#      worker benefits from what the others have already searched
+#    - the result of the worker that finished the deepest search is used
+#
+# Both modes have the minimax_decision_max/min methods of AlphaBeta, so the searcher
+# can be given to Players.ComputerInterface (or named "parallel" there).
+# The record returned also has
+#    worker_nodes - the nodes expanded by each worker process
+#    utilization  - the time spent searching by all workers, divided by the time taken,
+#                   i.e. how many workers were busy on average; this is not a speed-up,
+#                   which needs the time of a serial search of the same position
+#
+# Call close() when finished, to stop the worker processes.
+#
+#    game = JediChessGame.Game(7, depth=4)
+#    searcher = ParallelSearch(game, mode="lazy", workers=8, time_limit=2.0)
+#    result = searcher.minimax_decision_max(game.initial_state())
+#    searcher.close()
+
+import concurrent.futures
+import multiprocessing
+import os
+import time
+
+import AlphaBetaDL
+
+
+# per worker process: the shared table's words, and a searcher for each ParallelSearch
+_worker = {"words": None, "searchers": {}}
+
+
+def _init_worker(words):
+    """ Set up a worker process.
+        :param words: the RawArray holding the shared transposition table, or None
+    """
+    _worker["words"] = words
+    _worker["searchers"] = {}
+
+
+def _worker_searcher(token, config):
+    """ Return this worker's searcher for a ParallelSearch, making it the first time.
+        Keeping the searcher between tasks keeps its transposition table and move ordering.
+        :param token: identifies the ParallelSearch
+        :param config: (game, searcher name, options)
+    """
+    searcher = _worker["searchers"].get(token)
+    if searcher is None:
+        game, name, options = config
+        options = dict(options)
+        if _worker["words"] is not None:
+            options["tt"] = AlphaBetaDL.PackedTranspositionTable(_worker["words"])
+        searcher = AlphaBetaDL.make_searcher(name, game, **options)
+        _worker["searchers"][token] = searcher
+    return searcher
+
+
+def _root_task(token, config, depth_limit, state, action, maximizing, alpha, beta):
+    """ Find the value of one root action, in a worker process.
+        :return: (value, nodes expanded, process id, seconds taken)
+    """
+    start = time.perf_counter()
+    searcher = _worker_searcher(token, config)
+    searcher.game.depthLimit = depth_limit
+    child = searcher.game.result(state, action)
+    value = searcher.minimax_value(child, not maximizing, alpha, beta, depth=1)
+    return value, searcher.nodes_expanded, os.getpid(), time.perf_counter() - start
+
+
+def _lazy_task(token, config, state, maximizing, index, time_limit, node_limit, max_depth):
+    """ Run iterative deepening from the root, in a worker process.
+        :return: (SearchTerminationRecord, process id, seconds taken)
+    """
+    start = time.perf_counter()
+    searcher = _worker_searcher(token, config)
+    start_depth = min(1 + index % 2, max_depth)
+    record = searcher.iterative_deepening(state, maximizing, time_limit, node_limit, max_depth, start_depth)
+    return record, os.getpid(), time.perf_counter() - start
+
+
+##########################################################################################
+class ParallelSearch(object):
+    """ Alpha-beta search spread over several processes.
+    """
+
+    modes = ("root", "lazy")
+
+    def __init__(self, game, mode="root", workers=None, searcher="alphabeta", tt_megabytes=16,
+                 time_limit=None, node_limit=None, max_depth=64, **options):
+        """ Remember the game object, and how to search.
+            :param game: an object from the Game Class
+            :param mode: "root" to split the root actions, "lazy" for Lazy SMP
+            :param workers: the number of worker processes; the number of CPUs by default
+            :param searcher: the name of the searcher each worker uses, see AlphaBetaDL.searchers
+            :param tt_megabytes: the size of each worker's transposition table in "root" mode,
+                                 or of the shared table in "lazy" mode
+            :param time_limit, node_limit: the budget per worker in "lazy" mode
+            :param max_depth: the deepest depth limit "lazy" mode tries; without a budget,
+                              it searches to game.depthLimit instead
+            :param options: other options for the searcher, e.g. ordering or quiescence
+        """
+        if mode not in self.modes:
+            raise ValueError("Unknown mode {!r}, expected one of {}".format(mode, self.modes))
+        self.game = game
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 1
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.max_depth = max_depth
+        if mode == "lazy":
+            self.words = multiprocessing.RawArray("Q", AlphaBetaDL.PackedTranspositionTable.words_for(tt_megabytes))
+        else:
+            self.words = None
+            options["tt_megabytes"] = tt_megabytes
+        self.config = (game, searcher, options)
+        self.token = "{}-{}".format(os.getpid(), id(self))
+        self.executor = None
+        self.nodes_expanded = 0
+
+    def close(self):
+        """ Stop the worker processes.
+        """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def _pool(self):
+        """ Return the pool of worker processes, starting it the first time.
+        """
+        if self.executor is None:
+            self.executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_worker, initargs=(self.words,))
+        return self.executor
+
+    def minimax_decision_max(self, state):
+        """ Return the move that Max should take in the given state
+            :param state: a legal game state
+            :return: a SearchTerminationRecord
+        """
+        if self.mode == "root":
+            return self.__root_split(state, True)
+        return self.__lazy_smp(state, True)
+
+    def minimax_decision_min(self, state):
+        """ Return the move that Min should take in the given state
+            :param state: a legal game state
+            :return: a SearchTerminationRecord
+        """
+        if self.mode == "root":
+            return self.__root_split(state, False)
+        return self.__lazy_smp(state, False)
+
+    def __root_split(self, state, maximizing):
+        """ Search each root action in a worker, handing out the actions one at a time
+            so each one gets the best bound known when it starts.
+            :param state: a legal game state
+            :param maximizing: True to find Max's move, False to find Min's
+            :return: a SearchTerminationRecord
+        """
+        start = time.perf_counter()
+        ifny = AlphaBetaDL.AlphaBeta.ifny
+        game, name, options = self.config
+        actions = list(self.game.actions(state))
+        if options.get("ordering") is not None:
+            actions = options["ordering"].order(state, actions, 0, None)
+
+        best = -ifny if maximizing else ifny
+        best_action = None
+        worker_nodes = dict()
+        busy = 0.0
+        pool = self._pool()
+        pending = dict()
+        next_action = 0
+        while next_action < len(actions) or pending:
+            # the first action sets the bound for the others, so it goes out alone
+            while next_action < len(actions) and len(pending) < self.workers \
+                    and (next_action > 0 or not pending):
+                act = actions[next_action]
+                alpha, beta = (best, ifny) if maximizing else (-ifny, best)
+                future = pool.submit(_root_task, self.token, self.config, self.game.depthLimit,
+                                     state, act, maximizing, alpha, beta)
+                pending[future] = act
+                next_action += 1
+                if next_action == 1:
+                    break
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                act = pending.pop(future)
+                val, nodes, pid, seconds = future.result()
+                worker_nodes[pid] = worker_nodes.get(pid, 0) + nodes
+                busy += seconds
+                if (maximizing and val > best) or (not maximizing and val < best) or best_action is None:
+                    best = val
+                    best_action = act
+
+        return self.__record(best, best_action, start, worker_nodes, busy, self.game.depthLimit)
+
+    def __lazy_smp(self, state, maximizing):
+        """ Run iterative deepening in every worker, sharing one transposition table.
+            :param state: a legal game state
+            :param maximizing: True to find Max's move, False to find Min's
+            :return: a SearchTerminationRecord
+        """
+        start = time.perf_counter()
+        max_depth = self.max_depth
+        if self.time_limit is None and self.node_limit is None and self.game.depthLimit > 0:
+            max_depth = self.game.depthLimit
+        pool = self._pool()
+        futures = [pool.submit(_lazy_task, self.token, self.config, state, maximizing, index,
+                               self.time_limit, self.node_limit, max_depth)
+                   for index in range(self.workers)]
+
+        best_record = None
+        worker_nodes = dict()
+        busy = 0.0
+        for future in futures:
+            record, pid, seconds = future.result()
+            worker_nodes[pid] = worker_nodes.get(pid, 0) + record.nodes
+            busy += seconds
+            # the deepest finished search wins; the first worker's if there is a tie
+            if best_record is None or record.depth > best_record.depth:
+                best_record = record
+
+        return self.__record(best_record.value, best_record.move, start, worker_nodes, busy, best_record.depth)
+
+    def __record(self, best, best_action, start, worker_nodes, busy, depth):
+        """ Make the SearchTerminationRecord for a finished search.
+        """
+        elapsed = time.perf_counter() - start
+        self.nodes_expanded = sum(worker_nodes.values())
+        record = AlphaBetaDL.SearchTerminationRecord(best, best_action, elapsed, self.nodes_expanded, depth=depth)
+        record.worker_nodes = sorted(worker_nodes.values(), reverse=True)
+        record.utilization = busy / elapsed if elapsed > 0 else 0.0
+        return record
+
+# eof
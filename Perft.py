@@ -0,0 +1,251 @@
+##########################################################################################
+# Perft: count the positions reachable from a state to a fixed depth, to check
+# the move generation, and time the parts of the game that a search leans on.
+#
+# perft(game, state, depth)
+#    - the number of leaf positions depth moves below state (a terminal position
+#      counts as one leaf and is not expanded)
+#    - the counts only depend on the rules, so every representation of the game
+#      (JediChessGame.Game, JediChessBitboard.BitboardGame) must agree on them
+#
+# divide(game, state, depth)
+#    - the perft count below each action at the root, to find which move a
+#      difference comes from
+#
+# benchmark(game, state, depth, search_depth)
+#    - nodes per second for actions(), result(), eval(), eval_children() and an AlphaBeta search
+#
+# The known-good counts for a set of fixed positions are kept in PerftFixtures.json.
+# Run this module to check every game class against them and to time each one:
+#    python Perft.py                 # check the fixtures and run the benchmark
+#    python Perft.py --check         # only check the fixtures
+#    python Perft.py --update        # recompute the fixture counts with Game
+#                                    # (only after a deliberate change to the rules!)
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import AlphaBetaDL
+from JediChessBitboard import BitboardGame, PackedMoveGame
+from JediChessGame import Game
+
+fixtures_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "PerftFixtures.json")
+
+# the game classes checked against the fixtures, and timed
+game_classes = {"dict": Game, "bitboard": BitboardGame, "packed": PackedMoveGame}
+
+
+def perft(game, state, depth):
+    """ Count the leaf positions below the given state.
+        :param game: an object from the Game Class
+        :param state: a legal game state
+        :param depth: the number of moves to look ahead
+        :return: the number of positions depth moves ahead, counting terminal positions
+                 found on the way as one position each
+    """
+    if depth == 0 or game.is_terminal(state):
+        return 1
+    actions = game.actions(state)
+    if depth == 1:
+        return len(actions)
+    total = 0
+    for act in actions:
+        undo = game.make_move(state, act)
+        total += perft(game, state, depth - 1)
+        game.unmake_move(state, undo)
+    return total
+
+
+def divide(game, state, depth):
+    """ Count the leaf positions below each action of the given state.
+        :param game: an object from the Game Class
+        :param state: a legal game state
+        :param depth: the number of moves to look ahead, at least 1
+        :return: a dictionary with
+                  keys: the move, as game.encode_move() gives it
+                  values: the perft count of depth - 1 below the move
+    """
+    counts = dict()
+    for act in game.actions(state):
+        child = game.result(state, act)
+        counts[game.encode_move(act)] = perft(game, child, depth - 1)
+    return counts
+
+
+def positions(game, state, depth):
+    """ Collect every non-terminal position within depth moves of the given state.
+        :return: a list of game states
+    """
+    found = []
+    frontier = [state]
+    for _ in range(depth):
+        following = []
+        for node in frontier:
+            if game.is_terminal(node):
+                continue
+            found.append(node)
+            following.extend(game.result(node, act) for act in game.actions(node))
+        frontier = following
+    return found
+
+
+def _time(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def _rate(count, seconds):
+    return count / seconds if seconds > 0 else float("inf")
+
+
+def benchmark(game, state, depth=3, search_depth=4, repeat=3):
+    """ Time the parts of the game a search uses, on the positions near the given state.
+        :param game: an object from the Game Class
+        :param state: a legal game state
+        :param depth: the positions within this many moves of state are timed
+        :param search_depth: the depth limit of the AlphaBeta search that is timed
+        :param repeat: the number of times each loop is timed; the fastest is kept
+        :return: a dictionary with the calls per second for "actions", "result", "eval",
+                 the children valued per second by "eval_children",
+                 and the nodes per second for "alphabeta"
+    """
+    states = positions(game, state, depth)
+    moves = [(node, act) for node in states for act in game.actions(node)]
+
+    rates = dict()
+    best = min(_time(lambda: [game.actions(node) for node in states]) for _ in range(repeat))
+    rates["actions"] = _rate(len(states), best)
+    best = min(_time(lambda: [game.result(node, act) for node, act in moves]) for _ in range(repeat))
+    rates["result"] = _rate(len(moves), best)
+    best = min(_time(lambda: [game.eval(node) for node in states]) for _ in range(repeat))
+    rates["eval"] = _rate(len(states), best)
+    children = [(node, game.actions(node)) for node in states]
+    best = min(_time(lambda: [game.eval_children(node, actions) for node, actions in children])
+               for _ in range(repeat))
+    rates["eval_children"] = _rate(len(moves), best)
+
+    saved = game.depthLimit
+    game.depthLimit = search_depth
+    try:
+        searcher = AlphaBetaDL.AlphaBeta(game)
+        if state.maxsTurn:
+            record = searcher.minimax_decision_max(state)
+        else:
+            record = searcher.minimax_decision_min(state)
+    finally:
+        game.depthLimit = saved
+    rates["alphabeta"] = _rate(record.nodes, record.time)
+    return rates
+
+
+def load_fixtures(path=fixtures_path):
+    """ Read the fixed positions and their known-good perft counts.
+        :return: a list of dictionaries with
+                  name - what the position is called
+                  size - the board size
+                  rows - the board, as Game.state_from_rows() takes it
+                  maxsTurn - True if it's Max's turn
+                  counts - the perft counts for depth 1, 2, ...
+    """
+    with open(path) as f:
+        return json.load(f)["positions"]
+
+
+def fixture_state(game, fixture):
+    """ Make the state of a fixture for the given game.
+    """
+    return game.state_from_rows(fixture["rows"], fixture["maxsTurn"])
+
+
+def check_fixtures(fixtures, classes=game_classes, out=sys.stdout):
+    """ Compare the perft counts of every game class with the fixtures.
+        :return: the number of counts that differ
+    """
+    failures = 0
+    for fixture in fixtures:
+        for label, cls in sorted(classes.items()):
+            game = cls(fixture["size"])
+            state = fixture_state(game, fixture)
+            for depth, expected in enumerate(fixture["counts"], 1):
+                start = time.perf_counter()
+                found = perft(game, state, depth)
+                seconds = time.perf_counter() - start
+                status = "ok" if found == expected else "FAIL (expected {})".format(expected)
+                print("{:<10} {:<9} depth {}: {:>9} {:8.3f}s  {}".format(
+                    fixture["name"], label, depth, found, seconds, status), file=out)
+                if found != expected:
+                    failures += 1
+                    _report_divide(fixture, depth, classes, out)
+                    break
+    return failures
+
+
+def _report_divide(fixture, depth, classes, out):
+    """ Show which root moves give different counts in each game class.
+    """
+    counts = dict()
+    for label, cls in sorted(classes.items()):
+        other = cls(fixture["size"])
+        counts[label] = divide(other, fixture_state(other, fixture), depth)
+    moves = sorted(set().union(*counts.values()))
+    for code in moves:
+        found = [counts[label].get(code) for label in sorted(counts)]
+        if len(set(found)) > 1:
+            print("    move {:>5}: {}".format(code, dict(zip(sorted(counts), found))), file=out)
+
+
+def update_fixtures(fixtures, path=fixtures_path):
+    """ Recompute the counts of every fixture with Game, keeping the same depths.
+    """
+    for fixture in fixtures:
+        game = Game(fixture["size"])
+        state = fixture_state(game, fixture)
+        fixture["counts"] = [perft(game, state, depth) for depth in range(1, len(fixture["counts"]) + 1)]
+    with open(path, "w") as f:
+        json.dump({"positions": fixtures}, f, indent=2)
+        f.write("\n")
+
+
+def run_benchmark(fixtures, classes=game_classes, depth=3, search_depth=4, out=sys.stdout):
+    """ Print the benchmark for the initial state of every board size in the fixtures.
+    """
+    print("{:<6} {:<9} {:>12} {:>12} {:>12} {:>12} {:>12}".format(
+        "size", "game", "actions/s", "result/s", "eval/s", "children/s", "alphabeta/s"), file=out)
+    for size in sorted(set(fixture["size"] for fixture in fixtures)):
+        for label, cls in sorted(classes.items()):
+            game = cls(size)
+            rates = benchmark(game, game.initial_state(), depth, search_depth)
+            print("{:<6} {:<9} {:>12.0f} {:>12.0f} {:>12.0f} {:>12.0f} {:>12.0f}".format(
+                size, label, rates["actions"], rates["result"], rates["eval"], rates["eval_children"],
+                rates["alphabeta"]), file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft counts and move generation benchmarks")
+    parser.add_argument("--check", action="store_true", help="only check the fixtures")
+    parser.add_argument("--bench", action="store_true", help="only run the benchmark")
+    parser.add_argument("--update", action="store_true", help="recompute the fixture counts")
+    parser.add_argument("--depth", type=int, default=3, help="depth of the positions timed")
+    parser.add_argument("--search-depth", type=int, default=4, help="depth limit of the timed search")
+    args = parser.parse_args(argv)
+
+    fixtures = load_fixtures()
+    if args.update:
+        update_fixtures(fixtures)
+        return 0
+    failures = 0
+    if not args.bench:
+        failures = check_fixtures(fixtures)
+    if not args.check:
+        run_benchmark(fixtures, depth=args.depth, search_depth=args.search_depth)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# eof
@@ -9,6 +9,14 @@
 #     - interaction through the console
 #     ComputerInterface
 #     - needs a search class object (e.g., Minimax, AlphaBeta, etc)
+#     - or the name of one of the searchers in AlphaBetaDL.searchers (e.g., "alphabeta", "pvs"),
+#       with its options as keyword arguments
+#     - can be given an OpeningBook (see OpeningBook.py), whose moves are played
+#       without searching while the game is still in the book
+#     - with ponder=True, keeps searching in a background thread after it moves, on the
+#       position it expects after the opponent's reply (the second move of the principal
+#       variation, so use a searcher that finds one, e.g. "pvs"); if the opponent makes
+#       that reply, the next move comes from that search (a ponder hit)
 #     VerboseComputer
 #     - subclass of ComputerInterface to obtain moves from a search algorithm
 #     - adds a bit of console IO for human v computer, or other debugging purposes
@@ -28,6 +36,7 @@
 #   searcher = Minimax(game)         # create a search class instance
 #   player1 = Players.VerboseComputer(game, Searcher.Minimax(game))
 #   player2 = Players.HumanMenu(game)
+#   player3 = Players.SilentComputer(game, "pvs", time_limit=1.0)
 #
 #   # player1's turn!
 #   state = game.initial_state()
@@ -39,6 +48,12 @@
 #     assert choice2 in game.actions(state), "The action <{}> is not legal in this state".format(choice)
 
 
+import threading
+import time
+
+import AlphaBetaDL
+
+
 ##########################################################################################
 class PlayerInterface(object):
     """ A base class for Player interfaces
@@ -68,7 +83,10 @@ class HumanMenu(PlayerInterface):
 
         print("It's the Human's turn!  Choose one of the moves:")
         for i,act in enumerate(actions):
-            print("#{}: {}".format(i, act))
+            if hasattr(self.game, "describe_move"):
+                print("#{}: {}".format(i, self.game.describe_move(state, act)))
+            else:
+                print("#{}: {}".format(i, act))
         
         # wait for a valid choice from the menu
         choice = -1
@@ -87,10 +105,27 @@ class ComputerInterface(PlayerInterface):
         The searcher has to have the following methods:
             minimax_decision_max(state)
             minimax_decision_min(state)
+        The searcher can also be given by name, see AlphaBetaDL.make_searcher().
+        The SearchTerminationRecord of the latest move is kept in self.last_result.
+        With an opening book, a move from the book is played instead of searching,
+        the one with the biggest weight, or a random one if book_rng is given.
+        Pondering needs a searcher with a stop_event, like AlphaBetaDL.AlphaBeta;
+        self.ponder_hits and self.ponder_misses count how often it paid off.
     """
-    def __init__(self, game, searcher):
+    def __init__(self, game, searcher, book=None, book_rng=None, ponder=False, **options):
         PlayerInterface.__init__(self, game)
+        if isinstance(searcher, str):
+            searcher = AlphaBetaDL.make_searcher(searcher, game, **options)
+        if ponder and not hasattr(searcher, "stop_event"):
+            raise ValueError("The searcher {!r} can't be stopped, so it can't ponder".format(searcher))
         self.searcher = searcher
+        self.book = book
+        self.book_rng = book_rng
+        self.last_result = None
+        self.ponder = ponder
+        self.ponder_hits = 0
+        self.ponder_misses = 0
+        self._ponder = None     # (thread, stop event, key of the position, start time, result list), or None
 
     def _ask_move_searcher(self, state):
         """ This method interacts with the searcher object.
@@ -98,11 +133,118 @@ class ComputerInterface(PlayerInterface):
             :param state: a legal game state
             :return: a SearchTerminationRecord
         """
-        if self.game.is_maxs_turn(state):
-            result = self.searcher.minimax_decision_max(state)
-        else:
-            result = self.searcher.minimax_decision_min(state)
+        maximizing = self.game.is_maxs_turn(state)
+        result = self._ponder_result(state)
+        if result is None and self.book is not None:
+            move = self.book.choose(self.game, state, self.book_rng)
+            if move is not None:
+                result = AlphaBetaDL.SearchTerminationRecord(None, move, book=True)
+        if result is None:
+            if maximizing:
+                result = self.searcher.minimax_decision_max(state)
+            else:
+                result = self.searcher.minimax_decision_min(state)
+        self.last_result = result
+        if self.ponder:
+            self._start_pondering(state, result)
         return result
+
+    def ponder_hit_rate(self):
+        """ Return the fraction of the moves searched while pondering that the opponent
+            then made, or 0 if there were none.
+        """
+        tries = self.ponder_hits + self.ponder_misses
+        return self.ponder_hits / tries if tries else 0.0
+
+    def _start_pondering(self, state, result):
+        """ Start searching the position expected after the chosen move and the
+            opponent's best reply, in a background thread.
+            :param state: the state the move was chosen in
+            :param result: the SearchTerminationRecord of the chosen move
+        """
+        if result.move is None or not result.pv or len(result.pv) < 2:
+            return
+        position = self.game.result(state, result.move)
+        if self.game.is_terminal(position):
+            return
+        self.game.is_maxs_turn(position)  # the opponent counts its move
+        position = self.game.result(position, result.pv[1])
+        if self.game.is_terminal(position):
+            return
+        maximizing = self.game.is_maxs_turn(position)  # as ask_move() will
+        stop = threading.Event()
+        found = []
+        thread = threading.Thread(target=self.__ponder, args=(position, maximizing, stop, found), daemon=True)
+        self._ponder = (thread, stop, self._ponder_key(position), time.perf_counter(), found)
+        thread.start()
+
+    def _ponder_key(self, state):
+        """ Return the key of a position, without its move count: an opponent that does not
+            call is_maxs_turn() (like HumanMenu) does not count its moves.
+            :param state: a legal game state
+        """
+        return self.game.hash_key(state) ^ self.game.zobrist.count_key(state.moveCount)
+
+    def _limited(self):
+        """ Return True if the searcher uses iterative deepening with a time or node limit.
+        """
+        return getattr(self.searcher, "time_limit", None) is not None or \
+            getattr(self.searcher, "node_limit", None) is not None
+
+    def __ponder(self, position, maximizing, stop, found):
+        """ Search a position until the search finishes or is stopped, in the background thread.
+            Searchers with a time or node limit search as deep as they can until stopped.
+        """
+        self.searcher.stop_event = stop
+        try:
+            if self._limited():
+                found.append(self.searcher.iterative_deepening(position, maximizing,
+                                                               max_depth=self.searcher.max_depth))
+            elif maximizing:
+                found.append(self.searcher.minimax_decision_max(position))
+            else:
+                found.append(self.searcher.minimax_decision_min(position))
+        except AlphaBetaDL.SearchAborted:
+            pass
+        finally:
+            self.searcher.stop_event = None
+
+    def _ponder_result(self, state):
+        """ Finish pondering.  If the opponent made the expected reply, use what the
+            pondering search found, giving it the rest of the searcher's time limit if it has one
+            (a searcher with a node limit has had at least as many nodes already).
+            :param state: the state to move in, after is_maxs_turn()
+            :return: the SearchTerminationRecord for the state, or None if there is none
+        """
+        if self._ponder is None:
+            return None
+        thread, stop, key, start, found = self._ponder
+        self._ponder = None
+        if self._ponder_key(state) != key:
+            self.ponder_misses += 1
+            stop.set()
+            thread.join()
+            return None
+        time_limit = getattr(self.searcher, "time_limit", None)
+        if time_limit is not None:
+            thread.join(max(0.0, start + time_limit - time.perf_counter()))
+        if self._limited():
+            stop.set()
+        thread.join()
+        if not found or found[0].move is None:
+            self.ponder_misses += 1
+            return None
+        self.ponder_hits += 1
+        return found[0]
+
+    def stop_pondering(self):
+        """ Stop the background search, e.g. at the end of the game.
+        """
+        if self._ponder is not None:
+            thread, stop = self._ponder[:2]
+            self._ponder = None
+            stop.set()
+            thread.join()
        
         
 ##########################################################################################
@@ -112,8 +254,8 @@ class SilentComputer(ComputerInterface):
             minimax_decision_max(state)
             minimax_decision_min(state)
     """
-    def __init__(self, game, searcher):
-        ComputerInterface.__init__(self, game, searcher)
+    def __init__(self, game, searcher, **options):
+        ComputerInterface.__init__(self, game, searcher, **options)
 
     def ask_move(self, state):
         """ Get a move from the search algorithm.  No console IO.
@@ -132,8 +274,8 @@ class VerboseComputer(ComputerInterface):
         This version has some dialogue, and shows the details about the move.  
         A bit boring?
     """
-    def __init__(self, game, searcher):
-        ComputerInterface.__init__(self, game, searcher)
+    def __init__(self, game, searcher, **options):
+        ComputerInterface.__init__(self, game, searcher, **options)
 
     def ask_move(self, state):
         """ Get a move from the search algorithm.  Some dialogue on console IO.
@@ -147,5 +289,8 @@ class VerboseComputer(ComputerInterface):
 
         print("...done")
         result.display()
+        if self.ponder:
+            print("Ponder hits: {} of {} ({:.0%})".format(
+                self.ponder_hits, self.ponder_hits + self.ponder_misses, self.ponder_hit_rate()))
 
         return result.move
\ No newline at end of file
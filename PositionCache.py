@@ -0,0 +1,169 @@
+##########################################################################################
+# A transposition table kept in a memory-mapped file, so search results outlive the
+# process that found them and can be shared by every process that opens the file.
+#
+# PositionCache(path, size, megabytes=64, readonly=False)
+#    - opens the file, making it if it does not exist yet
+#    - has the probe() and store() methods of AlphaBetaDL.PackedTranspositionTable,
+#      with the same fixed-size slots: the check word of each slot keeps readers in other
+#      processes from accepting a slot that is halfway through being written
+#    - the keys must be the same in every run, which the Zobrist keys of
+#      JediChessGame are (game.hash_key()), and the file is only for one board size
+#    - flush() writes the changes to disk, close() flushes and unmaps the file
+#    - the values are from Max's point of view, as every searcher in AlphaBetaDL stores
+#      them, and are only good for the eval that found them: the file records the
+#      game.eval_fingerprint() of the first searcher to use it (or of the game given
+#      when it is opened), and refuses a game whose eval is different
+#
+# The cache is meant to sit behind the in-memory transposition table, holding only
+# the results of deeper searches:
+#    cache = PositionCache("positions-7.bin", 7, megabytes=256)
+#    searcher = AlphaBetaDL.AlphaBeta(game, tt_megabytes=16, cache=cache)
+#    ...
+#    cache.close()
+#
+# A PositionCache can be pickled, e.g. as an option given to ParallelSearch; the
+# copy opens the same file again in the other process.
+
+import mmap
+import os
+import struct
+
+import AlphaBetaDL
+
+
+class PositionCache(AlphaBetaDL.PackedTranspositionTable):
+    """ A PackedTranspositionTable in a memory-mapped file.
+
+        The file starts with a header (magic, version, board size, number of words),
+        and is followed by the table's 64-bit words in the machine's byte order.
+    """
+
+    magic = b"JCPC"
+    version = 2
+    header = struct.Struct("<4sHHQBQ7x")
+
+    # the point of view of the values, in the header: every searcher stores them from Max's
+    maxsView = 1
+
+    def __init__(self, path, size, megabytes=64, readonly=False, game=None):
+        """ Open the cache file.
+            :param path: the file name
+            :param size: the size of the game board the positions are on
+            :param megabytes: the size of the table, if the file has to be made
+            :param readonly: if True, map the file read-only, and ignore store()
+            :param game: the game whose eval the values are for, or None to leave
+                         that until check_game() is called (which AlphaBetaDL.AlphaBeta does)
+        """
+        self.path = path
+        self.size = size
+        self.megabytes = megabytes
+        self.readonly = readonly
+        self.fingerprint = 0    # the eval fingerprint of the values in the file, 0 if not known yet
+        self.file = None
+        self.mm = None
+        self.words = None
+        self.open()
+        if game is not None:
+            self.check_game(game)
+
+    def open(self):
+        """ Map the file, making it first if it does not exist.
+        """
+        if self.mm is not None:
+            return
+        if not os.path.exists(self.path):
+            if self.readonly:
+                raise ValueError("No position cache at {!r}".format(self.path))
+            self.__create()
+        self.file = open(self.path, "rb" if self.readonly else "r+b")
+        magic, version, size, count, view, fingerprint = self.header.unpack(self.file.read(self.header.size))
+        if magic != self.magic or version != self.version:
+            self.file.close()
+            raise ValueError("{!r} is not a position cache file".format(self.path))
+        if size != self.size:
+            self.file.close()
+            raise ValueError("{!r} holds positions for size {}, not {}".format(self.path, size, self.size))
+        if view != self.maxsView:
+            self.file.close()
+            raise ValueError("{!r} holds values that are not from Max's point of view".format(self.path))
+        if self.fingerprint and fingerprint and fingerprint != self.fingerprint:
+            self.file.close()
+            raise ValueError("{!r} holds values found with a different eval".format(self.path))
+        self.fingerprint = self.fingerprint or fingerprint
+        access = mmap.ACCESS_READ if self.readonly else mmap.ACCESS_WRITE
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=access)
+        words = memoryview(self.mm)[self.header.size:self.header.size + 8 * count].cast("Q")
+        AlphaBetaDL.PackedTranspositionTable.__init__(self, words)
+
+    def __create(self):
+        """ Write a new file, with an empty table.
+        """
+        count = self.words_for(self.megabytes)
+        with open(self.path, "wb") as f:
+            f.write(self.header.pack(self.magic, self.version, self.size, count, self.maxsView, 0))
+            f.truncate(self.header.size + 8 * count)
+
+    def check_game(self, game):
+        """ Make sure the values in the file are for the game's eval.  A file that
+            no eval has claimed yet is claimed for this one.
+            :param game: an object from the Game Class, with eval_fingerprint()
+        """
+        fingerprint = game.eval_fingerprint()
+        if self.fingerprint == fingerprint:
+            return
+        if self.fingerprint:
+            raise ValueError("{!r} holds values found with a different eval".format(self.path))
+        if not self.readonly:
+            self.mm[:self.header.size] = self.header.pack(self.magic, self.version, self.size, len(self.words),
+                                                          self.maxsView, fingerprint)
+        self.fingerprint = fingerprint
+
+    def flush(self):
+        """ Write the changes made so far to the file.
+        """
+        if self.mm is not None and not self.readonly:
+            self.mm.flush()
+
+    def close(self):
+        """ Flush the changes and unmap the file.  open() maps it again.
+        """
+        if self.mm is None:
+            return
+        self.flush()
+        self.words.release()
+        self.words = None
+        self.mm.close()
+        self.mm = None
+        self.file.close()
+        self.file = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __getstate__(self):
+        return {"path": self.path, "size": self.size, "megabytes": self.megabytes, "readonly": self.readonly,
+                "fingerprint": self.fingerprint}
+
+    def __setstate__(self, config):
+        self.__init__(config["path"], config["size"], config["megabytes"], config["readonly"])
+        if config["fingerprint"] and self.fingerprint != config["fingerprint"]:
+            raise ValueError("{!r} holds values found with a different eval".format(self.path))
+
+    def store(self, key, value, bound, depth, move):
+        """ Remember the result of searching a position, unless the file is read-only.
+        """
+        if not self.readonly:
+            AlphaBetaDL.PackedTranspositionTable.store(self, key, value, bound, depth, move)
+
+    def clear(self):
+        """ Forget every stored position.
+        """
+        if not self.readonly:
+            AlphaBetaDL.PackedTranspositionTable.clear(self)
+
+# eof
@@ -4,62 +4,83 @@ CMPT 317: A4Q5
 Michael Horsch
 """
 
-from Game import Game
+from JediChessGame import Game
+from GameRecord import GameRecord
 import Players
 import AlphaBetaDL
 import sys
 
-# create the game, and the initial state
-game = Game(5, depth=1)
-state = game.initial_state()
-current_player = Players.VerboseComputer(game, AlphaBetaDL.AlphaBeta(game))
-game = Game(5, depth=1)
-other_player = Players.VerboseComputer(game, AlphaBetaDL.AlphaBeta(game))
 
-# play the game
-while not game.is_terminal(state):
-    choice = current_player.ask_move(state)
-    state = game.result(state, choice)
-    current_player, other_player = other_player, current_player
+def play_game(game, first_player, second_player, show=False, writer=None, meta=None):
+    """ Play one game from the initial state to the end.
+        :param game: an object from the Game Class
+        :param first_player: the player for the rebels, who move first
+        :param second_player: the player for the sith
+        :param show: True to display the board before every move
+        :param writer: a GameRecord.GameRecordWriter to append the game to, or None
+        :param meta: a dictionary to keep with the game in the writer's file
+        :return: the terminal state
+    """
+    state = game.initial_state()
+    record = GameRecord(game.gameSize, meta) if writer is not None else None
+    current_player, other_player = first_player, second_player
+    while not game.is_terminal(state):
+        if show:
+            state.display()
+        choice = current_player.ask_move(state)
+        if record is not None:
+            record.add(game, state, choice, getattr(current_player, "last_result", None))
+        state = game.result(state, choice)
+        current_player, other_player = other_player, current_player
+    if show:
+        state.display()
+    if record is not None:
+        record.finish(state)
+        writer.write(record)
+    return state
 
-game.congratulate(state)
-winner = state.cachedWinner
-if state.cachedWinner:
-    winner = "Rebels"
-elif not state.cachedWinner:
-    winner = "Sith"
-else:
-    winner = "draw"
 
-game = Game(5, depth=2)
-state = game.initial_state()
+def winner_name(state):
+    """ Name the winner of a finished game.
+        :param state: a terminal game state
+        :return: "Rebels", "Sith" or "draw"
+    """
+    if not state.cachedWin:
+        return "draw"
+    elif state.cachedWinner:
+        return "Rebels"
+    else:
+        return "Sith"
 
-current_player = Players.VerboseComputer(game, AlphaBetaDL.AlphaBeta(game))
 
-game = Game(5, depth=2)
-other_player = Players.VerboseComputer(game, AlphaBetaDL.AlphaBeta(game))
+if __name__ == "__main__":
+    # create the game, and the players; each player gets its own game object,
+    # since the depth limit is kept there
+    game = Game(5, depth=1)
+    current_player = Players.VerboseComputer(game, AlphaBetaDL.AlphaBeta(game))
+    game = Game(5, depth=1)
+    other_player = Players.VerboseComputer(game, AlphaBetaDL.AlphaBeta(game))
 
-# play the game
-while not game.is_terminal(state):
-    state.display()
-    choice = current_player.ask_move(state)
-    state = game.result(state, choice)
-    current_player, other_player = other_player, current_player
+    # play the game
+    state = play_game(game, current_player, other_player)
+    game.congratulate(state)
+    winner = winner_name(state)
 
-state.display()
-game.congratulate(state)
-if state.cachedWinner:
-    winner2 = "Rebels"
-elif not state.cachedWinner:
-    winner2 = "Sith"
-else:
-    winner2 = "draw"
+    game = Game(5, depth=2)
+    current_player = Players.VerboseComputer(game, AlphaBetaDL.AlphaBeta(game))
+    game = Game(5, depth=2)
+    other_player = Players.VerboseComputer(game, AlphaBetaDL.AlphaBeta(game))
 
-print("-------------------------------------------------")
-print("|Player 1 | Depth | Player 2 | Depth |   Outcome  |")
-print("|---------|-------|----------|-------|------------|")
-print("| A4Q3.py |   1   |  A4Q2.py |   1   |   " + winner + "   |")
-print("|---------|-------|----------|-------|------------|")
-print("| A4Q3.py |   2   |  A4Q2.py |   2   |   " + winner2 + "   |")
-print("---------------------------------------------------")
+    # play the game
+    state = play_game(game, current_player, other_player, show=True)
+    game.congratulate(state)
+    winner2 = winner_name(state)
+
+    print("-------------------------------------------------")
+    print("|Player 1 | Depth | Player 2 | Depth |   Outcome  |")
+    print("|---------|-------|----------|-------|------------|")
+    print("| A4Q3.py |   1   |  A4Q2.py |   1   |   " + winner + "   |")
+    print("|---------|-------|----------|-------|------------|")
+    print("| A4Q3.py |   2   |  A4Q2.py |   2   |   " + winner2 + "   |")
+    print("---------------------------------------------------")
 # eof
\ No newline at end of file
@@ -0,0 +1,273 @@
+##########################################################################################
+# An endgame tablebase: the exact result of every position with only a few pieces
+# left, worked out backwards from the positions where the game is won.
+#
+# Tablebase.generate(size, pieces)
+#    - solves every position on a size x size board with at most that many pieces,
+#      (at least one sith, and at least one rebel or jedi), for either player to move
+#    - a position is won if a move wins at once, or leads to a position the opponent
+#      loses; lost if every move leads to a position the opponent wins; and a draw
+#      if neither can force a win
+#    - the number of moves to the end is kept with each win or loss
+#
+# table.probe(game, state, depth)
+#    - the value of a state for the search, the same as utility() would give at the
+#      end of the game, or None if the state is not in the table
+#    - the tables ignore the 40 move limit, so a win that takes more moves than the
+#      game has left counts as a draw
+#
+# table.save(path), Tablebase.load(path)
+#    - the table is stored as a sorted array of 64-bit keys (game.placement_key(), so a
+#      position and its mirror image share one entry), and one signed byte per key:
+#      +n for a win in n moves by the player to move, -n for a loss in n moves, 0 for a draw
+#
+# To use a table in the search:
+#    table = Tablebase.load("tb5x3.bin")
+#    searcher = AlphaBetaDL.AlphaBeta(game, tablebase=table)
+#
+# To make a table:
+#    python Tablebase.py --size 5 --pieces 3 --out tb5x3.bin
+
+import argparse
+import array
+import bisect
+import collections
+import itertools
+import struct
+import sys
+import time
+
+from JediChessBitboard import BitboardGame, BitboardState
+
+
+class Tablebase(object):
+    """ The solved endgames for one board size.
+
+        The object has the following attributes:
+            self.size - the size of the game board
+            self.pieces - the most pieces of any position in the table
+            self.keys - an array('Q') of placement keys, in increasing order
+            self.values - an array('b'), the result for the player to move in each position
+    """
+
+    magic = b"JCTB"
+    header = struct.Struct("<4sBBI")
+
+    # the utility() of a win for Max
+    winValue = 61
+
+    # the most moves to the end that fit in a value
+    maxDistance = 127
+
+    def __init__(self, size, pieces, keys, values):
+        self.size = size
+        self.pieces = pieces
+        self.keys = keys
+        self.values = values
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def generate(cls, size, pieces):
+        """ Solve every position with at most the given number of pieces.
+            :param size: the size of the game board
+            :param pieces: the most pieces on the board, at least 2
+            :return: a Tablebase
+        """
+        if pieces < 2:
+            raise ValueError("A tablebase needs at least 2 pieces, not {!r}".format(pieces))
+        game = BitboardGame(size)
+
+        # number every position, by its key
+        masks = []
+        index = dict()
+        for sith, rebels, jedi in _placements(size, pieces):
+            for maxsTurn in (True, False):
+                state = _make_state(game, sith, rebels, jedi, maxsTurn)
+                index[state.key] = len(masks)
+                masks.append((sith, rebels, jedi, maxsTurn))
+
+        # the moves out of every position, as (offsets, children) lists of position numbers
+        total = len(masks)
+        distance = array.array("b", bytes(total))
+        offsets = array.array("l", [0])
+        children = array.array("l")
+        queue = collections.deque()
+        for i, (sith, rebels, jedi, maxsTurn) in enumerate(masks):
+            state = _make_state(game, sith, rebels, jedi, maxsTurn)
+            for act in game.iter_actions(state):
+                undo = game.make_move(state, act)
+                won = state.cachedWin
+                if not won:
+                    children.append(index[state.key])
+                game.unmake_move(state, undo)
+                if won:
+                    distance[i] = 1
+                    queue.append(i)
+                    break
+            offsets.append(len(children))
+
+        # the moves into every position
+        parentCount = array.array("l", [0]) * (total + 1)
+        for child in children:
+            parentCount[child + 1] += 1
+        parentOffsets = array.array("l", itertools.accumulate(parentCount))
+        parents = array.array("l", [0]) * len(children)
+        filled = array.array("l", parentOffsets)
+        for i in range(total):
+            for child in children[offsets[i]:offsets[i + 1]]:
+                parents[filled[child]] = i
+                filled[child] += 1
+
+        # work back from the wins: the queue holds positions in order of distance
+        unknown = array.array("l", (offsets[i + 1] - offsets[i] for i in range(total)))
+        while queue:
+            i = queue.popleft()
+            d = distance[i]
+            further = min(abs(d) + 1, cls.maxDistance)
+            for parent in parents[parentOffsets[i]:parentOffsets[i + 1]]:
+                if distance[parent] != 0:
+                    continue
+                if d < 0:
+                    # the move into a lost position wins
+                    distance[parent] = further
+                    queue.append(parent)
+                else:
+                    unknown[parent] -= 1
+                    if unknown[parent] == 0:
+                        # every move leads to a won position for the opponent
+                        distance[parent] = -further
+                        queue.append(parent)
+
+        # keep one entry per position and its mirror image
+        results = dict()
+        for i, (sith, rebels, jedi, maxsTurn) in enumerate(masks):
+            state = _make_state(game, sith, rebels, jedi, maxsTurn)
+            results[game.placement_key(state)] = distance[i]
+        keys = array.array("Q", sorted(results))
+        values = array.array("b", (results[key] for key in keys))
+        return cls(size, pieces, keys, values)
+
+    @classmethod
+    def load(cls, path):
+        """ Read a table written by save().
+            :param path: the file name
+            :return: a Tablebase
+        """
+        with open(path, "rb") as f:
+            magic, size, pieces, count = cls.header.unpack(f.read(cls.header.size))
+            if magic != cls.magic:
+                raise ValueError("{!r} is not a tablebase file".format(path))
+            keys = array.array("Q")
+            keys.fromfile(f, count)
+            values = array.array("b")
+            values.fromfile(f, count)
+        if sys.byteorder != "little":
+            keys.byteswap()
+        return cls(size, pieces, keys, values)
+
+    def save(self, path):
+        """ Write the table to a file.
+            :param path: the file name
+        """
+        keys = self.keys
+        if sys.byteorder != "little":
+            keys = array.array("Q", keys)
+            keys.byteswap()
+        with open(path, "wb") as f:
+            f.write(self.header.pack(self.magic, self.size, self.pieces, len(keys)))
+            keys.tofile(f)
+            self.values.tofile(f)
+
+    def lookup(self, key):
+        """ Find the result of a position.
+            :param key: the placement key of the position
+            :return: the value stored for the position (see the top of this file), or None
+        """
+        i = bisect.bisect_left(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            return None
+        return self.values[i]
+
+    def probe(self, game, state, depth=0):
+        """ Find the value of a state for the search.
+            :param game: an object from the Game Class, with placement_key() and piece_count()
+            :param state: a game state that is not terminal
+            :param depth: the depth of the state below the root, whose moves count
+                          towards the move limit
+            :return: the value of the state for Max (the same scale as game.utility()),
+                     or None if the state is not in the table
+        """
+        if game.gameSize != self.size or game.piece_count(state) > self.pieces:
+            return None
+        result = self.lookup(game.placement_key(state))
+        if result is None:
+            return None
+        # the move that made moveCount is the one being made now, see RunGame.play_game()
+        movesLeft = game.moveLimit + 1 - state.moveCount - depth
+        if result == 0 or abs(result) > movesLeft:
+            return 0
+        if (result > 0) == state.maxsTurn:
+            return self.winValue
+        return -self.winValue
+
+
+def _placements(size, pieces):
+    """ Generate the (sith, rebels, jedi) masks of every position with 2 to the given number
+        of pieces, with at least one piece on each side, and no rebel on the top row.
+    """
+    for count in range(2, pieces + 1):
+        for squares in itertools.combinations(range(size * size), count):
+            for kinds in itertools.product("SRJ", repeat=count):
+                if "S" not in kinds or kinds.count("S") == count:
+                    continue
+                bits = {"S": 0, "R": 0, "J": 0}
+                for kind, sq in zip(kinds, squares):
+                    bits[kind] |= 1 << sq
+                if bits["R"] & ((1 << size) - 1):
+                    # a rebel reaching the top row becomes a jedi
+                    continue
+                yield bits["S"], bits["R"], bits["J"]
+
+
+def _make_state(game, sith, rebels, jedi, maxsTurn):
+    """ Return the BitboardState with the given pieces, at move count 0.
+    """
+    state = BitboardState.__new__(BitboardState)
+    state.gameSize = game.gameSize
+    state.sithBits = sith
+    state.rebelBits = rebels
+    state.jediBits = jedi
+    state.maxsTurn = maxsTurn
+    state.moveCount = 0
+    state.cachedWin = False
+    state.cachedWinner = None
+    state.key = game.zobrist.state_key(state.pieces(), maxsTurn, 0)
+    state.mirrorKey = game.zobrist.state_key(state.pieces(), maxsTurn, 0, mirror=True)
+    game.score_state(state)
+    return state
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Make an endgame tablebase")
+    parser.add_argument("--size", type=int, default=5, help="the size of the game board")
+    parser.add_argument("--pieces", type=int, default=3, help="the most pieces on the board")
+    parser.add_argument("--out", help="the file to write, tb<size>x<pieces>.bin by default")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    table = Tablebase.generate(args.size, args.pieces)
+    seconds = time.perf_counter() - start
+    wins = sum(1 for value in table.values if value > 0)
+    losses = sum(1 for value in table.values if value < 0)
+    print("{} positions in {:.1f}s: {} wins, {} losses, {} draws for the player to move".format(
+        len(table), seconds, wins, losses, len(table) - wins - losses))
+    table.save(args.out or "tb{}x{}.bin".format(args.size, args.pieces))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# eof
@@ -0,0 +1,379 @@
+##########################################################################################
+# A tournament between searcher configurations, played without any console IO by
+# SilentComputer players in a pool of worker processes.
+#
+# A player configuration is a dictionary:
+#    name     - how the player is called in the results
+#    searcher - a name from AlphaBetaDL.searchers, "alphabeta" by default
+#    depth    - the depth limit of the player's game object, 0 for none
+#    weights  - the eval piece weights to change, e.g. {"J": 6}, or None
+#    eval     - a file of eval weights from TuneEval.py, or None
+#    ordering - True to give the searcher an AlphaBetaDL.MoveOrdering
+#    book     - the file of an opening book to play from, e.g. "book{size}.bin"
+#               ({size} is replaced by the board size), or None
+#    options  - the other keyword arguments for the searcher, e.g. {"time_limit": 0.1},
+#               or for the player, e.g. {"ponder": true}
+#
+# Every pair of players plays the given number of games on each board size,
+# taking turns to play the rebels.  The first few moves of each game are random
+# (the same moves for both games of a pair), so that the games are not all the same.
+#
+# The results are a table with, for each player, the wins, draws and losses,
+# an Elo rating fitted to all the games, and the average nodes and time per move.
+#
+#    results = run_tournament(configs, sizes=(5, 7), games=20)
+#    table = summarize(configs, results)
+#    write_csv(table, "tournament.csv")
+#
+# or from the command line, with the configurations in a JSON file:
+#    python Tournament.py --config players.json --sizes 5 7 --games 20 --csv tournament.csv
+#
+# With --record (or run_tournament(record=...)), every game is also appended to a file of
+# game records (see GameRecord.py), with the players and the seed in its metadata.
+
+import argparse
+import concurrent.futures
+import csv
+import itertools
+import json
+import math
+import random
+import sys
+import time
+
+import AlphaBetaDL
+import Players
+from GameRecord import GameRecord, GameRecordWriter
+from OpeningBook import OpeningBook
+from JediChessBitboard import BitboardGame, PackedMoveGame
+from JediChessGame import Game
+from RunGame import winner_name
+
+game_classes = {"dict": Game, "bitboard": BitboardGame, "packed": PackedMoveGame}
+
+# used when no configurations are given
+default_configs = [
+    {"name": "ab1", "depth": 1},
+    {"name": "ab2", "depth": 2},
+    {"name": "ab3", "depth": 3, "ordering": True, "options": {"tt_megabytes": 4}},
+    {"name": "pvs-50ms", "searcher": "pvs", "ordering": True,
+     "options": {"time_limit": 0.05, "tt_megabytes": 4}},
+]
+
+
+def make_player(game_class, size, config):
+    """ Make a SilentComputer for a player configuration.  Each player gets its own
+        game object, since the depth limit and the eval weights are kept there.
+        :param game_class: the Game Class to play with
+        :param size: the board size
+        :param config: a player configuration, see the top of this module
+        :return: a Players.SilentComputer
+    """
+    game = game_class(size, depth=config.get("depth", 0), weights=config.get("weights"),
+                      eval_file=config.get("eval"))
+    options = dict(config.get("options") or {})
+    if config.get("ordering"):
+        options["ordering"] = AlphaBetaDL.MoveOrdering(game)
+    if config.get("book"):
+        options["book"] = OpeningBook.load(config["book"].format(size=size))
+    return Players.SilentComputer(game, config.get("searcher", "alphabeta"), **options)
+
+
+def play_one(task):
+    """ Play one game of the tournament, in a worker process.
+        :param task: a dictionary with
+                      game - a key of game_classes
+                      size - the board size
+                      rebels, sith - the player configurations
+                      random_plies - the number of random moves to start with
+                      seed - the seed for the random moves
+                      record - True to keep the moves of the game
+        :return: a dictionary with the players' names, the winner ("Rebels", "Sith" or "draw"),
+                 the number of moves, and for each side the moves searched, nodes and seconds;
+                 and if the task asked for it, the game as the bytes of GameRecord.pack()
+    """
+    game_class = game_classes[task["game"]]
+    referee = game_class(task["size"])
+    players = {True: make_player(game_class, task["size"], task["rebels"]),
+               False: make_player(game_class, task["size"], task["sith"])}
+    searched = {True: [0, 0, 0.0], False: [0, 0, 0.0]}  # moves, nodes, seconds
+    rng = random.Random(task["seed"])
+    gameRecord = None
+    if task.get("record"):
+        gameRecord = GameRecord(task["size"], {"rebels": task["rebels"], "sith": task["sith"],
+                                               "seed": task["seed"], "randomPlies": task["random_plies"]})
+
+    state = referee.initial_state()
+    plies = 0
+    while not referee.is_terminal(state):
+        side = state.maxsTurn
+        if plies < task["random_plies"]:
+            referee.is_maxs_turn(state)  # counts the move, like a player asking would
+            actions = referee.actions(state)
+            choice = rng.choice(actions) if actions else None
+            record = None
+        else:
+            player = players[side]
+            choice = player.ask_move(state)
+            record = player.last_result
+            searched[side][0] += 1
+            searched[side][1] += record.nodes
+            searched[side][2] += record.time
+        if choice is None:
+            # no legal moves: the game can't go on
+            break
+        if gameRecord is not None:
+            gameRecord.add(referee, state, choice, record)
+        state = referee.result(state, choice)
+        plies += 1
+
+    for player in players.values():
+        player.stop_pondering()
+        if hasattr(player.searcher, "close"):
+            player.searcher.close()
+    result = {
+        "size": task["size"],
+        "rebels": task["rebels"]["name"],
+        "sith": task["sith"]["name"],
+        "winner": winner_name(state),
+        "moves": plies,
+        "rebels_moves": searched[True][0], "rebels_nodes": searched[True][1], "rebels_seconds": searched[True][2],
+        "sith_moves": searched[False][0], "sith_nodes": searched[False][1], "sith_seconds": searched[False][2],
+    }
+    if gameRecord is not None:
+        gameRecord.finish(state)
+        result["record"] = gameRecord.pack()
+    return result
+
+
+def make_tasks(configs, sizes, games, game="bitboard", random_plies=2, seed=0, record=False):
+    """ List the games of a tournament.
+        :param configs: the player configurations
+        :param sizes: the board sizes to play on
+        :param games: the number of games for each pair of players on each board size
+        :param game: a key of game_classes
+        :param random_plies: the number of random moves at the start of each game
+        :param seed: changes the random moves
+        :param record: True to have play_one() return the moves of each game
+        :return: a list of tasks for play_one()
+    """
+    tasks = []
+    for size in sizes:
+        for a, b in itertools.combinations(configs, 2):
+            for index in range(games):
+                rebels, sith = (a, b) if index % 2 == 0 else (b, a)
+                tasks.append({
+                    "game": game, "size": size, "rebels": rebels, "sith": sith,
+                    "random_plies": random_plies, "record": record,
+                    # both games of a pair, one with each side, start with the same moves
+                    "seed": "{}/{}/{}/{}/{}".format(seed, size, a["name"], b["name"], index // 2),
+                })
+    return tasks
+
+
+def run_tournament(configs, sizes=(5,), games=2, workers=None, game="bitboard", random_plies=2, seed=0,
+                   out=None, record=None):
+    """ Play every pair of players against each other.
+        :param configs: the player configurations, see the top of this module
+        :param sizes: the board sizes to play on
+        :param games: the number of games for each pair of players on each board size
+        :param workers: the number of worker processes; the number of CPUs by default
+        :param game: a key of game_classes
+        :param random_plies: the number of random moves at the start of each game
+        :param seed: changes the random moves
+        :param out: a file to report progress to, or None
+        :param record: a file to append every game to (see GameRecord.py), or None
+        :return: a list with the result of every game, see play_one()
+    """
+    names = [config["name"] for config in configs]
+    if len(set(names)) != len(names):
+        raise ValueError("Player names must be different: {}".format(names))
+    tasks = make_tasks(configs, sizes, games, game, random_plies, seed, record is not None)
+    results = []
+    start = time.perf_counter()
+    writer = GameRecordWriter(record) if record is not None else None
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            for result in pool.map(play_one, tasks):
+                if writer is not None:
+                    # only this process writes, so the games can't be mixed up in the file
+                    writer.write(result.pop("record"))
+                results.append(result)
+                if out is not None:
+                    print("game {}/{} ({:.1f}s): {} vs {} on {}x{}: {}".format(
+                        len(results), len(tasks), time.perf_counter() - start, result["rebels"],
+                        result["sith"], result["size"], result["size"], result["winner"]), file=out)
+    finally:
+        # keep the games played so far, even if one of them failed
+        if writer is not None:
+            writer.close()
+    return results
+
+
+def _scores(results):
+    """ Generate (rebels, sith, score for the rebels) for every game.
+    """
+    for result in results:
+        score = {"Rebels": 1.0, "Sith": 0.0}.get(result["winner"], 0.5)
+        yield result["rebels"], result["sith"], score
+
+
+def elo_ratings(names, results, iterations=50):
+    """ Fit Elo ratings to the results by maximum likelihood.
+        Every player also gets one draw against a player rated 0, so a player
+        that won (or lost) every game still gets a finite rating.
+        :param names: the players' names
+        :param results: the results of the games, see play_one()
+        :param iterations: the number of passes over the players
+        :return: a dictionary with
+                  keys: the players' names
+                  values: their ratings, with an average of 0
+    """
+    scale = math.log(10) / 400
+    games = dict((name, []) for name in names)  # the (opponent, score) of each game played
+    for rebels, sith, score in _scores(results):
+        games[rebels].append((sith, score))
+        games[sith].append((rebels, 1.0 - score))
+
+    ratings = dict((name, 0.0) for name in names)
+    for _ in range(iterations):
+        for name in names:
+            # a Newton step on the log-likelihood of this player's rating
+            gradient = 0.0
+            curvature = 0.0
+            for opponent_rating, score in [(0.0, 0.5)] + [(ratings[o], s) for o, s in games[name]]:
+                expected = 1 / (1 + 10 ** ((opponent_rating - ratings[name]) / 400))
+                gradient += score - expected
+                curvature += expected * (1 - expected)
+            ratings[name] += gradient / (scale * curvature)
+        mean = sum(ratings.values()) / len(ratings)
+        for name in names:
+            ratings[name] -= mean
+    return ratings
+
+
+def summarize(configs, results):
+    """ Add up the results for each player.
+        :param configs: the player configurations
+        :param results: the results of the games, see play_one()
+        :return: a list of dictionaries, one per player, best first, with
+                  name, games, wins, draws, losses, score (the fraction of points won),
+                  elo, nodes_per_move, seconds_per_move
+    """
+    names = [config["name"] for config in configs]
+    totals = dict((name, {"games": 0, "wins": 0, "draws": 0, "losses": 0,
+                          "moves": 0, "nodes": 0, "seconds": 0.0}) for name in names)
+    for result in results:
+        for side, other, side_won in (("rebels", "sith", "Rebels"), ("sith", "rebels", "Sith")):
+            total = totals[result[side]]
+            total["games"] += 1
+            if result["winner"] == "draw":
+                total["draws"] += 1
+            elif result["winner"] == side_won:
+                total["wins"] += 1
+            else:
+                total["losses"] += 1
+            total["moves"] += result[side + "_moves"]
+            total["nodes"] += result[side + "_nodes"]
+            total["seconds"] += result[side + "_seconds"]
+
+    ratings = elo_ratings(names, results)
+    table = []
+    for name in names:
+        total = totals[name]
+        moves = total["moves"] or 1
+        table.append({
+            "name": name, "games": total["games"],
+            "wins": total["wins"], "draws": total["draws"], "losses": total["losses"],
+            "score": (total["wins"] + total["draws"] / 2) / total["games"] if total["games"] else 0.0,
+            "elo": round(ratings[name], 1),
+            "nodes_per_move": round(total["nodes"] / moves, 1),
+            "seconds_per_move": round(total["seconds"] / moves, 5),
+        })
+    table.sort(key=lambda row: row["elo"], reverse=True)
+    return table
+
+
+def pairings(results):
+    """ Add up the results for each pair of players on each board size.
+        :return: a list of dictionaries with size, a, b, a_wins, draws, b_wins
+    """
+    counts = dict()
+    for result in results:
+        a, b = sorted((result["rebels"], result["sith"]))
+        row = counts.setdefault((result["size"], a, b),
+                                {"size": result["size"], "a": a, "b": b, "a_wins": 0, "draws": 0, "b_wins": 0})
+        if result["winner"] == "draw":
+            row["draws"] += 1
+        else:
+            winner = result["rebels"] if result["winner"] == "Rebels" else result["sith"]
+            row["a_wins" if winner == a else "b_wins"] += 1
+    return [counts[key] for key in sorted(counts)]
+
+
+table_columns = ["name", "games", "wins", "draws", "losses", "score", "elo", "nodes_per_move", "seconds_per_move"]
+
+
+def write_csv(table, path):
+    """ Write the table from summarize() as CSV.
+    """
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=table_columns)
+        writer.writeheader()
+        writer.writerows(table)
+
+
+def write_json(configs, results, path):
+    """ Write the players, the summary tables and every game as JSON.
+    """
+    with open(path, "w") as f:
+        json.dump({"players": configs, "table": summarize(configs, results),
+                   "pairings": pairings(results), "games": results}, f, indent=2)
+        f.write("\n")
+
+
+def display(table, out=sys.stdout):
+    """ Present the table from summarize() on the console.
+    """
+    print("{:<16} {:>6} {:>5} {:>5} {:>6} {:>6} {:>7} {:>12} {:>10}".format(
+        "player", "games", "wins", "draws", "losses", "score", "elo", "nodes/move", "secs/move"), file=out)
+    for row in table:
+        print("{name:<16} {games:>6} {wins:>5} {draws:>5} {losses:>6} {score:>6.3f} {elo:>7.1f} "
+              "{nodes_per_move:>12.1f} {seconds_per_move:>10.4f}".format(**row), file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play a tournament between searcher configurations")
+    parser.add_argument("--config", help="a JSON file with a list of player configurations")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5], help="the board sizes to play on")
+    parser.add_argument("--games", type=int, default=2, help="games per pair of players and board size")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--game", choices=sorted(game_classes), default="bitboard", help="the game class")
+    parser.add_argument("--random-plies", type=int, default=2, help="random moves at the start of each game")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the random moves")
+    parser.add_argument("--csv", help="write the table to this CSV file")
+    parser.add_argument("--json", help="write the table and every game to this JSON file")
+    parser.add_argument("--record", help="append every game to this file of game records")
+    parser.add_argument("--quiet", action="store_true", help="don't report each game as it finishes")
+    args = parser.parse_args(argv)
+
+    configs = default_configs
+    if args.config:
+        with open(args.config) as f:
+            configs = json.load(f)
+    results = run_tournament(configs, args.sizes, args.games, args.workers, args.game,
+                             args.random_plies, args.seed, out=None if args.quiet else sys.stderr,
+                             record=args.record)
+    table = summarize(configs, results)
+    display(table)
+    if args.csv:
+        write_csv(table, args.csv)
+    if args.json:
+        write_json(configs, results, args.json)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# eof
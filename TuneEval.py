@@ -0,0 +1,387 @@
+##########################################################################################
+# Tunes the eval weights to the results of recorded games (Texel's method): the eval of
+# each quiet position, put through a logistic curve, should predict the result of the
+# game the position came from.
+#
+# positions(records, game, skip)
+#    - generates (state, result) for the quiet positions of GameRecords: not terminal,
+#      no capture or promotion for the player to move, and not among the first skip moves;
+#      the result is 1 for a rebel win, 0.5 for a draw and 0 for a sith win
+#
+# EvalFeatures(size, mobility=False)
+#    - the eval as a sum of weight * feature: the piece weights (S, R, J), the turn bonus,
+#      mobility, and a piece-square value for each piece type and square; a square and
+#      its mirror image share their piece-square values, since the game is symmetric
+#
+# PositionSet(features)
+#    - the features of many positions and the results of their games, as a NumPy matrix
+#      (or without NumPy, as a list of sparse rows, which is much slower to fit)
+#
+# fit_scale(data, weights), tune(data, weights, scale, ...)
+#    - the scale of the curve is fitted once, for the weights the game starts with, so
+#      the tuned weights keep the units of the eval; then the weights are fitted by Adam
+#      steps on random batches of positions, minimizing the mean squared error of the
+#      predictions; the piece-square values are pulled towards 0, so the piece weights
+#      keep the average value of a piece
+#
+# The weights are written as a JSON file that Game reads (see JediChessGame.load_eval_file()):
+#    python Tournament.py --config players.json --sizes 7 --games 200 --record games.bin
+#    python TuneEval.py games.bin --size 7 --out eval.json
+#    game = BitboardGame(7, depth=3, eval_file="eval.json")
+
+import argparse
+import array
+import json
+import math
+import os
+import random
+import sys
+import time
+
+from GameRecord import read_games
+from JediChessBitboard import BitboardGame
+from JediChessGame import load_eval_file
+
+try:
+    import numpy
+except ImportError:  # PositionSet works on sparse rows instead
+    numpy = None
+
+
+def positions(records, game, skip=2):
+    """ Find the quiet positions of recorded games.
+        :param records: GameRecords, e.g. from GameRecord.read_games()
+        :param game: a BitboardGame; records for other board sizes are skipped
+        :param skip: the number of moves at the start of each game to leave out
+        :return: a generator of (state, result); the state is only good until the next one
+    """
+    for record in records:
+        if record.size != game.gameSize:
+            continue
+        result = (record.result + 1) / 2
+        for ply, (state, action) in enumerate(record.replay(game)):
+            if ply < skip or game.is_terminal(state):
+                continue
+            if next(iter(game.capture_actions(state)), None) is not None:
+                continue
+            yield state, result
+
+
+class EvalFeatures(object):
+    """ Splits the eval of a position into features, for one board size.
+
+        The weights are a list, in the order of the features:
+            0, 1, 2 - the piece weights of S, R and J (the sith count against Max)
+            3 - the turn bonus
+            4 - the mobility weight
+            5... - the piece-square values of S, R and J, one per column of squareColumn
+    """
+
+    pieces = "SRJ"
+    pstStart = 5
+
+    def __init__(self, size, mobility=False):
+        """ Set up the features.
+            :param size: the size of the game board
+            :param mobility: True to count the moves of the player to move, which is slow
+        """
+        self.size = size
+        self.squares = size * size
+        self.mobility = mobility
+        self.columns = self.pstStart + 3 * self.squares
+        # a square shares its piece-square values with its mirror image
+        self.squareColumn = [r * size + min(c, size - 1 - c) for r in range(size) for c in range(size)]
+
+    def encode(self, game, state):
+        """ Find the features of a position.
+            :param game: a BitboardGame
+            :param state: a legal game state
+            :return: a dictionary of column -> value, without the zero ones
+        """
+        row = dict()
+        for piece, sq in state.pieces():
+            kind = self.pieces.index(piece)
+            row[kind] = row.get(kind, 0) + (-1 if piece == "S" else 1)
+            column = self.pstStart + kind * self.squares + self.squareColumn[sq]
+            row[column] = row.get(column, 0) + 1
+        row[3] = 1 if state.maxsTurn else -1
+        if self.mobility:
+            row[4] = game.mobility(state)
+        return row
+
+    def weights_of(self, game):
+        """ Return the weights a game's eval uses now.
+            :param game: an object from the Game Class, for the board size
+            :return: a list of weights
+        """
+        weights = [game.pieceWeights[piece] for piece in self.pieces] + [game.turnBonus, game.mobilityWeight]
+        weights += [0.0] * (3 * self.squares)
+        for kind, piece in enumerate(self.pieces):
+            pst = (game.pst or {}).get(piece)
+            if pst is None:
+                continue
+            # a table that is not symmetric gets the average of each pair of squares
+            totals = dict()
+            for sq, value in enumerate(pst):
+                column = self.pstStart + kind * self.squares + self.squareColumn[sq]
+                total, count = totals.get(column, (0, 0))
+                totals[column] = (total + value, count + 1)
+            for column, (total, count) in totals.items():
+                weights[column] = total / count
+        return weights
+
+    def to_eval(self, weights, digits=3):
+        """ Turn weights into the contents of an eval file.
+            :param weights: a list of weights
+            :param digits: the number of decimals to keep
+            :return: a dictionary for JediChessGame.load_eval_file()
+        """
+        pst = dict()
+        for kind, piece in enumerate(self.pieces):
+            start = self.pstStart + kind * self.squares
+            pst[piece] = [round(weights[start + column], digits) for column in self.squareColumn]
+        return {
+            "weights": {piece: round(weights[kind], digits) for kind, piece in enumerate(self.pieces)},
+            "turnBonus": round(weights[3], digits),
+            "mobility": round(weights[4], digits),
+            "pst": {str(self.size): pst},
+        }
+
+    def trainable(self):
+        """ Return a list of True for each weight that tune() may change.
+        """
+        return [column != 4 or self.mobility for column in range(self.columns)]
+
+    def regularized(self):
+        """ Return a list of True for each weight that is pulled towards 0.
+        """
+        return [column >= self.pstStart for column in range(self.columns)]
+
+
+def _sigmoid(x):
+    # tanh does not overflow, where exp would
+    return 0.5 + 0.5 * math.tanh(x / 2)
+
+
+class PositionSet(object):
+    """ The features of many positions, and the results of their games.
+
+        The object has the following attributes:
+            self.features - the EvalFeatures
+            self.rows - a list with a sparse row (column -> value) for each position;
+                        emptied once the NumPy matrix is made
+            self.results - an array('d') with the result of each position's game
+    """
+
+    def __init__(self, features):
+        self.features = features
+        self.rows = []
+        self.results = array.array("d")
+        self._matrix = None  # (features, results) as NumPy arrays, made when first needed
+
+    def __len__(self):
+        return len(self.results)
+
+    def add(self, row, result):
+        """ Add a position.
+            :param row: the features, from EvalFeatures.encode()
+            :param result: the result of the game, 1, 0.5 or 0
+        """
+        if self._matrix is not None:
+            raise ValueError("Positions can't be added once the set is in use")
+        self.rows.append(row)
+        self.results.append(result)
+
+    def __arrays(self):
+        """ Return the features as a NumPy matrix, one row per position, and the results.
+        """
+        if self._matrix is None:
+            matrix = numpy.zeros((len(self.rows), self.features.columns), dtype=numpy.int16)
+            for i, row in enumerate(self.rows):
+                matrix[i, list(row)] = list(row.values())
+            self._matrix = (matrix, numpy.frombuffer(self.results, dtype=numpy.float64))
+            self.rows = []
+        return self._matrix
+
+    def evals(self, weights, batch=None):
+        """ Return the eval of positions for the given weights.
+            :param weights: a list of weights
+            :param batch: a list of position numbers, or None for all of them
+            :return: a list of evals
+        """
+        if numpy is not None:
+            matrix, results = self.__arrays()
+            x = matrix if batch is None else matrix[numpy.asarray(batch)]
+            return (x @ numpy.asarray(weights, dtype=numpy.float64)).tolist()
+        rows = self.rows if batch is None else [self.rows[i] for i in batch]
+        return [sum(weights[column] * value for column, value in row.items()) for row in rows]
+
+    def errors(self, weights, scale, batch=None):
+        """ Return the mean squared error of the predicted results.
+            :param weights: a list of weights
+            :param scale: the scale of the logistic curve
+            :param batch: a list of position numbers, or None for all of them
+        """
+        if not len(self):
+            return 0.0
+        if numpy is not None:
+            matrix, results = self.__arrays()
+            x, y = (matrix, results) if batch is None else (matrix[numpy.asarray(batch)], results[batch])
+            predicted = 0.5 + 0.5 * numpy.tanh(scale * (x @ numpy.asarray(weights, dtype=numpy.float64)) / 2)
+            return float(numpy.mean((predicted - y) ** 2))
+        indices = range(len(self)) if batch is None else batch
+        evals = self.evals(weights, batch)
+        return sum((_sigmoid(scale * value) - self.results[i]) ** 2 for i, value in zip(indices, evals)) / len(evals)
+
+    def gradient(self, weights, scale, batch):
+        """ Return the gradient of errors() with respect to the weights.
+            :param weights: a list of weights
+            :param scale: the scale of the logistic curve
+            :param batch: a list of position numbers
+            :return: a list, one value per weight
+        """
+        if numpy is not None:
+            matrix, results = self.__arrays()
+            index = numpy.asarray(batch)
+            x = matrix[index].astype(numpy.float64)
+            predicted = 0.5 + 0.5 * numpy.tanh(scale * (x @ numpy.asarray(weights, dtype=numpy.float64)) / 2)
+            slope = (predicted - results[index]) * predicted * (1 - predicted)
+            return (x.T @ slope * (2 * scale / len(batch))).tolist()
+        gradient = [0.0] * self.features.columns
+        for i in batch:
+            row = self.rows[i]
+            predicted = _sigmoid(scale * sum(weights[column] * value for column, value in row.items()))
+            slope = (predicted - self.results[i]) * predicted * (1 - predicted)
+            for column, value in row.items():
+                gradient[column] += slope * value
+        factor = 2 * scale / len(batch)
+        return [value * factor for value in gradient]
+
+
+# the smallest scale fit_scale() allows: an eval of 61, as utility() gives a win,
+# should predict a win at least 95% of the time; with a smaller scale, the evals
+# would have to grow outside the range of utility() to predict anything
+smallestScale = math.log(19) / 61
+
+
+def fit_scale(data, weights, low=smallestScale, high=1.0, steps=40):
+    """ Find the scale of the logistic curve that best fits the results to the evals,
+        by a golden section search on its logarithm.
+        :param data: a PositionSet
+        :param weights: a list of weights
+        :param low, high: the range to search
+        :return: the scale
+    """
+    ratio = (math.sqrt(5) - 1) / 2
+    a, b = math.log(low), math.log(high)
+    for _ in range(steps):
+        c = b - ratio * (b - a)
+        d = a + ratio * (b - a)
+        if data.errors(weights, math.exp(c)) < data.errors(weights, math.exp(d)):
+            b = d
+        else:
+            a = c
+    return math.exp((a + b) / 2)
+
+
+def tune(data, weights, scale, trainable, regularized, epochs=10, batch=4096, rate=0.05, l2=1e-4,
+         seed=0, out=None):
+    """ Fit the weights to the results, by Adam steps on random batches of positions.
+        :param data: a PositionSet
+        :param weights: the weights to start from
+        :param scale: the scale of the logistic curve, see fit_scale()
+        :param trainable: a list of True for each weight to change, see EvalFeatures.trainable()
+        :param regularized: a list of True for each weight to pull towards 0
+        :param epochs: the number of passes over the positions
+        :param batch: the number of positions in each step
+        :param rate: the size of a step
+        :param l2: how hard the regularized weights are pulled towards 0
+        :param seed: the seed for the order of the positions
+        :param out: a file to report the error after each pass to, or None
+        :return: the new weights, a list
+    """
+    beta1, beta2, epsilon = 0.9, 0.999, 1e-8
+    weights = [float(value) for value in weights]
+    moment = [0.0] * len(weights)
+    square = [0.0] * len(weights)
+    order = list(range(len(data)))
+    rng = random.Random(seed)
+    steps = 0
+    for epoch in range(epochs):
+        rng.shuffle(order)
+        for start in range(0, len(order), batch):
+            gradient = data.gradient(weights, scale, order[start:start + batch])
+            steps += 1
+            correction1 = 1 - beta1 ** steps
+            correction2 = 1 - beta2 ** steps
+            for column, value in enumerate(gradient):
+                if not trainable[column]:
+                    continue
+                if regularized[column]:
+                    value += l2 * weights[column]
+                moment[column] = beta1 * moment[column] + (1 - beta1) * value
+                square[column] = beta2 * square[column] + (1 - beta2) * value * value
+                weights[column] -= rate * (moment[column] / correction1) / (
+                    math.sqrt(square[column] / correction2) + epsilon)
+        if out is not None:
+            print("epoch {}: error {:.6f}".format(epoch + 1, data.errors(weights, scale)), file=out)
+    return weights
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tune the eval weights to recorded games")
+    parser.add_argument("paths", nargs="+", help="files of game records")
+    parser.add_argument("--size", type=int, default=7, help="the board size to tune for")
+    parser.add_argument("--skip", type=int, default=2, help="moves at the start of each game to leave out")
+    parser.add_argument("--mobility", action="store_true", help="tune a mobility weight as well (slow)")
+    parser.add_argument("--start", help="an eval file with the weights to start from")
+    parser.add_argument("--epochs", type=int, default=10, help="passes over the positions")
+    parser.add_argument("--batch", type=int, default=4096, help="positions in each step")
+    parser.add_argument("--rate", type=float, default=0.05, help="the size of a step")
+    parser.add_argument("--l2", type=float, default=1e-4, help="how hard piece-square values are pulled to 0")
+    parser.add_argument("--holdout", type=float, default=0.1, help="the part of the positions kept out to test on")
+    parser.add_argument("--seed", type=int, default=0, help="the seed for the order of the positions")
+    parser.add_argument("--out", default="eval.json",
+                        help="the eval file to write; the tables for other board sizes in it are kept")
+    args = parser.parse_args(argv)
+
+    game = BitboardGame(args.size, eval_file=args.start)
+    features = EvalFeatures(args.size, args.mobility)
+    rng = random.Random(args.seed)
+    train, test = PositionSet(features), PositionSet(features)
+    start = time.perf_counter()
+    for path in args.paths:
+        for state, result in positions(read_games(path), game, args.skip):
+            (test if rng.random() < args.holdout else train).add(features.encode(game, state), result)
+    print("{} positions ({} to test on) in {:.1f}s".format(
+        len(train) + len(test), len(test), time.perf_counter() - start), file=sys.stderr)
+    if not len(train):
+        print("No positions for size {}".format(args.size), file=sys.stderr)
+        return 1
+
+    weights = features.weights_of(game)
+    scale = fit_scale(train, weights)
+    print("scale {:.5f}, error {:.6f} (test {:.6f})".format(
+        scale, train.errors(weights, scale), test.errors(weights, scale)), file=sys.stderr)
+    weights = tune(train, weights, scale, features.trainable(), features.regularized(), args.epochs,
+                   args.batch, args.rate, args.l2, args.seed, out=sys.stderr)
+    print("tuned error {:.6f} (test {:.6f})".format(
+        train.errors(weights, scale), test.errors(weights, scale)), file=sys.stderr)
+    biggest = max(abs(value) for value in train.evals(weights))
+    if biggest >= 61:
+        print("warning: an eval of {:.1f} is outside the range of utility()".format(biggest), file=sys.stderr)
+
+    tuned = features.to_eval(weights)
+    if os.path.exists(args.out):
+        pst = load_eval_file(args.out).get("pst") or {}
+        tuned["pst"] = dict(pst, **tuned["pst"])
+    with open(args.out, "w") as f:
+        json.dump(tuned, f, indent=1)
+    print(json.dumps({key: tuned[key] for key in ("weights", "turnBonus", "mobility")}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# eof
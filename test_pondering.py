@@ -0,0 +1,41 @@
+import unittest
+
+import Players
+from JediChessBitboard import BitboardGame
+
+
+class PredictedHuman(Players.HumanMenu):
+    """ A HumanMenu that plays the reply the computer expects, without asking anyone;
+        like HumanMenu, it does not call is_maxs_turn().
+    """
+    def __init__(self, game, computer):
+        Players.HumanMenu.__init__(self, game)
+        self.computer = computer
+
+    def ask_move(self, state):
+        pv = self.computer.last_result.pv
+        return pv[1] if pv and len(pv) > 1 else self.game.actions(state)[0]
+
+
+class PonderingTest(unittest.TestCase):
+
+    def test_ponder_hits_against_human_menu(self):
+        game = BitboardGame(5, depth=3)
+        computer = Players.SilentComputer(game, "pvs", ponder=True, tt_megabytes=1)
+        human = PredictedHuman(game, computer)
+        state = game.initial_state()
+        players = [computer, human]
+        moves = 0
+        while not game.is_terminal(state) and moves < 10:
+            choice = players[moves % 2].ask_move(state)
+            state = game.result(state, choice)
+            moves += 1
+        computer.stop_pondering()
+        self.assertGreater(computer.ponder_hits, 0)
+        self.assertEqual(computer.ponder_misses, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# eof